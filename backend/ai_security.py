@@ -1,17 +1,40 @@
-import os, json, math
+import os, json, math, random, time
 from datetime import datetime
+from urllib.parse import urlparse
+import threading, hashlib
+import ratelimit
+from filter_simple import parse_keywords
+import http_client
+import metrics
+import db
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Calls per second allowed against the OpenAI host, shared by all threads
+AI_RATE_PER_SEC = float(os.getenv("AI_RATE_PER_SEC", "8"))
+AI_RATE_BURST = int(os.getenv("AI_RATE_BURST", "8"))
+# Retries on 429/5xx/timeouts before falling back to the heuristic
+AI_RETRIES = int(os.getenv("AI_RETRIES", "3"))
+AI_BACKOFF = float(os.getenv("AI_BACKOFF", "0.5"))
+# Persistent verdict cache; entries older than the TTL are re-evaluated
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+AI_CACHE_MAX_ROWS = int(os.getenv("AI_CACHE_MAX_ROWS", "200000"))
+AI_CACHE_EVICT_EVERY = 200
+# Listings scored per chat completion in batch mode. Larger batches save
+# requests and repeated prompt tokens; smaller ones lose less to a bad reply.
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "10"))
+
+_cache_lock = threading.Lock()
+_cache_counters = {"hits": 0, "misses": 0, "stores": 0}
 
 PROMPT = """You are a marketplace fraud and relevance evaluator.
 Score security from 0-100 (100 safest, 0 scam) and decide accept/reject.
 Be concise. Return ONLY JSON with these keys:
-{
+{{
   "security_score": <0-100 integer>,
   "relevant": true/false,
   "reasons": ["short, crisp", "..."],
   "final_decision": "accept" | "reject"
-}
+}}
 
 User needs (profile rules): {profile_rules}
 
@@ -25,11 +48,44 @@ Listing:
 - Seller signals: {seller_signals}
 """
 
+BATCH_PROMPT = """You are a marketplace fraud and relevance evaluator.
+For EACH listing below, score security from 0-100 (100 safest, 0 scam) and decide accept/reject.
+Be concise. Return ONLY a JSON array with one object per listing, in any order:
+[
+  {{
+    "index": <listing number>,
+    "security_score": <0-100 integer>,
+    "relevant": true/false,
+    "reasons": ["short, crisp", "..."],
+    "final_decision": "accept" | "reject"
+  }}
+]
+
+User needs (profile rules): {profile_rules}
+Profile name: {profile_name}
+
+Listings:
+{listings}
+"""
+
+BATCH_ITEM = """#{index}
+- Title: {title}
+- Price: £{price}
+- Notes: {notes}
+- Description (if any): {description}
+- Photos: {photos_count}
+- Seller signals: {seller_signals}
+"""
+
 def _heuristic(profile: dict, item: dict) -> dict:
     # Fallback when OPENAI_API_KEY is not set
-    title = (item.get("title") or "").lower()
-    kws = [k.strip().lower() for k in (profile.get("keywords") or "").split(",") if k.strip()]
-    hit_ratio = (sum(1 for k in kws if k in title) / max(1, len(kws))) if kws else 0.0
+    kws = parse_keywords(profile.get("keywords") or "")
+    # run_once stores the matcher's count on the item; otherwise scan here
+    hits = item.get("keyword_hits")
+    if hits is None:
+        title = (item.get("title") or "").lower()
+        hits = sum(1 for k in kws if k in title)
+    hit_ratio = (hits / max(1, len(kws))) if kws else 0.0
     price = (item.get("price_cents") or 0)/100
     mn = (profile.get("price_min_cents") or 0)/100
     mx = (profile.get("price_max_cents") or 10**9)/100
@@ -42,43 +98,212 @@ def _heuristic(profile: dict, item: dict) -> dict:
         "security_score": score,
         "relevant": hit_ratio > 0,
         "reasons": [
-            f"{sum(1 for k in kws if k in title)}/{len(kws)} keywords matched" if kws else "no keywords configured",
+            f"{hits}/{len(kws)} keywords matched" if kws else "no keywords configured",
             "price within desired range" if in_range else "price outside range"
         ],
         "final_decision": decision
     }
 
+def _openai_host() -> str:
+    base = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+    return urlparse(base).netloc or base
+
+def _is_retryable(e: Exception) -> bool:
+    # openai raises typed errors carrying the HTTP status; timeouts and
+    # dropped connections have no status but are worth another try
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(e).__name__ in ("APITimeoutError", "APIConnectionError")
+
+def _model() -> str:
+    return os.getenv("OPENAI_MODEL","gpt-4o-mini")
+
+def _render_prompt(profile: dict, item: dict) -> str:
+    return PROMPT.format(
+        profile_rules=profile.get("keywords") or "(no rules)",
+        title=item.get("title",""),
+        price=(item.get("price_cents") or 0)/100,
+        profile_name=profile.get("name",""),
+        notes=item.get("reason",""),
+        description=item.get("description",""),
+        photos_count=item.get("photos_count", 0),
+        seller_signals=item.get("seller_meta","{}")
+    )
+
+def cache_key(prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+def _count(name: str):
+    with _cache_lock:
+        _cache_counters[name] += 1
+        return _cache_counters[name]
+
+def _cache_store(key: str, model: str, verdict: dict):
+    db.cache_put(key, model, verdict)
+    if _count("stores") % AI_CACHE_EVICT_EVERY == 0:
+        db.cache_evict(AI_CACHE_TTL, AI_CACHE_MAX_ROWS)
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_counters)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["entries"] = db.cache_size()
+    stats["ttl_seconds"] = AI_CACHE_TTL
+    stats["max_entries"] = AI_CACHE_MAX_ROWS
+    return stats
+
+def _normalize(data: dict) -> dict:
+    # Sanity clamp
+    data["security_score"] = int(max(0, min(100, int(data.get("security_score", 0)))))
+    if data["security_score"] >= 70 and data.get("final_decision") == "reject":
+        # Align decision with score unless model insists
+        data["final_decision"] = "accept"
+    return data
+
+def _valid(data) -> bool:
+    if not isinstance(data, dict):
+        return False
+    try:
+        int(data.get("security_score"))
+    except (TypeError, ValueError):
+        return False
+    return data.get("final_decision") in ("accept", "reject") and isinstance(data.get("reasons", []), list)
+
+def _with_retries(call):
+    """Run one OpenAI request under the host rate limit, retrying transient errors."""
+    limiter = ratelimit.for_host(_openai_host(), AI_RATE_PER_SEC, AI_RATE_BURST)
+    for attempt in range(AI_RETRIES + 1):
+        limiter.acquire()
+        try:
+            result = call()
+        except Exception as e:
+            metrics.inc("llm_requests", outcome="error")
+            if attempt == AI_RETRIES or not _is_retryable(e):
+                raise
+            # Exponential backoff with jitter so parallel callers spread out
+            time.sleep(AI_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+            continue
+        metrics.inc("llm_requests", outcome="ok")
+        return result
+
+def _fallback(profile: dict, item: dict, reason: str) -> dict:
+    metrics.inc("llm_fallbacks", reason=reason)
+    # Marked so tier agreement stats can tell it from a real LLM verdict
+    return dict(_heuristic(profile, item), fallback=reason)
+
+def _chat(prompt: str, max_tokens: int) -> str:
+    client = http_client.openai_client(OPENAI_API_KEY)
+    resp = client.chat.completions.create(
+        model=_model(),
+        messages=[{"role":"system","content":"You return strict JSON."},
+                  {"role":"user","content": prompt}],
+        max_tokens=max_tokens, temperature=0
+    )
+    return resp.choices[0].message.content.strip()
+
+def _call_openai(profile: dict, item: dict, prompt: str | None = None) -> dict:
+    prompt = prompt or _render_prompt(profile, item)
+    return _normalize(json.loads(_chat(prompt, 120)))
+
+def _call_openai_batch(profile: dict, items: list) -> dict:
+    """Score `items` in one request; returns {position: raw element}."""
+    listings = "".join(
+        BATCH_ITEM.format(
+            index=i,
+            title=it.get("title",""),
+            price=(it.get("price_cents") or 0)/100,
+            notes=it.get("reason",""),
+            description=it.get("description",""),
+            photos_count=it.get("photos_count", 0),
+            seller_signals=it.get("seller_meta","{}")
+        )
+        for i, it in enumerate(items)
+    )
+    prompt = BATCH_PROMPT.format(
+        profile_rules=profile.get("keywords") or "(no rules)",
+        profile_name=profile.get("name",""),
+        listings=listings
+    )
+    data = json.loads(_chat(prompt, 120 * len(items)))
+    if isinstance(data, dict):
+        data = data.get("results", [])
+    out = {}
+    for el in data if isinstance(data, list) else []:
+        if isinstance(el, dict) and isinstance(el.get("index"), int) and 0 <= el["index"] < len(items):
+            out.setdefault(el["index"], el)
+    return out
+
 def evaluate_listing(profile: dict, item: dict) -> dict:
     if not OPENAI_API_KEY:
+        metrics.inc("ai_verdicts", source="heuristic")
         return _heuristic(profile, item)
+    model = _model()
+    prompt = _render_prompt(profile, item)
+    key = cache_key(prompt, model)
+    cached = db.cache_get(key, AI_CACHE_TTL)
+    if cached is not None:
+        _count("hits")
+        metrics.inc("ai_verdicts", source="cache")
+        return cached
+    _count("misses")
     try:
-        # Lazy import to avoid dependency if user hasn't installed openai
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        prompt = PROMPT.format(
-            profile_rules=profile.get("keywords") or "(no rules)",
-            title=item.get("title",""),
-            price=(item.get("price_cents") or 0)/100,
-            profile_name=profile.get("name",""),
-            notes=item.get("reason",""),
-            description=item.get("description",""),
-            photos_count=item.get("photos_count", 0),
-            seller_signals=item.get("seller_meta","{}")
-        )
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL","gpt-4o-mini"),
-            messages=[{"role":"system","content":"You return strict JSON."},
-                      {"role":"user","content": prompt}],
-            max_tokens=120, temperature=0
-        )
-        txt = resp.choices[0].message.content.strip()
-        data = json.loads(txt)
-        # Sanity clamp
-        data["security_score"] = int(max(0, min(100, int(data.get("security_score", 0)))))
-        if data["security_score"] >= 70 and data.get("final_decision") == "reject":
-            # Align decision with score unless model insists
-            data["final_decision"] = "accept"
-        return data
-    except Exception as e:
+        with metrics.span("ai.evaluate_listing"):
+            data = _with_retries(lambda: _call_openai(profile, item, prompt))
+    except Exception:
         # On any error, fallback heuristic
-        return _heuristic(profile, item)
+        return _fallback(profile, item, "error")
+    metrics.inc("ai_verdicts", source="llm")
+    _cache_store(key, model, data)
+    return data
+
+def evaluate_batch(profile: dict, items: list, batch_size: int | None = None) -> list:
+    """Verdicts for one profile's listings, `batch_size` per request; bad elements fall back one by one."""
+    size = batch_size or AI_BATCH_SIZE
+    if not OPENAI_API_KEY or size <= 1:
+        return [evaluate_listing(profile, it) for it in items]
+    model = _model()
+    results = [None] * len(items)
+    misses = []
+    for i, it in enumerate(items):
+        key = cache_key(_render_prompt(profile, it), model)
+        cached = db.cache_get(key, AI_CACHE_TTL)
+        if cached is not None:
+            _count("hits")
+            metrics.inc("ai_verdicts", source="cache")
+            results[i] = cached
+        else:
+            _count("misses")
+            misses.append((i, key))
+    for start in range(0, len(misses), size):
+        chunk = misses[start:start + size]
+        if len(chunk) == 1:
+            i, key = chunk[0]
+            try:
+                with metrics.span("ai.evaluate_listing"):
+                    data = _with_retries(lambda: _call_openai(profile, items[i]))
+            except Exception:
+                results[i] = _fallback(profile, items[i], "error")
+                continue
+            metrics.inc("ai_verdicts", source="llm")
+            _cache_store(key, model, data)
+            results[i] = data
+            continue
+        try:
+            with metrics.span("ai.evaluate_batch"):
+                parsed = _with_retries(lambda: _call_openai_batch(profile, [items[i] for i, _ in chunk]))
+            failed = None
+        except Exception:
+            parsed, failed = {}, "error"
+        for pos, (i, key) in enumerate(chunk):
+            el = parsed.get(pos)
+            if _valid(el):
+                el.pop("index", None)
+                data = _normalize(el)
+                metrics.inc("ai_verdicts", source="llm")
+                _cache_store(key, model, data)
+                results[i] = data
+            else:
+                results[i] = _fallback(profile, items[i], failed or "invalid")
+    return results
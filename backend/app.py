@@ -1,18 +1,36 @@
-from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import os
-from db import init_db, list_profiles, get_profile, create_profile, update_profile, delete_profile, list_listings, get_listing
-from job_runner import run_once
+import hashlib, os
+from typing import Literal
+from db import (init_db, list_profiles, get_profile, create_profile, update_profile, delete_profile, get_listing, encode_cursor,
+                search_listings, encode_search_cursor, listing_page_end, stream_listings, table_columns, close_conn)
+import jobs
+import notify_queue
+import places
+import events
+import streaming
+from http_cache import versions, not_modified, validators, ITEM_MAX_AGE
+import metrics
+from metrics import latency_summary
 
 app = FastAPI(title="DealAI — Marketplace Monitor")
+app.add_middleware(metrics.LatencyMiddleware)
 static_dir = Path(__file__).parent.parent / "frontend"
 app.mount("/static", StaticFiles(directory=static_dir, html=True), name="static")
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+    notify_queue.start()
+    jobs.scheduler.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    jobs.scheduler.stop()
+    notify_queue.dispatcher.stop()
+    close_conn()
 
 @app.get("/", response_class=HTMLResponse)
 def index():
@@ -20,16 +38,23 @@ def index():
 
 # Profiles API
 @app.get("/api/profiles")
-def api_list_profiles():
-    return list_profiles()
+def api_list_profiles(request: Request, fields: str | None = None, format: Literal["json", "ndjson"] | None = None):
+    try:
+        columns = streaming.parse_fields(fields, table_columns("profiles"))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    ndjson = streaming.wants_ndjson(request, format)
+    query = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    prev, changed_at = versions.profiles()
+    etag = f'W/"p{prev}-{query}{"-n" if ndjson else ""}"'
+    headers = validators(etag, changed_at)
+    if not_modified(request, etag, changed_at):
+        return Response(status_code=304, headers=headers)
+    return streaming.rows_response(request, iter(list_profiles(columns)), ndjson, headers)
 
 @app.post("/api/profiles")
 async def api_create_profile(request: Request):
     data = await request.json()
-    print("--- RECEIVED DATA ---")
-    import json
-    print(json.dumps(data, indent=2))
-    print("---------------------")
     if not data.get("name"):
         raise HTTPException(400, "name is required")
     pid = create_profile(data)
@@ -52,83 +77,146 @@ def api_delete_profile(pid: int):
     delete_profile(pid)
     return {"ok": True}
 
-import requests
-
 # Listings API
 @app.get("/api/listings")
 def api_list_listings(
+    request: Request,
     min_score: float = Query(0.0, ge=0.0, le=1.0),
     profile: str | None = None,
     status: str | None = None,
-    security_min: int | None = None
+    security_min: int | None = None,
+    limit: int = Query(100, ge=1, le=5000),
+    after: str | None = None,
+    fields: str | None = None,
+    format: Literal["json", "ndjson"] | None = None
 ):
-    return list_listings(min_score=min_score, profile=profile, status=status, security_min=security_min)
-
-# HERE Places API Proxies
-@app.get("/api/places/autosuggest")
-def proxy_places_autosuggest(request: Request):
-    if os.getenv("USE_FIXTURE") == "1":
-        return {
-            "items": [
-                { "id": "here:af:street:123", "title": "10 Downing Street", "address": { "label": "10 Downing St, London SW1A 2AA, UK" }, "position": { "lat": 51.5034, "lng": -0.1276 } },
-                { "id": "here:af:postal:SW1A1AA", "title": "SW1A 1AA", "address": { "label": "SW1A 1AA, London, UK" }, "position": { "lat": 51.5010, "lng": -0.1416 } },
-            ]
-        }
-
-    params = dict(request.query_params)
-    if not params.get("q"):
-        raise HTTPException(400, "Missing q")
-
-    url = "https://autosuggest.search.hereapi.com/v1/autosuggest"
-    api_key = os.getenv("HERE_API_KEY")
-    print(f"--- AUTOSUGGEST: USING API KEY: {api_key[:5]}...{api_key[-5:] if api_key else 'None'}")
-    headers = {"Authorization": f"Bearer {api_key}"}
+    try:
+        columns = streaming.parse_fields(fields, table_columns("listings"))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    ndjson = streaming.wants_ndjson(request, format)
+    # Any listing change moves the rev; profile edits rewrite listing fields
+    rev, changed_at = versions.listings()
+    query = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    prev, profiles_changed_at = versions.profiles()
+    etag = f'W/"l{rev}.{prev}-{query}{"-n" if ndjson else ""}"'
+    last_modified = max(changed_at, profiles_changed_at)
+    headers = validators(etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    filters = dict(min_score=min_score, profile=profile, status=status, security_min=security_min)
+    try:
+        # The page's last row is looked up first so the next cursor can go
+        # in the headers; the rows then stream up to and including it
+        end = listing_page_end(**filters, limit=limit, after=after)
+    except (ValueError, TypeError):
+        raise HTTPException(400, "invalid cursor")
+    if end is not None:
+        cursor = encode_cursor(end)
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(after=cursor)}>; rel="next"'
+    rows = stream_listings(**filters, after=after, until=end, limit=limit, fields=columns,
+                           chunk=streaming.STREAM_CHUNK_ROWS)
+    return streaming.rows_response(request, rows, ndjson, headers)
 
+# Full-text search over title, match reason and AI notes
+@app.get("/api/listings/search")
+def api_search_listings(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    min_score: float = Query(0.0, ge=0.0, le=1.0),
+    profile: str | None = None,
+    status: str | None = None,
+    security_min: int | None = None,
+    sort: Literal["relevance", "recent"] = "relevance",
+    limit: int = Query(100, ge=1, le=500),
+    after: str | None = None
+):
+    rev, changed_at = versions.listings()
+    query = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    prev, profiles_changed_at = versions.profiles()
+    etag = f'W/"s{rev}.{prev}-{query}"'
+    last_modified = max(changed_at, profiles_changed_at)
+    headers = validators(etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=5)
-        if not r.ok:
-            raise HTTPException(r.status_code, r.text or "HERE API error")
-        return r.json()
-    except Exception as e:
-        raise HTTPException(500, str(e))
+        rows = search_listings(q, min_score=min_score, profile=profile, status=status, security_min=security_min,
+                               limit=limit, after=after, sort=sort)
+    except (ValueError, TypeError, IndexError):
+        raise HTTPException(400, "invalid cursor")
+    if len(rows) == limit:
+        cursor = encode_search_cursor(rows[-1], sort)
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(after=cursor)}>; rel="next"'
+    return rows
 
-@app.get("/api/places/geocode")
-def proxy_places_geocode(request: Request):
-    params = dict(request.query_params)
-    if not params.get("q"):
-        raise HTTPException(400, "Missing q")
+# Live feed of new/changed listings (server-sent events)
+@app.get("/api/listings/stream")
+async def api_listings_stream(
+    request: Request,
+    min_score: float = Query(0.0, ge=0.0, le=1.0),
+    profile: str | None = None,
+    status: str | None = None,
+    security_min: int | None = None,
+    last_id: int | None = None
+):
+    # EventSource resends the last id it saw as a header when reconnecting
+    header = request.headers.get("last-event-id")
+    if last_id is None and header and header.isdigit():
+        last_id = int(header)
+    frames = events.feed.stream(request, last_id, min_score=min_score, profile=profile, status=status, security_min=security_min)
+    return StreamingResponse(frames, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    url = "https://geocode.search.hereapi.com/v1/geocode"
-    api_key = os.getenv("HERE_API_KEY")
-    print(f"--- GEOCODE: USING API KEY: {api_key[:5]}...{api_key[-5:] if api_key else 'None'}")
-    headers = {"Authorization": f"Bearer {api_key}"}
+# AI verdict cache stats
+@app.get("/api/ai-cache")
+def api_ai_cache():
+    from ai_security import cache_stats
+    return cache_stats()
 
-    try:
-        r = requests.get(url, params=params, headers=headers, timeout=7)
-        if not r.ok:
-            raise HTTPException(r.status_code, r.text or "HERE API error")
-        return r.json()
-    except Exception as e:
-        raise HTTPException(500, str(e))
+# Tiered evaluation: pairs per tier and heuristic/LLM agreement per band
+@app.get("/api/eval-tiers")
+def api_eval_tiers():
+    import tiers
+    return tiers.stats()
 
-@app.get("/api/places/lookup")
-def proxy_places_lookup(request: Request):
-    params = dict(request.query_params)
-    if not params.get("id"):
-        raise HTTPException(400, "Missing id")
+# Outbound HTTP latency per upstream endpoint
+@app.get("/api/http-stats")
+def api_http_stats():
+    return latency_summary()
 
-    url = "https://lookup.search.hereapi.com/v1/lookup"
-    api_key = os.getenv("HERE_API_KEY")
-    print(f"--- LOOKUP: USING API KEY: {api_key[:5]}...{api_key[-5:] if api_key else 'None'}")
-    headers = {"Authorization": f"Bearer {api_key}"}
+# Profile leases held by sharded workers (WORKER_SHARDING=1)
+@app.get("/api/workers")
+def api_workers():
+    import leases
+    return leases.stats()
 
-    try:
-        r = requests.get(url, params=params, headers=headers, timeout=5)
-        if not r.ok:
-            raise HTTPException(r.status_code, r.text or "HERE API error")
-        return r.json()
-    except Exception as e:
-        raise HTTPException(500, str(e))
+# Telegram outbox / dispatcher counters
+@app.get("/api/notifications")
+def api_notifications():
+    return notify_queue.dispatcher.stats()
+
+# HERE Places API Proxies (cached, coalesced, async)
+@app.get("/api/places/autosuggest")
+async def proxy_places_autosuggest(request: Request):
+    if os.getenv("USE_FIXTURE") == "1" and not request.query_params.get("q"):
+        return places.FIXTURES["autosuggest"]
+    return await places.proxy("autosuggest", dict(request.query_params))
+
+@app.get("/api/places/geocode")
+async def proxy_places_geocode(request: Request):
+    return await places.proxy("geocode", dict(request.query_params))
+
+@app.get("/api/places/lookup")
+async def proxy_places_lookup(request: Request):
+    return await places.proxy("lookup", dict(request.query_params))
+
+@app.get("/api/places/stats")
+def proxy_places_stats():
+    return places.stats()
 
 # Per-item page
 DETAIL_TEMPLATE = """<!doctype html>
@@ -150,11 +238,23 @@ def _tag_for(sec:int):
     return "Rejected"
 
 @app.get("/item/{item_id}", response_class=HTMLResponse)
-def item_page(item_id: int):
-    row = get_listing(item_id)
-    if not row:
-        raise HTTPException(404, "Not found")
-    html = DETAIL_TEMPLATE.format(
+def item_page(item_id: int, request: Request):
+    # Rendered pages are cached until the row's rev moves (see http_cache)
+    entry = versions.page(item_id)
+    if entry is None:
+        generation = versions.generation
+        row = get_listing(item_id)
+        if not row:
+            raise HTTPException(404, "Not found")
+        entry = versions.store_page(item_id, row.get("rev"), _render_item(row), generation)
+    etag, last_modified, html = entry
+    headers = validators(etag, last_modified, f"public, max-age={ITEM_MAX_AGE}")
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=html, headers=headers)
+
+def _render_item(row):
+    return DETAIL_TEMPLATE.format(
         title=row.get("title","Item"),
         price=(row.get("price_cents") or 0)/100,
         profile=row.get("profile",""),
@@ -164,12 +264,37 @@ def item_page(item_id: int):
         reason=row.get("ai_reasons") or row.get("reason") or "",
         tag=_tag_for(int(row.get("security_score") or 0))
     )
-    return HTMLResponse(content=html)
+
+# ---- Prometheus scrape endpoint ----
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    outbox = notify_queue.dispatcher.stats()["outbox"]
+    for status in ("pending", "sending", "sent", "failed"):
+        metrics.gauge("outbox_messages", outbox.get(status, 0), status=status)
+    from ai_security import cache_stats
+    ai = cache_stats()
+    metrics.gauge("ai_cache_entries", ai["entries"])
+    metrics.gauge("ai_cache_hit_ratio", ai["hit_ratio"])
+    metrics.gauge("item_page_cache_entries", versions.stats()["pages"])
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 # ---- HTTP trigger for worker ----
 @app.post("/run-worker")
-def run_worker(token: str):
+def run_worker(token: str, profile: bool = False):
     if token != os.getenv("TRIGGER_SECRET"):
         raise HTTPException(401, "invalid token")
-    result = run_once()
-    return JSONResponse(result)
+    # profile=true samples the cycle's stacks; see the job's "profile" field
+    job, created = jobs.submit_cycle(profile=profile)
+    # A cycle already in flight is reported instead of starting another
+    return JSONResponse({"ok": True, "job_id": job["id"], "status": job["status"], "created": created}, status_code=202)
+
+@app.get("/jobs")
+def job_list():
+    return jobs.list_jobs()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "job not found")
+    return job
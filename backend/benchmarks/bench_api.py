@@ -0,0 +1,113 @@
+"""Load-test the read endpoints through the ASGI app (no sockets, no server).
+
+Run from backend/:  python -m benchmarks.bench_api --scale medium --requests 2000 --concurrency 32
+
+Seeds a throwaway database with synthetic listings, then fires concurrent
+requests at /api/listings, /api/profiles and /item/{id} and reports
+requests/s with p50/p99 latency per endpoint.
+"""
+import argparse, asyncio, json, os, random, tempfile, time
+from benchmarks.synthetic import SCALES, make_profiles, iter_listings
+from benchmarks import report
+
+def _seed(args):
+    import db
+    db.init_db()
+    rng = random.Random(args.seed)
+    profiles = make_profiles(args.profiles, rng)
+    for p in profiles:
+        db.create_profile(p)
+    names = [p["name"] for p in profiles]
+    batch = []
+    for it in iter_listings(args.listings, args.seed):
+        it.update(score=round(rng.random(), 3), status=rng.choice(("accepted", "rejected")),
+                  security_score=rng.randint(0, 100), ai_model="bench", ai_reasons="synthetic")
+        batch.append(it)
+        if len(batch) == 1000:
+            db.upsert_listings(batch, rng.choice(names))
+            batch = []
+    if batch:
+        db.upsert_listings(batch, rng.choice(names))
+    return names
+
+def _endpoints(names, n_listings, rng):
+    return {
+        "/api/listings": lambda: "/api/listings?limit=100",
+        "/api/listings?profile&status": lambda: f"/api/listings?profile={rng.choice(names)}&status=accepted&security_min=70",
+        "/api/profiles": lambda: "/api/profiles",
+        "/item/{id}": lambda: f"/item/{rng.randint(1, max(1, n_listings))}",
+    }
+
+async def _load(client, make_url, total, concurrency):
+    latencies, errors = [], 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            r = await client.get(make_url())
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return dict(rps=round(total / wall, 1), errors=errors, **report.percentiles(latencies))
+
+async def _run_all(args, names):
+    import httpx
+    from app import app
+    rng = random.Random(args.seed)
+    out = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make_url in _endpoints(names, args.listings, rng).items():
+            await _load(client, make_url, min(50, args.requests), args.concurrency)  # warm-up
+            out[name] = await _load(client, make_url, args.requests, args.concurrency)
+    return out
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({"TELEGRAM_BOT_TOKEN": "", "TELEGRAM_CHAT_ID": "", "OPENAI_API_KEY": "", "HERE_API_KEY": ""})
+        import db
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        names = _seed(args)
+        t_seed = time.perf_counter() - t0
+        endpoints = asyncio.run(_run_all(args, names))
+        return {
+            "scenario": {"profiles": args.profiles, "listings": args.listings,
+                         "requests": args.requests, "concurrency": args.concurrency},
+            "metrics": {"seed_seconds": round(t_seed, 3), "peak_rss_mb": report.peak_rss_mb(), "endpoints": endpoints},
+        }
+
+def parser():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=SCALES, help="preset profiles x listings")
+    ap.add_argument("--profiles", type=int, default=10)
+    ap.add_argument("--listings", type=int, default=10000)
+    ap.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print the result as JSON only")
+    return ap
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.scale:
+        args.profiles, args.listings = SCALES[args.scale]
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+        return
+    m = result["metrics"]
+    print(f"{args.listings} listings, {args.profiles} profiles, {args.requests} requests x {args.concurrency} concurrent")
+    print(f"  seed {m['seed_seconds']:.2f}s   peak RSS {m['peak_rss_mb']} MB")
+    for name, e in m["endpoints"].items():
+        print(f"  {name:30s} {e['rps']:9,.0f} req/s  p50 {e['p50_ms']:7.2f}ms  p99 {e['p99_ms']:7.2f}ms  errors {e['errors']}")
+
+if __name__ == "__main__":
+    main()
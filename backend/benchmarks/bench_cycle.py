@@ -0,0 +1,133 @@
+"""End-to-end worker cycle: synthetic crawl -> AI stand-in -> SQLite -> Telegram stand-in.
+
+Run from backend/:  python -m benchmarks.bench_cycle --scale medium
+                    python -m benchmarks.bench_cycle --profiles 50 --listings 2000 --llm-latency 0.3
+
+Uses a throwaway database and the local stand-in from benchmarks.fakes;
+nothing is sent to OpenAI or Telegram. A second, unchanged crawl is timed
+too, which measures the incremental skip path.
+"""
+import argparse, contextlib, io, json, os, random, tempfile, time, tracemalloc
+from benchmarks.synthetic import SCALES, make_profiles, SyntheticSource
+from benchmarks.fakes import FakeUpstream
+from benchmarks import report
+
+SPANS = ("cycle.scrape", "cycle.score", "cycle.geo", "cycle.evaluate", "cycle.llm_tier", "cycle.local_analysis_wait", "cycle.near_dup", "cycle.upsert", "cycle.enqueue", "http.openai",
+         "http.telegram.sendMessage", "db.transaction")
+
+def _configure(tmp, upstream, args):
+    # Everything the backend reads from the environment at import time; set
+    # before the first backend import so .env never points us at real APIs
+    os.environ.update({
+        "OPENAI_API_KEY": "" if args.heuristic else "bench",
+        "OPENAI_BASE_URL": upstream.openai_url,
+        "OPENAI_MODEL": "bench-model",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": "1",
+        "TELEGRAM_API_URL": upstream.telegram_url,
+        "TELEGRAM_CHAT_RATE": str(args.telegram_rate),
+        "TELEGRAM_GLOBAL_RATE": str(args.telegram_rate),
+        "AI_RATE_PER_SEC": str(args.llm_rate),
+        "AI_RATE_BURST": str(max(1, int(args.llm_rate))),
+        "HERE_API_KEY": "",
+        "PROFILE_DIR": os.path.join(tmp, "profiles"),
+    })
+    import db
+    db.DB_PATH = os.path.join(tmp, "bench.db")
+
+def _seed_profiles(n, seed):
+    import db
+    db.init_db()
+    rng = random.Random(seed)
+    for i, p in enumerate(make_profiles(n, rng)):
+        p["min_score"] = round(rng.uniform(0.1, 0.5), 2)
+        # Spread profiles over a few chats, like a handful of users would
+        p["chat_id"] = str(1000 + i % 8)
+        db.create_profile(p)
+
+def _spans():
+    import metrics
+    summary = metrics.latency_summary()
+    return {name: {k: summary[name][k] for k in ("count", "p50_ms", "p99_ms")} for name in SPANS if name in summary}
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp, FakeUpstream(args.llm_latency, args.telegram_latency) as upstream:
+        _configure(tmp, upstream, args)
+        from job_runner import run_once
+        from notify_queue import dispatcher
+        _seed_profiles(args.profiles, args.seed)
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        # Per-listing log lines would dominate at this scale
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            first = run_once(source=SyntheticSource(args.listings, args.seed))
+            t_cycle = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            dispatcher.drain(timeout=600)
+            t_drain = time.perf_counter() - t0
+            spans = _spans()
+            t0 = time.perf_counter()
+            second = run_once(source=SyntheticSource(args.listings, args.seed))
+            t_rerun = time.perf_counter() - t0
+
+        metrics = {
+            "cycle_seconds": round(t_cycle, 3),
+            "listings_per_sec": round(args.listings / t_cycle, 1),
+            "pairs_per_sec": round(args.listings * args.profiles / t_cycle, 1),
+            "drain_seconds": round(t_drain, 3),
+            "rerun_seconds": round(t_rerun, 3),
+            "peak_rss_mb": report.peak_rss_mb(),
+            "spans": spans,
+        }
+        if args.tracemalloc:
+            metrics["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        return {
+            "scenario": {"profiles": args.profiles, "listings": args.listings, "llm_latency": args.llm_latency,
+                         "telegram_latency": args.telegram_latency, "heuristic": args.heuristic},
+            "counts": {"processed": first["processed"], "queued": first["queued"],
+                       "rerun_skipped": second["skipped"], "sent": dispatcher.sent,
+                       "llm_calls": first["llm_calls"], "heuristic_only": first["heuristic_only"],
+                       "deferred": first["deferred"],
+                       "openai_requests": upstream.requests["openai"],
+                       "telegram_requests": upstream.requests["telegram"]},
+            "metrics": metrics,
+        }
+
+def parser():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=SCALES, help="preset profiles x listings")
+    ap.add_argument("--profiles", type=int, default=10)
+    ap.add_argument("--listings", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake OpenAI request")
+    ap.add_argument("--telegram-latency", type=float, default=0.05, help="seconds per fake sendMessage")
+    ap.add_argument("--llm-rate", type=float, default=50, help="AI_RATE_PER_SEC for the run")
+    ap.add_argument("--telegram-rate", type=float, default=0, help="Telegram rate limits for the run (0 = off)")
+    ap.add_argument("--heuristic", action="store_true", help="no OpenAI stand-in: heuristic verdicts only")
+    ap.add_argument("--tracemalloc", action="store_true", help="also report Python heap peak (slower)")
+    ap.add_argument("--json", action="store_true", help="print the result as JSON only")
+    return ap
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.scale:
+        args.profiles, args.listings = SCALES[args.scale]
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+        return
+    m, c = result["metrics"], result["counts"]
+    print(f"{args.profiles} profiles x {args.listings} listings")
+    print(f"  cycle      {m['cycle_seconds']:8.2f}s  {m['listings_per_sec']:10,.0f} listings/s  {m['pairs_per_sec']:12,.0f} pairs/s")
+    print(f"  drain      {m['drain_seconds']:8.2f}s  {c['sent']} sent in {c['telegram_requests']} messages")
+    print(f"  rerun      {m['rerun_seconds']:8.2f}s  {c['rerun_skipped']:,} pairs skipped")
+    print(f"  openai     {c['openai_requests']} requests   peak RSS {m['peak_rss_mb']} MB")
+    print(f"  tiers      {c['llm_calls']} AI, {c['heuristic_only']} heuristic only, {c['deferred']} deferred")
+    for name, s in m["spans"].items():
+        print(f"  {name:28s} n={s['count']:<7} p50 {s['p50_ms']:8.2f}ms  p99 {s['p99_ms']:8.2f}ms")
+
+if __name__ == "__main__":
+    main()
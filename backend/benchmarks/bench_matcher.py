@@ -0,0 +1,38 @@
+"""Compare per-pair `score_item` with the compiled `ProfileMatcher`.
+
+Run from backend/:  python -m benchmarks.bench_matcher --profiles 1000 --titles 10000
+"""
+import argparse, random, time
+from filter_simple import score_item
+from matcher import ProfileMatcher
+from benchmarks.synthetic import make_profiles, make_titles
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--profiles", type=int, default=1000)
+    ap.add_argument("--titles", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+    profiles, items = make_profiles(args.profiles, rng), make_titles(args.titles, rng)
+
+    t0 = time.perf_counter()
+    naive = [[score_item(it, p) for p in profiles] for it in items]
+    t_naive = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    m = ProfileMatcher(profiles)
+    t_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    compiled = [m.score_all(it) for it in items]
+    t_compiled = time.perf_counter() - t0
+
+    assert naive == compiled, "matcher results differ from score_item"
+    pairs = args.profiles * args.titles
+    print(f"{args.profiles} profiles x {args.titles} titles = {pairs:,} pairs")
+    print(f"  score_item      {t_naive:8.2f}s  {pairs / t_naive:12,.0f} pairs/s")
+    print(f"  ProfileMatcher  {t_compiled:8.2f}s  {pairs / t_compiled:12,.0f} pairs/s  (build {t_build * 1000:.1f}ms)")
+    print(f"  speed-up        {t_naive / t_compiled:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Cold-start costs of the web app and the fixed overhead of each worker cycle.
+
+Run from backend/:  python -m benchmarks.bench_startup --runs 5
+
+- import_ms: `import app` in a fresh interpreter
+- first_response_{cold,warm}_ms: from launching uvicorn until GET
+  /api/profiles answers, on a new database (cold, includes creating the
+  schema) and on an existing one (warm, the usual restart after a spin-down)
+- init_db_{first,repeat}_us: `db.init_db()` on a current schema, first
+  call in a process and repeated calls
+- cycle_overhead_ms: `run_once` over an empty source with the scale's
+  profiles, i.e. everything a cycle costs besides the listings
+"""
+import argparse, json, os, random, socket, statistics, subprocess, sys, tempfile, time, urllib.request
+from pathlib import Path
+from benchmarks.synthetic import SCALES, make_profiles
+from benchmarks import report
+
+BACKEND = Path(__file__).resolve().parent.parent
+QUIET_ENV = {"TELEGRAM_BOT_TOKEN": "", "TELEGRAM_CHAT_ID": "", "OPENAI_API_KEY": "", "HERE_API_KEY": "",
+             "WORKER_INTERVAL_SECONDS": "0", "LOCAL_ANALYSIS_WORKERS": "0"}
+
+def _env(db_path):
+    return dict(os.environ, **QUIET_ENV, DB_PATH=str(db_path))
+
+def _import_ms(db_path) -> float:
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=_env(db_path),
+                         check=True, capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1]) * 1000
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _first_response_ms(db_path, timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/profiles"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=BACKEND, env=_env(db_path), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - t0) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def _in_process(args, db_path) -> dict:
+    os.environ.update(QUIET_ENV)
+    import db
+    db.DB_PATH = str(db_path)
+    db.init_db()
+    for p in make_profiles(args.profiles, random.Random(args.seed)):
+        db.create_profile(p)
+
+    first = []
+    for _ in range(args.runs):
+        db._ready.clear()
+        t0 = time.perf_counter()
+        db.init_db()
+        first.append((time.perf_counter() - t0) * 1e6)
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        db.init_db()
+    repeat = (time.perf_counter() - t0) * 1e6 / 1000
+
+    from job_runner import run_once
+    run_once(source=[])  # warm-up: imports, thread pools
+    cycles = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        run_once(source=[])
+        cycles.append((time.perf_counter() - t0) * 1000)
+    return {"init_db_first_us": round(statistics.median(first), 1), "init_db_repeat_us": round(repeat, 2),
+            "cycle_overhead_ms": round(statistics.median(cycles), 3)}
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        warm_db = Path(tmp) / "warm.db"
+        # Also creates the schema and profiles the warm runs start from
+        in_process = _in_process(args, warm_db)
+        imports = [_import_ms(warm_db) for _ in range(args.runs)]
+        cold = [_first_response_ms(Path(tmp) / f"cold{i}.db") for i in range(args.runs)]
+        warm = [_first_response_ms(warm_db) for _ in range(args.runs)]
+    return {
+        "scenario": {"profiles": args.profiles, "runs": args.runs},
+        "metrics": {
+            "import_ms": round(statistics.median(imports), 1),
+            "first_response_cold_ms": round(statistics.median(cold), 1),
+            "first_response_warm_ms": round(statistics.median(warm), 1),
+            **in_process,
+            "peak_rss_mb": report.peak_rss_mb(),
+        },
+    }
+
+def parser():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=SCALES, help="preset profiles (listings are not used)")
+    ap.add_argument("--profiles", type=int, default=10)
+    ap.add_argument("--runs", type=int, default=5, help="repetitions; medians are reported")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print the result as JSON only")
+    return ap
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.scale:
+        args.profiles = SCALES[args.scale][0]
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+        return
+    m = result["metrics"]
+    print(f"{args.profiles} profiles, median of {args.runs} runs")
+    print(f"  import app            {m['import_ms']:9.1f} ms")
+    print(f"  first response cold   {m['first_response_cold_ms']:9.1f} ms")
+    print(f"  first response warm   {m['first_response_warm_ms']:9.1f} ms")
+    print(f"  init_db first/repeat  {m['init_db_first_us']:9.1f} us / {m['init_db_repeat_us']:.2f} us")
+    print(f"  cycle overhead        {m['cycle_overhead_ms']:9.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Local stand-in for the OpenAI and Telegram HTTP APIs.
+
+Serves both on one loopback port with a configurable delay per request, so
+a benchmark exercises the real clients, pools, rate limiters and retries
+without leaving the machine or spending tokens.
+"""
+import hashlib, json, re, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_INDEX = re.compile(r"^#(\d+)$", re.M)
+
+def verdict(text: str) -> dict:
+    """Deterministic verdict: the same listing always gets the same score."""
+    score = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:4], 16) % 101
+    return {
+        "security_score": score,
+        "relevant": True,
+        "reasons": ["synthetic verdict"],
+        "final_decision": "accept" if score >= 70 else "reject",
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        upstream = self.server.upstream
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            kind = "openai"
+            time.sleep(upstream.llm_latency)
+            prompt = body["messages"][-1]["content"]
+            # Batch prompts list numbered listings; answer each one by index
+            blocks = _INDEX.split(prompt.split("Listings:", 1)[-1])[1:]
+            if blocks:
+                content = [dict(verdict(blocks[i + 1]), index=int(blocks[i])) for i in range(0, len(blocks), 2)]
+            else:
+                content = verdict(prompt)
+            reply = {
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "bench"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(content)}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20, "total_tokens": len(prompt) // 4 + 20},
+            }
+        elif self.path.endswith("/sendMessage"):
+            kind = "telegram"
+            time.sleep(upstream.telegram_latency)
+            reply = {"ok": True, "result": {"message_id": 1}}
+        else:
+            return self._reply(404, {"error": "not found"})
+        with upstream.lock:
+            upstream.requests[kind] += 1
+        self._reply(200, reply)
+
+class FakeUpstream:
+    """Context manager running the stand-in on a background thread.
+
+    `openai_url` and `telegram_url` go into OPENAI_BASE_URL and
+    TELEGRAM_API_URL; `requests` counts the calls served per API.
+    """
+
+    def __init__(self, llm_latency: float = 0.2, telegram_latency: float = 0.05):
+        self.llm_latency = llm_latency
+        self.telegram_latency = telegram_latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.upstream = self
+        threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True).start()
+        base = f"http://127.0.0.1:{self._server.server_port}"
+        self.openai_url = base + "/v1"
+        self.telegram_url = base
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
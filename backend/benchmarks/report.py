@@ -0,0 +1,63 @@
+"""Timing helpers, peak memory, and the baseline file used to spot regressions."""
+import json, os, resource, sys
+from pathlib import Path
+
+BASELINES = Path(os.getenv("BENCH_BASELINES", Path(__file__).parent / "baselines.json"))
+# Relative change tolerated before a metric counts as a regression
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+# Metrics where bigger is better; everything else numeric is "lower is better"
+HIGHER_IS_BETTER = ("_per_sec", "rps")
+# Absolute changes below these are timer noise, whatever the ratio
+NOISE_FLOOR = {"_us": 20.0, "_ms": 1.0, "_seconds": 0.05, "_mb": 5.0}
+
+def percentiles(samples) -> dict:
+    """p50/p99/max of latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 3)
+    return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(s[-1] * 1000, 3)}
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _flatten(d, prefix=""):
+    for k, v in d.items():
+        if isinstance(v, dict):
+            yield from _flatten(v, f"{prefix}{k}.")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield f"{prefix}{k}", v
+
+def load_baselines() -> dict:
+    return json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+
+def save_baseline(name: str, result: dict):
+    data = load_baselines()
+    data[name] = result
+    BASELINES.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+def compare(name: str, result: dict, tolerance: float = TOLERANCE) -> list:
+    """Measurements in `result["metrics"]` worse than the saved baseline.
+
+    Returns (metric, baseline, current) tuples for every change beyond
+    `tolerance`; empty when there is no baseline yet. Baselines are only
+    meaningful on the machine that recorded them.
+    """
+    base = load_baselines().get(name)
+    if not base:
+        return []
+    old = dict(_flatten(base.get("metrics", {})))
+    worse = []
+    for metric, value in _flatten(result.get("metrics", {})):
+        ref = old.get(metric)
+        if not ref or value is None:
+            continue
+        higher = metric.endswith(HIGHER_IS_BETTER)
+        change = (ref - value) / ref if higher else (value - ref) / ref
+        floor = next((f for suffix, f in NOISE_FLOOR.items() if metric.endswith(suffix)), 0.0)
+        if change > tolerance and abs(value - ref) > floor:
+            worse.append((metric, ref, value))
+    return worse
@@ -0,0 +1,56 @@
+"""Run the benchmark suite at one scale and compare against saved baselines.
+
+Run from backend/:  python -m benchmarks.run --scale small --save   # record baselines
+                    python -m benchmarks.run --scale small          # compare, exit 1 on regression
+
+Each benchmark runs in its own interpreter so peak memory and module-level
+settings never leak from one into the next. Baselines live in
+benchmarks/baselines.json (BENCH_BASELINES) and are only comparable on
+the machine that recorded them.
+"""
+import argparse, json, subprocess, sys
+from pathlib import Path
+from benchmarks import report
+from benchmarks.synthetic import SCALES
+
+BACKEND = Path(__file__).resolve().parent.parent
+SUITE = {
+    "cycle": ["benchmarks.bench_cycle"],
+    "cycle-heuristic": ["benchmarks.bench_cycle", "--heuristic"],
+    "api": ["benchmarks.bench_api"],
+    "startup": ["benchmarks.bench_startup"],
+}
+# Unrecognised options are passed through to these (e.g. --llm-latency 0.5)
+TAKES_EXTRA = ("cycle", "cycle-heuristic")
+
+def _run(module_args, scale, extra):
+    cmd = [sys.executable, "-m", *module_args, "--scale", scale, "--json", *extra]
+    out = subprocess.run(cmd, cwd=BACKEND, check=True, capture_output=True, text=True).stdout
+    # The JSON result is the last line; anything before is library chatter
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=SCALES, default="small")
+    ap.add_argument("--only", choices=SUITE, action="append", help="run just these benchmarks")
+    ap.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    ap.add_argument("--tolerance", type=float, default=report.TOLERANCE)
+    args, extra = ap.parse_known_args(argv)
+
+    regressions = 0
+    for name in args.only or SUITE:
+        key = f"{name}:{args.scale}"
+        result = _run(SUITE[name], args.scale, extra if name in TAKES_EXTRA else [])
+        print(f"{key}: " + json.dumps(result["metrics"], separators=(",", ":"))[:400])
+        if args.save:
+            report.save_baseline(key, result)
+            continue
+        for metric, old, new in report.compare(key, result, args.tolerance):
+            regressions += 1
+            print(f"  REGRESSION {metric}: {old} -> {new}")
+    if args.save:
+        print(f"Baselines written to {report.BASELINES}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
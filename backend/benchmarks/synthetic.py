@@ -0,0 +1,59 @@
+"""Deterministic synthetic profiles and listings for the benchmarks."""
+import json, random
+from datetime import datetime, timedelta, timezone
+from sources import Source
+
+WORDS = ("iphone samsung galaxy pixel ps5 xbox switch macbook ipad airpods "
+         "128gb 256gb 512gb pro max mini ultra sealed new used mint boxed "
+         "unlocked cracked 12 13 14 15 s21 s22 s23 oled disc digital").split()
+
+# Scales from the backlog: profiles x listings
+SCALES = {
+    "small": (10, 100),
+    "medium": (100, 10_000),
+    "large": (1000, 100_000),
+}
+
+def make_profiles(n, rng):
+    profiles = []
+    for i in range(n):
+        lo = rng.choice([None, rng.randrange(0, 30000, 500)])
+        profiles.append({
+            "name": f"profile-{i}",
+            "keywords": ", ".join(rng.sample(WORDS, rng.randint(1, 6))),
+            "price_min_cents": lo,
+            "price_max_cents": rng.choice([None, (lo or 0) + rng.randrange(5000, 60000, 500)]),
+        })
+    return profiles
+
+def make_titles(n, rng):
+    return [
+        {"title": " ".join(rng.sample(WORDS, rng.randint(3, 8))).title(), "price_cents": rng.randrange(1000, 100000, 100)}
+        for _ in range(n)
+    ]
+
+def iter_listings(n, seed=1):
+    """Yield `n` full listing dicts; the same seed always yields the same crawl."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(n):
+        it = make_titles(1, rng)[0]
+        it.update(
+            url=f"https://example.test/item/{seed}-{i}",
+            created_at=(start + timedelta(seconds=i)).isoformat(),
+            description=" ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+            photos_count=rng.randint(0, 8),
+            seller_meta=json.dumps({"rating": round(rng.uniform(2, 5), 1), "joined_days": rng.randint(1, 3000)}),
+        )
+        yield it
+
+class SyntheticSource(Source):
+    """Listing source producing `n` generated listings."""
+    name = "synthetic"
+
+    def __init__(self, n, seed=1):
+        self.n = n
+        self.seed = seed
+
+    def __iter__(self):
+        return iter_listings(self.n, self.seed)
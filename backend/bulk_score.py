@@ -0,0 +1,39 @@
+import numpy as np
+from filter_simple import score_hits
+
+class ScoreMatrix:
+    """Keyword/price scores for one batch: rows are listings, columns profiles."""
+
+    def __init__(self, items, matcher):
+        self.items = items
+        self.profiles = matcher.profiles
+        n_items, n_profiles = len(items), len(self.profiles)
+
+        # Columnar listing side: prices plus a dense hit-count matrix filled
+        # from the matcher's sparse per-title results
+        price = np.fromiter(((it.get("price_cents") or 0) for it in items), dtype=np.float64, count=n_items)
+        self.hits = np.zeros((n_items, n_profiles), dtype=np.int32)
+        for i, it in enumerate(items):
+            for j, h in matcher.hits(it.get("title")).items():
+                self.hits[i, j] = h
+
+        # Profile side; NaN bounds compare False, i.e. "no limit"
+        def column(key, default=np.nan):
+            vals = (p.get(key) for p in self.profiles)
+            return np.fromiter((default if v is None else v for v in vals), dtype=np.float64, count=n_profiles)
+        pmin, pmax = column("price_min_cents"), column("price_max_cents")
+        self.min_score = column("min_score", 0.0)
+        n_kws = np.asarray(matcher.kw_counts, dtype=np.float64)
+
+        self.price_ok = ~((price[:, None] < pmin[None, :]) | (price[:, None] > pmax[None, :]))
+        ratio = np.divide(self.hits, np.maximum(1.0, n_kws)[None, :], where=n_kws[None, :] > 0,
+                          out=np.zeros((n_items, n_profiles), dtype=np.float64))
+        self.scores = np.where(self.price_ok, ratio, 0.0)
+        self.passed = self.scores >= self.min_score[None, :]
+        self._n_kws = matcher.kw_counts
+
+    def reason(self, i: int, j: int) -> str:
+        return score_hits(self.items[i], self.profiles[j], int(self.hits[i, j]), self._n_kws[j])[1]
+
+def score_matrix(items, matcher) -> ScoreMatrix:
+    return ScoreMatrix(list(items), matcher)
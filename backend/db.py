@@ -1,25 +1,76 @@
-import sqlite3
+import sqlite3, json, os, re, time, threading, base64
+from datetime import datetime, timezone
+from contextlib import contextmanager
 from pathlib import Path
+import metrics
 
-DB_PATH = Path(__file__).parent / "data.db"
+DB_PATH = Path(os.getenv("DB_PATH") or Path(__file__).parent / "data.db")
+
+# Tuned for one writer (the worker) and many readers (the web API)
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers never block on the writer
+    "PRAGMA synchronous=NORMAL",    # fsync at checkpoints, not every commit
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",     # 16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728",
+)
+
+_local = threading.local()
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Per-thread autocommit connection, reused for the thread's lifetime."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != str(DB_PATH):
+        conn = sqlite3.connect(DB_PATH, timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn, _local.path = conn, str(DB_PATH)
     return conn
 
+@contextmanager
+def transaction():
+    """Yield a cursor inside BEGIN IMMEDIATE ... COMMIT (joins an open one)."""
+    conn = get_conn()
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    # Time includes waiting for the write lock, the usual cost under contention
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        metrics.inc("db_transactions", outcome="rollback")
+        raise
+    conn.commit()
+    metrics.inc("db_transactions", outcome="commit")
+    metrics.observe("db.transaction", time.perf_counter() - start)
+
+def close_conn():
+    """Close this thread's connection (next get_conn() reopens)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
 def _safe_alter(c, sql):
     try:
         c.execute(sql)
-    except Exception:
-        # Column may already exist; ignore
-        pass
+    except sqlite3.OperationalError as e:
+        # Databases from before user_version may already have the column
+        if "duplicate column" not in str(e):
+            raise
 
-def init_db():
-    conn = get_conn()
-    c = conn.cursor()
+# ---------- Schema migrations ----------
+# Each step moves the schema up one version (PRAGMA user_version). Steps 1-7
+# also run on databases created before versioning, which may already hold
+# some of their tables and columns, so they only add what is missing. Append
+# new steps at the end; never edit one that has shipped.
 
-    # ---- Profiles table (as in earlier version) ----
+def _m1_base(c):
     c.execute("""
     CREATE TABLE IF NOT EXISTS profiles (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -33,8 +84,6 @@ def init_db():
     """)
     _safe_alter(c, "ALTER TABLE profiles ADD COLUMN location TEXT")
     _safe_alter(c, "ALTER TABLE profiles ADD COLUMN radius INTEGER")
-
-    # ---- Listings table + new columns ----
     c.execute("""
     CREATE TABLE IF NOT EXISTS listings (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,133 +101,484 @@ def init_db():
     _safe_alter(c, "ALTER TABLE listings ADD COLUMN security_score INTEGER")
     _safe_alter(c, "ALTER TABLE listings ADD COLUMN ai_model TEXT")
     _safe_alter(c, "ALTER TABLE listings ADD COLUMN ai_reasons TEXT")
+    # Match list_listings: equality filters first, then the sort key
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listings_recent ON listings(created_at DESC, id DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listings_profile_recent ON listings(profile, created_at DESC, id DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listings_status_recent ON listings(status, created_at DESC, id DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listings_profile_status_recent ON listings(profile, status, created_at DESC, id DESC)")
 
-    conn.commit()
-    conn.close()
+def _m2_incremental(c):
+    # Fingerprints of the listing and profile a row was evaluated from
+    _safe_alter(c, "ALTER TABLE listings ADD COLUMN item_fp TEXT")
+    _safe_alter(c, "ALTER TABLE listings ADD COLUMN profile_fp TEXT")
+    # Change sequence: bumped whenever upsert_listings changes a row
+    _safe_alter(c, "ALTER TABLE listings ADD COLUMN rev INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listings_rev ON listings(rev)")
+
+def _m3_ai_cache_outbox(c):
+    # AI verdict cache (keyed on a hash of model + rendered prompt)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ai_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        verdict TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_created ON ai_cache(created_at)")
+    # Telegram outbox (one row per chat x listing version)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT NOT NULL,
+        dedupe_key TEXT NOT NULL,
+        listing_id INTEGER,
+        profile TEXT,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        claimed_at REAL,
+        created_at REAL NOT NULL,
+        sent_at REAL,
+        last_error TEXT,
+        UNIQUE(chat_id, dedupe_key)
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+def _m4_leases(c):
+    # Work-unit leases for sharded workers (one row per profile)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+        unit TEXT PRIMARY KEY,
+        owner TEXT,
+        token INTEGER NOT NULL DEFAULT 0,
+        expires_at REAL,
+        claimed_at REAL,
+        finished_at REAL
+    );
+    """)
+
+def _m5_near_dup(c):
+    # Near-duplicate index (see near_dup.py): MinHash per URL and its LSH band keys
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS listing_sigs (
+        url TEXT PRIMARY KEY,
+        sig BLOB NOT NULL,
+        added REAL NOT NULL
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_listing_sigs_added ON listing_sigs(added)")
+    # Clustered by key then age, so "newest N URLs in this bucket" is one range read
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        key INTEGER NOT NULL,
+        added REAL NOT NULL,
+        url TEXT NOT NULL,
+        PRIMARY KEY (key, added, url)
+    ) WITHOUT ROWID;
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lsh_buckets_url ON lsh_buckets(url)")
+
+def _m6_geo(c):
+    # Geocoded centre of a profile's `location`; radius is in km
+    _safe_alter(c, "ALTER TABLE profiles ADD COLUMN lat REAL")
+    _safe_alter(c, "ALTER TABLE profiles ADD COLUMN lng REAL")
+    _safe_alter(c, "ALTER TABLE listings ADD COLUMN lat REAL")
+    _safe_alter(c, "ALTER TABLE listings ADD COLUMN lng REAL")
+    # Geocoding results by normalised query (lat NULL: place not found)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        query TEXT PRIMARY KEY,
+        lat REAL,
+        lng REAL,
+        label TEXT,
+        created_at REAL NOT NULL
+    );
+    """)
+
+def _m7_listings_fts(c):
+    _init_listings_fts(c)
+
+def _m8_outbox_finished(c):
+    # When a message reached 'sent' or 'failed'; pruning counts from here
+    _safe_alter(c, "ALTER TABLE outbox ADD COLUMN finished_at REAL")
+    c.execute("UPDATE outbox SET finished_at = COALESCE(sent_at, created_at) WHERE status IN ('sent', 'failed')")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_finished ON outbox(finished_at)")
+
+def _m9_unverified_fallbacks(c):
+    # Heuristic stand-ins for failed AI calls were stored as passes; new revs
+    # so caches and the feed pick up the change
+    c.execute("""UPDATE listings SET status = 'unverified', rev = (SELECT COALESCE(MAX(rev), 0) FROM listings) + id
+                 WHERE ai_model = 'fallback' AND status IS NOT 'unverified'""")
+
+def _m10_profiles_rev(c):
+    # Profiles version for HTTP caching, bumped by triggers so writes from any
+    # process (worker geocoding, other app workers) move it
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS revs (
+        name TEXT PRIMARY KEY,
+        rev INTEGER NOT NULL,
+        changed_at REAL NOT NULL
+    );
+    """)
+    c.execute("INSERT OR IGNORE INTO revs (name, rev, changed_at) VALUES ('profiles', 1, ?)", (time.time(),))
+    for name, event in (("insert", "INSERT"), ("update", "UPDATE"), ("delete", "DELETE")):
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS profiles_rev_{name} AFTER {event} ON profiles BEGIN
+            UPDATE revs SET rev = rev + 1, changed_at = (julianday('now') - 2440587.5) * 86400.0 WHERE name = 'profiles';
+        END;
+        """)
+
+MIGRATIONS = [_m1_base, _m2_incremental, _m3_ai_cache_outbox, _m4_leases, _m5_near_dup, _m6_geo, _m7_listings_fts,
+              _m8_outbox_finished, _m9_unverified_fallbacks, _m10_profiles_rev]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Database files already checked by this process
+_ready = set()
+
+def schema_version() -> int:
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+def init_db():
+    """Bring the schema up to SCHEMA_VERSION (a no-op after the first call per file)."""
+    path = str(DB_PATH)
+    if path in _ready:
+        return
+    if schema_version() < SCHEMA_VERSION:
+        with transaction() as c:
+            # Re-read under the write lock: another process may have just migrated
+            version = c.execute("PRAGMA user_version").fetchone()[0]
+            for step in MIGRATIONS[version:]:
+                step(c)
+            c.execute(f"PRAGMA user_version = {max(version, SCHEMA_VERSION)}")
+        if version < SCHEMA_VERSION:
+            print(f"Database schema migrated from v{version} to v{SCHEMA_VERSION}")
+            # Refresh planner statistics for the new indexes
+            get_conn().execute("PRAGMA optimize")
+    _ready.add(path)
+
+def _init_listings_fts(c):
+    # Full-text index over the listing text; external content, so the text
+    # is stored once (in listings) and the triggers keep the index in step
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'listings_fts'")
+    created = c.fetchone() is None
+    c.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+        title, reason, ai_reasons,
+        content='listings', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS listings_fts_insert AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts (rowid, title, reason, ai_reasons) VALUES (new.id, new.title, new.reason, new.ai_reasons);
+    END;
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS listings_fts_delete AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts (listings_fts, rowid, title, reason, ai_reasons)
+            VALUES ('delete', old.id, old.title, old.reason, old.ai_reasons);
+    END;
+    """)
+    # Re-evaluations mostly rewrite the same text: only reindex real changes
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS listings_fts_update AFTER UPDATE OF title, reason, ai_reasons ON listings
+    WHEN (old.title, old.reason, old.ai_reasons) IS NOT (new.title, new.reason, new.ai_reasons) BEGIN
+        INSERT INTO listings_fts (listings_fts, rowid, title, reason, ai_reasons)
+            VALUES ('delete', old.id, old.title, old.reason, old.ai_reasons);
+        INSERT INTO listings_fts (rowid, title, reason, ai_reasons) VALUES (new.id, new.title, new.reason, new.ai_reasons);
+    END;
+    """)
+    if created:
+        # Index the rows written before the table existed
+        c.execute("INSERT INTO listings_fts (listings_fts) VALUES ('rebuild')")
 
 # ---------- Profile helpers (backward compatible) ----------
-def list_profiles():
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM profiles ORDER BY id DESC")
-    rows = [dict(r) for r in c.fetchall()]
-    print("--- PROFILES ---")
-    import json
-    print(json.dumps(rows, indent=2))
-    print("----------------")
-    conn.close()
-    return rows
+def list_profiles(fields=None):
+    c = get_conn().cursor()
+    c.execute(f"SELECT {', '.join(fields) if fields else '*'} FROM profiles ORDER BY id DESC")
+    return [dict(r) for r in c.fetchall()]
 
 def get_profile(pid: int):
-    conn = get_conn()
-    c = conn.cursor()
+    c = get_conn().cursor()
     c.execute("SELECT * FROM profiles WHERE id = ?", (pid,))
     row = c.fetchone()
-    conn.close()
     return dict(row) if row else None
 
+_profile_listeners = []
+
+def on_profiles_changed(callback):
+    """Call `callback()` after any profile is created, updated or deleted here."""
+    _profile_listeners.append(callback)
+
+def _profiles_changed():
+    for callback in _profile_listeners:
+        callback()
+
+def profiles_rev():
+    """(rev, changed_at) of the profiles table, moved by every write from any process."""
+    c = get_conn().cursor()
+    c.execute("SELECT rev, changed_at FROM revs WHERE name = 'profiles'")
+    row = c.fetchone()
+    return (row["rev"], row["changed_at"]) if row else (0, 0.0)
+
 def create_profile(data: dict):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        """INSERT INTO profiles (name, keywords, price_min_cents, price_max_cents, min_score, chat_id, location, radius)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            data.get('name'),
-            data.get('keywords', ''),
-            data.get('price_min_cents'),
-            data.get('price_max_cents'),
-            data.get('min_score', 0.6),
-            data.get('chat_id'),
-            data.get('location'),
-            data.get('radius')
+    with transaction() as c:
+        c.execute(
+            """INSERT INTO profiles (name, keywords, price_min_cents, price_max_cents, min_score, chat_id, location, radius, lat, lng)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                data.get('name'),
+                data.get('keywords', ''),
+                data.get('price_min_cents'),
+                data.get('price_max_cents'),
+                data.get('min_score', 0.6),
+                data.get('chat_id'),
+                data.get('location'),
+                data.get('radius'),
+                data.get('lat'),
+                data.get('lng')
+            )
         )
-    )
-    conn.commit()
-    pid = c.lastrowid
-    conn.close()
+        pid = c.lastrowid
+    _profiles_changed()
     return pid
 
 def update_profile(pid: int, data: dict):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        """UPDATE profiles
-               SET name=?, keywords=?, price_min_cents=?, price_max_cents=?, min_score=?, chat_id=?, location=?, radius=?
-               WHERE id = ?""",
-        (
-            data.get('name'),
-            data.get('keywords', ''),
-            data.get('price_min_cents'),
-            data.get('price_max_cents'),
-            data.get('min_score', 0.6),
-            data.get('chat_id'),
-            data.get('location'),
-            data.get('radius'),
-            pid
+    with transaction() as c:
+        # Only this profile's pairs need re-evaluating on the next run
+        c.execute(
+            "UPDATE listings SET profile_fp = NULL WHERE profile = (SELECT name FROM profiles WHERE id = ?)",
+            (pid,)
         )
-    )
-    conn.commit()
-    conn.close()
+        c.execute(
+            """UPDATE profiles
+                   SET name=?, keywords=?, price_min_cents=?, price_max_cents=?, min_score=?, chat_id=?, location=?, radius=?,
+                       lat=?, lng=?
+                   WHERE id = ?""",
+            (
+                data.get('name'),
+                data.get('keywords', ''),
+                data.get('price_min_cents'),
+                data.get('price_max_cents'),
+                data.get('min_score', 0.6),
+                data.get('chat_id'),
+                data.get('location'),
+                data.get('radius'),
+                # Without coordinates the worker geocodes `location` again
+                data.get('lat'),
+                data.get('lng'),
+                pid
+            )
+        )
+    _profiles_changed()
+
+def set_profile_coords(pid: int, lat: float, lng: float):
+    # Derived from `location`, so listing fingerprints stay valid; but
+    # /api/profiles returns the coordinates, so its ETag must move
+    with transaction() as c:
+        c.execute("UPDATE profiles SET lat = ?, lng = ? WHERE id = ?", (lat, lng, pid))
+    _profiles_changed()
 
 def delete_profile(pid: int):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM profiles WHERE id = ?", (pid,))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("DELETE FROM profiles WHERE id = ?", (pid,))
+        c.execute("DELETE FROM leases WHERE unit = ?", (f"profile:{pid}",))
+    _profiles_changed()
 
 # ---------- Listings helpers (with security fields) ----------
-def upsert_listing(item, profile):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute(
-        """INSERT OR IGNORE INTO listings
-              (profile, title, price_cents, url, created_at, score, reason, status, security_score, ai_model, ai_reasons)
-              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            profile,
-            item.get("title"),
-            item.get("price_cents"),
-            item.get("url"),
-            item.get("created_at"),
-            item.get("score", 0.0),
-            item.get("reason", ""),
-            item.get("status"),
-            item.get("security_score"),
-            item.get("ai_model"),
-            item.get("ai_reasons"),
+UPSERT_LISTING_SQL = """
+INSERT INTO listings
+      (profile, title, price_cents, url, created_at, score, reason, status, security_score, ai_model, ai_reasons,
+       item_fp, profile_fp, lat, lng, rev)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(url, profile) DO UPDATE
+   SET title=excluded.title, price_cents=excluded.price_cents, created_at=excluded.created_at,
+       score=excluded.score, reason=excluded.reason, status=excluded.status,
+       security_score=excluded.security_score, ai_model=excluded.ai_model, ai_reasons=excluded.ai_reasons,
+       item_fp=excluded.item_fp, profile_fp=excluded.profile_fp, lat=excluded.lat, lng=excluded.lng,
+       rev=CASE WHEN (listings.title, listings.price_cents, listings.created_at, listings.score, listings.reason,
+                      listings.status, listings.security_score, listings.ai_model, listings.ai_reasons,
+                      listings.lat, listings.lng)
+                  IS NOT (excluded.title, excluded.price_cents, excluded.created_at, excluded.score, excluded.reason,
+                          excluded.status, excluded.security_score, excluded.ai_model, excluded.ai_reasons,
+                          excluded.lat, excluded.lng)
+                THEN excluded.rev ELSE listings.rev END
+RETURNING id, rev
+"""
+
+# Called after commit with [(id, rev)] of inserted or changed listings
+_listing_listeners = []
+
+def on_listings_changed(callback):
+    """Call `callback([(id, rev), ...])` after upserts here change listing rows."""
+    _listing_listeners.append(callback)
+
+def upsert_listings(items, profile, lease=None):
+    """Write one profile's results in one transaction; returns row ids. Raises LeaseLost if `lease` is gone."""
+    ids = []
+    changed = []
+    now = datetime.now(timezone.utc).isoformat()
+    with transaction() as c:
+        if lease is not None:
+            _check_lease(c, *lease)
+        c.execute("SELECT COALESCE(MAX(rev), 0) FROM listings")
+        rev = c.fetchone()[0]
+        for item in items:
+            rev += 1
+            c.execute(UPSERT_LISTING_SQL, (
+                profile,
+                item.get("title"),
+                item.get("price_cents"),
+                item.get("url"),
+                # Keyset pagination skips NULL sort keys, so always set one
+                item.get("created_at") or now,
+                item.get("score", 0.0),
+                item.get("reason", ""),
+                item.get("status"),
+                item.get("security_score"),
+                item.get("ai_model"),
+                item.get("ai_reasons"),
+                item.get("item_fp"),
+                item.get("profile_fp"),
+                item.get("lat"),
+                item.get("lng"),
+                rev,
+            ))
+            row = c.fetchone()
+            ids.append(row["id"] if row else None)
+            if row and row["rev"] == rev:
+                changed.append((row["id"], rev))
+            if item.get("lsh") and item.get("url"):
+                _lsh_index(c, item["url"], *item["lsh"])
+    metrics.inc("db_writes", len(items), table="listings")
+    if changed:
+        for callback in _listing_listeners:
+            callback(changed)
+    return ids
+
+def max_listing_rev():
+    c = get_conn().cursor()
+    c.execute("SELECT MAX(rev) FROM listings")
+    return c.fetchone()[0] or 0
+
+def changed_listing_ids(after_rev: int, limit: int = 1000):
+    """Ids of rows changed after `after_rev` (at most `limit`)."""
+    c = get_conn().cursor()
+    c.execute("SELECT id FROM listings WHERE rev > ? ORDER BY rev LIMIT ?", (after_rev, limit))
+    return [r[0] for r in c.fetchall()]
+
+def listing_changes(after_rev: int, limit: int = 500, min_score: float = 0.0, profile: str | None = None,
+                    status: str | None = None, security_min: int | None = None):
+    """Rows changed after `after_rev`, oldest change first, with list_listings' filters."""
+    c = get_conn().cursor()
+    where, args = _listing_filters(min_score, profile, status, security_min)
+    q = f"SELECT * FROM listings WHERE rev > ? AND {where}"
+    args.insert(0, after_rev)
+    q += " ORDER BY rev LIMIT ?"; args.append(limit)
+    c.execute(q, tuple(args))
+    return [dict(r) for r in c.fetchall()]
+
+# ---------- Geocoding cache ----------
+def geocode_cache_get(query: str):
+    """(lat, lng) cached for a normalised query ((None, None) for a known miss), or None."""
+    c = get_conn().cursor()
+    c.execute("SELECT lat, lng FROM geocode_cache WHERE query = ?", (query,))
+    row = c.fetchone()
+    return (row["lat"], row["lng"]) if row else None
+
+def geocode_cache_put(query: str, lat, lng, label):
+    with transaction() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO geocode_cache (query, lat, lng, label, created_at) VALUES (?, ?, ?, ?, ?)",
+            (query, lat, lng, label, time.time())
         )
+    metrics.inc("db_writes", table="geocode_cache")
+
+# ---------- Near-duplicate index ----------
+def _lsh_index(c, url: str, sig: bytes, keys):
+    # The same listing arrives once per profile: only a new or changed
+    # signature rewrites its bucket rows
+    now = time.time()
+    c.execute(
+        """INSERT INTO listing_sigs (url, sig, added) VALUES (?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET sig = excluded.sig, added = excluded.added
+               WHERE listing_sigs.sig IS NOT excluded.sig""",
+        (url, sig, now)
     )
+    if c.rowcount:
+        c.execute("DELETE FROM lsh_buckets WHERE url = ?", (url,))
+        c.executemany("INSERT INTO lsh_buckets (key, added, url) VALUES (?, ?, ?)", [(k, now, url) for k in keys])
+
+def lsh_candidates(keys, per_key: int):
+    """{url: sig} of the newest `per_key` URLs sharing each of the band `keys`."""
+    c = get_conn().cursor()
+    sub = "SELECT url FROM (SELECT url FROM lsh_buckets WHERE key = ? ORDER BY added DESC LIMIT ?)"
     c.execute(
-        """UPDATE listings
-               SET title=?, price_cents=?, created_at=?, score=?, reason=?, status=?, security_score=?, ai_model=?, ai_reasons=?
-               WHERE url=? AND profile=?""", 
-        (
-            item.get("title"),
-            item.get("price_cents"),
-            item.get("created_at"),
-            item.get("score", 0.0),
-            item.get("reason", ""),
-            item.get("status"),
-            item.get("security_score"),
-            item.get("ai_model"),
-            item.get("ai_reasons"),
-            item.get("url"),
-            profile,
-        )
+        f"SELECT s.url, s.sig FROM listing_sigs s WHERE s.url IN ({' UNION '.join([sub] * len(keys))})",
+        tuple(v for k in keys for v in (k, per_key))
     )
-    conn.commit()
+    return {r["url"]: r["sig"] for r in c.fetchall()}
+
+def lsh_prune(older_than: float):
+    """Forget signatures not refreshed for `older_than` seconds; returns how many."""
+    cutoff = time.time() - older_than
+    with transaction() as c:
+        c.execute("DELETE FROM lsh_buckets WHERE url IN (SELECT url FROM listing_sigs WHERE added < ?)", (cutoff,))
+        c.execute("DELETE FROM listing_sigs WHERE added < ?", (cutoff,))
+        return c.rowcount
+
+def listing_verdicts(profile, urls):
+    """{url: row} of `profile`'s AI-evaluated rows among `urls` (prefiltered and fallback rows are left out)."""
+    c = get_conn().cursor()
+    urls = [u for u in urls if u is not None]
+    out = {}
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        c.execute(
+            f"""SELECT id, url, status, security_score, ai_model, ai_reasons FROM listings
+                   WHERE profile = ? AND security_score IS NOT NULL AND ai_model IS NOT 'fallback' AND url IN ({','.join('?' * len(chunk))})""",
+            (profile, *chunk)
+        )
+        for r in c.fetchall():
+            out[r["url"]] = dict(r)
+    return out
+
+def listing_fingerprints(profile, urls):
+    """{url: (item_fp, profile_fp)} for the stored rows of `profile` among `urls`."""
+    c = get_conn().cursor()
+    urls = [u for u in urls if u is not None]
+    out = {}
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        c.execute(
+            f"SELECT url, item_fp, profile_fp FROM listings WHERE profile = ? AND url IN ({','.join('?' * len(chunk))})",
+            (profile, *chunk)
+        )
+        for r in c.fetchall():
+            out[r["url"]] = (r["item_fp"], r["profile_fp"])
+    return out
+
+def upsert_listing(item, profile):
     # Return row id for linking to /item/{id}
-    c.execute("SELECT id FROM listings WHERE url=? AND profile=?", (item.get("url"), profile))
-    row = c.fetchone()
-    conn.close()
-    return row["id"] if row else None
+    return upsert_listings([item], profile)[0]
 
-def list_listings(min_score: float = 0.0, profile: str | None = None, status: str | None = None, security_min: int | None = None):
-    conn = get_conn()
-    c = conn.cursor()
-    q = "SELECT * FROM listings WHERE score >= ?"
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of `row`."""
+    raw = json.dumps([row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    created_at, item_id = json.loads(raw)
+    return str(created_at), int(item_id)
+
+def _listing_filters(min_score: float, profile: str | None, status: str | None, security_min: int | None):
+    """WHERE clause (without the keyword) and args shared by the listing queries."""
+    q = "score >= ?"
     args = [min_score]
     if profile:
         q += " AND profile = ?"; args.append(profile)
@@ -186,16 +586,317 @@ def list_listings(min_score: float = 0.0, profile: str | None = None, status: st
         q += " AND status = ?"; args.append(status)
     if security_min is not None:
         q += " AND security_score >= ?"; args.append(security_min)
-    q += " ORDER BY created_at DESC, id DESC LIMIT 500"
+    return q, args
+
+def list_listings(min_score: float = 0.0, profile: str | None = None, status: str | None = None, security_min: int | None = None,
+                  limit: int = 500, after: str | None = None):
+    """Newest first. Pass the cursor of the last row seen as `after` for the next page."""
+    c = get_conn().cursor()
+    where, args = _listing_filters(min_score, profile, status, security_min)
+    q = f"SELECT * FROM listings WHERE {where}"
+    if after:
+        q += " AND (created_at, id) < (?, ?)"; args.extend(decode_cursor(after))
+    q += " ORDER BY created_at DESC, id DESC LIMIT ?"; args.append(limit)
+    c.execute(q, tuple(args))
+    return [dict(r) for r in c.fetchall()]
+
+def table_columns(table: str) -> tuple:
+    c = get_conn().cursor()
+    c.execute(f"PRAGMA table_info({table})")
+    return tuple(r["name"] for r in c.fetchall())
+
+def listing_page_end(min_score: float = 0.0, profile: str | None = None, status: str | None = None,
+                     security_min: int | None = None, limit: int = 500, after: str | None = None):
+    """(created_at, id) of the last row of a full list_listings page, else None."""
+    c = get_conn().cursor()
+    where, args = _listing_filters(min_score, profile, status, security_min)
+    q = f"SELECT created_at, id FROM listings WHERE {where}"
+    if after:
+        q += " AND (created_at, id) < (?, ?)"; args.extend(decode_cursor(after))
+    q += " ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?"; args.append(limit - 1)
     c.execute(q, tuple(args))
-    rows = [dict(r) for r in c.fetchall()]
-    conn.close()
-    return rows
+    row = c.fetchone()
+    return dict(row) if row else None
+
+def stream_listings(min_score: float = 0.0, profile: str | None = None, status: str | None = None,
+                    security_min: int | None = None, after: str | None = None, until: dict | None = None,
+                    limit: int = 500, fields=None, chunk: int = 100):
+    """Yield list_listings rows `chunk` at a time, stopping after row `until` or `limit` rows."""
+    where, base_args = _listing_filters(min_score, profile, status, security_min)
+    cols = "*" if not fields else ", ".join(dict.fromkeys([*fields, "created_at", "id"]))
+    extra = [] if not fields else [k for k in ("created_at", "id") if k not in fields]
+    pos = decode_cursor(after) if after else None
+    remaining = None if until else limit
+    while remaining is None or remaining > 0:
+        q = f"SELECT {cols} FROM listings WHERE {where}"
+        args = list(base_args)
+        if pos:
+            q += " AND (created_at, id) < (?, ?)"; args.extend(pos)
+        if until:
+            q += " AND (created_at, id) >= (?, ?)"; args.extend((until["created_at"], until["id"]))
+        n = chunk if remaining is None else min(chunk, remaining)
+        q += " ORDER BY created_at DESC, id DESC LIMIT ?"; args.append(n)
+        c = get_conn().cursor()
+        c.execute(q, tuple(args))
+        rows = c.fetchall()
+        for r in rows:
+            row = dict(r)
+            for k in extra:
+                del row[k]
+            yield row
+        if len(rows) < n or until and rows[-1]["id"] == until["id"]:
+            return
+        pos = (rows[-1]["created_at"], rows[-1]["id"])
+        if remaining is not None:
+            remaining -= len(rows)
+
+_FTS_TOKEN = re.compile(r"\w+")
+# bm25 column weights: a hit in the title counts most
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0)
+# Most matches ranked by relevance per query (newest first); 0 ranks all
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "5000"))
+
+def fts_query(text: str) -> str | None:
+    """FTS5 MATCH expression: every word quoted and required, the last one as a prefix."""
+    words = _FTS_TOKEN.findall(text or "")
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+def search_listings(q: str, min_score: float = 0.0, profile: str | None = None, status: str | None = None,
+                    security_min: int | None = None, limit: int = 100, after: str | None = None,
+                    sort: str = "relevance"):
+    """Listings matching `q`, by bm25 `rank` (or newest first with sort="recent")."""
+    match = fts_query(q)
+    if match is None:
+        return []
+    c = get_conn().cursor()
+    where = "listings_fts MATCH ? AND l.score >= ?"
+    args = [match, min_score]
+    if profile:
+        where += " AND l.profile = ?"; args.append(profile)
+    if status:
+        where += " AND l.status = ?"; args.append(status)
+    if security_min is not None:
+        where += " AND l.security_score >= ?"; args.append(security_min)
+    if sort == "recent":
+        # Walks the index in rowid order and stops at `limit`: fast even
+        # for words matching most of the table
+        if after:
+            where += " AND listings_fts.rowid < ?"; args.append(int(_decode(after)[0]))
+        q_sql = f"""SELECT l.* FROM listings_fts JOIN listings l ON l.id = listings_fts.rowid
+                    WHERE {where} ORDER BY listings_fts.rowid DESC LIMIT ?"""
+    else:
+        # bm25 costs a few microseconds per matching row, so only the newest
+        # SEARCH_RANK_WINDOW matches are ranked; the cutoff rides in the
+        # cursor so every page ranks the same set
+        rank = item_id = None
+        if after:
+            rank, item_id, floor = _decode(after)
+        else:
+            c.execute("SELECT rowid FROM listings_fts WHERE listings_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                      (match, SEARCH_RANK_WINDOW - 1))
+            row = c.fetchone()
+            floor = row[0] if row and SEARCH_RANK_WINDOW > 0 else 0
+        where += " AND listings_fts.rowid >= ?"; args.append(int(floor))
+        q_sql = f"""SELECT * FROM (
+                        SELECT l.*, bm25(listings_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS rank, ? AS rank_floor
+                          FROM listings_fts JOIN listings l ON l.id = listings_fts.rowid
+                         WHERE {where})"""
+        args.insert(0, int(floor))
+        if after:
+            q_sql += " WHERE (rank, id) > (?, ?)"; args.extend((float(rank), int(item_id)))
+        q_sql += " ORDER BY rank, id LIMIT ?"
+    args.append(limit)
+    c.execute(q_sql, tuple(args))
+    return [dict(r) for r in c.fetchall()]
+
+def encode_search_cursor(row: dict, sort: str = "relevance") -> str:
+    key = [row["id"]] if sort == "recent" else [row["rank"], row["id"], row["rank_floor"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def _decode(cursor: str):
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
 
 def get_listing(item_id: int):
-    conn = get_conn()
-    c = conn.cursor()
+    c = get_conn().cursor()
     c.execute("SELECT * FROM listings WHERE id = ?", (item_id,))
     row = c.fetchone()
-    conn.close()
     return dict(row) if row else None
+
+# ---------- AI verdict cache ----------
+def cache_get(key: str, ttl: float):
+    c = get_conn().cursor()
+    c.execute("SELECT verdict FROM ai_cache WHERE key = ? AND created_at >= ?", (key, time.time() - ttl))
+    row = c.fetchone()
+    return json.loads(row["verdict"]) if row else None
+
+def cache_put(key: str, model: str, verdict: dict):
+    with transaction() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO ai_cache (key, model, verdict, created_at) VALUES (?, ?, ?, ?)",
+            (key, model, json.dumps(verdict), time.time())
+        )
+    metrics.inc("db_writes", table="ai_cache")
+
+def cache_evict(ttl: float, max_rows: int):
+    with transaction() as c:
+        # Expired rows first, then the oldest ones once over the size bound
+        c.execute("DELETE FROM ai_cache WHERE created_at < ?", (time.time() - ttl,))
+        c.execute(
+            """DELETE FROM ai_cache WHERE key IN (
+                   SELECT key FROM ai_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)""",
+            (max_rows,)
+        )
+
+def cache_size():
+    c = get_conn().cursor()
+    c.execute("SELECT COUNT(*) FROM ai_cache")
+    return c.fetchone()[0]
+
+# ---------- Telegram outbox ----------
+def outbox_add(entries):
+    """Queue messages, ignoring chat/key pairs already queued; returns the ids of the added rows."""
+    now = time.time()
+    added = []
+    with transaction() as c:
+        for e in entries:
+            c.execute(
+                """INSERT OR IGNORE INTO outbox (chat_id, dedupe_key, listing_id, profile, text, next_attempt_at, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING id""",
+                (str(e["chat_id"]), e["dedupe_key"], e.get("listing_id"), e.get("profile"), e["text"], now, now)
+            )
+            row = c.fetchone()
+            if row:
+                added.append(row[0])
+    metrics.inc("db_writes", len(added), table="outbox")
+    return added
+
+def outbox_sent_count(ids):
+    """How many of the outbox rows `ids` have been sent."""
+    ids = list(ids)
+    c = get_conn().cursor()
+    sent = 0
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        c.execute(f"SELECT COUNT(*) FROM outbox WHERE status = 'sent' AND id IN ({','.join('?' * len(chunk))})", chunk)
+        sent += c.fetchone()[0]
+    return sent
+
+# ---------- Work-unit leases ----------
+class LeaseLost(Exception):
+    """The lease expired and may now belong to another worker."""
+
+def _check_lease(c, unit: str, owner: str, token: int):
+    c.execute(
+        "SELECT 1 FROM leases WHERE unit = ? AND owner = ? AND token = ? AND expires_at > ?",
+        (unit, owner, token, time.time())
+    )
+    if c.fetchone() is None:
+        raise LeaseLost(unit)
+
+def lease_claim(units, owner: str, ttl: float, limit: int, not_finished_since: float):
+    """Claim up to `limit` free or expired `units` not finished this round; returns {unit: token}."""
+    now = time.time()
+    units = list(units)
+    with transaction() as c:
+        c.executemany("INSERT OR IGNORE INTO leases (unit) VALUES (?)", [(u,) for u in units])
+        claimed = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(units), 500):
+            if len(claimed) >= limit:
+                break
+            chunk = units[start:start + 500]
+            c.execute(
+                f"""UPDATE leases SET owner = ?, token = token + 1, expires_at = ?, claimed_at = ?
+                       WHERE unit IN (
+                           SELECT unit FROM leases
+                            WHERE unit IN ({','.join('?' * len(chunk))})
+                              AND (expires_at IS NULL OR expires_at <= ?)
+                              AND (finished_at IS NULL OR finished_at < ?)
+                            ORDER BY finished_at NULLS FIRST LIMIT ?)
+                   RETURNING unit, token""",
+                (owner, now + ttl, now, *chunk, now, not_finished_since, limit - len(claimed))
+            )
+            claimed.update((r["unit"], r["token"]) for r in c.fetchall())
+    return claimed
+
+def lease_renew(owner: str, ttl: float):
+    """Extend every unexpired lease held by `owner`; returns the units still held."""
+    now = time.time()
+    with transaction() as c:
+        c.execute(
+            "UPDATE leases SET expires_at = ? WHERE owner = ? AND expires_at > ? RETURNING unit",
+            (now + ttl, owner, now)
+        )
+        return {r["unit"] for r in c.fetchall()}
+
+def lease_release(unit: str, owner: str, token: int, finished: bool = True):
+    """Give a unit back; `finished` records that its work for this round is done."""
+    now = time.time()
+    with transaction() as c:
+        c.execute(
+            """UPDATE leases SET owner = NULL, expires_at = NULL, finished_at = CASE WHEN ? THEN ? ELSE finished_at END
+                   WHERE unit = ? AND owner = ? AND token = ?""",
+            (finished, now, unit, owner, token)
+        )
+        return c.rowcount == 1
+
+def lease_list():
+    c = get_conn().cursor()
+    c.execute("SELECT * FROM leases ORDER BY unit")
+    return [dict(r) for r in c.fetchall()]
+
+def outbox_claim(limit: int, stale_after: float):
+    """Mark up to `limit` due (or stale 'sending') messages as sending and return them."""
+    now = time.time()
+    with transaction() as c:
+        c.execute(
+            """UPDATE outbox SET status = 'sending', claimed_at = ?
+                   WHERE id IN (
+                       SELECT id FROM outbox
+                        WHERE (status = 'pending' AND next_attempt_at <= ?)
+                           OR (status = 'sending' AND claimed_at < ?)
+                        ORDER BY id LIMIT ?)
+               RETURNING id, chat_id, text, attempts, claimed_at""",
+            (now, now, now - stale_after, limit)
+        )
+        rows = [dict(r) for r in c.fetchall()]
+    return sorted(rows, key=lambda r: r["id"])
+
+def outbox_finish(ids, status: str, error: str | None = None, claimed_at: float | None = None):
+    """Final 'sent' or 'failed' state, skipping rows re-claimed since `claimed_at`."""
+    now = time.time()
+    with transaction() as c:
+        c.executemany(
+            """UPDATE outbox SET status = ?, sent_at = ?, finished_at = ?, last_error = ?, attempts = attempts + 1
+                   WHERE id = ? AND (? IS NULL OR claimed_at = ?)""",
+            [(status, now if status == "sent" else None, now, error, i, claimed_at, claimed_at) for i in ids]
+        )
+
+def outbox_retry(ids, delay: float, error: str, claimed_at: float | None = None):
+    with transaction() as c:
+        c.executemany(
+            """UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                   WHERE id = ? AND (? IS NULL OR claimed_at = ?)""",
+            [(time.time() + delay, error, i, claimed_at, claimed_at) for i in ids]
+        )
+
+def outbox_prune(older_than: float):
+    """Drop sent/failed messages finished more than `older_than` seconds ago."""
+    with transaction() as c:
+        c.execute(
+            "DELETE FROM outbox WHERE finished_at < ? AND status IN ('sent', 'failed')",
+            (time.time() - older_than,)
+        )
+
+def outbox_stats():
+    c = get_conn().cursor()
+    c.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status")
+    return {r["status"]: r["n"] for r in c.fetchall()}
+
+def outbox_next_due():
+    """Earliest next_attempt_at among pending messages, or None."""
+    c = get_conn().cursor()
+    c.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'")
+    return c.fetchone()[0]
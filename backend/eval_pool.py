@@ -0,0 +1,61 @@
+import atexit, os, threading
+from concurrent.futures import ThreadPoolExecutor
+import ai_security
+from ai_security import evaluate_listing, evaluate_batch
+
+# Max OpenAI requests in flight at once during a cycle
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "8"))
+
+def _batches(pairs, size):
+    """Group pair positions by profile, `size` positions per batch."""
+    by_profile = {}
+    for pos, (profile, _) in enumerate(pairs):
+        by_profile.setdefault(id(profile), []).append(pos)
+    for positions in by_profile.values():
+        for start in range(0, len(positions), size):
+            yield positions[start:start + size]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    # One pool for the process: its threads keep their SQLite connections
+    # (cache lookups) and HTTP sessions from one batch to the next
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AI_CONCURRENCY, thread_name_prefix="ai-eval")
+    return _executor
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+atexit.register(shutdown)
+
+def evaluate_many(pairs, batch_size: int | None = None):
+    """Verdicts for (profile, item) pairs, in order; batches run concurrently."""
+    pairs = list(pairs)
+    if not ai_security.OPENAI_API_KEY:
+        # Heuristic mode is pure CPU: threads would only add overhead
+        return [evaluate_listing(p, it) for p, it in pairs]
+    size = batch_size or ai_security.AI_BATCH_SIZE
+    batches = list(_batches(pairs, max(1, size)))
+
+    def run(positions):
+        profile = pairs[positions[0]][0]
+        return evaluate_batch(profile, [pairs[pos][1] for pos in positions], size)
+
+    if AI_CONCURRENCY <= 1 or len(batches) <= 1:
+        done = map(run, batches)
+    else:
+        done = list(_get_executor().map(run, batches))
+    verdicts = [None] * len(pairs)
+    for positions, results in zip(batches, done):
+        for pos, verdict in zip(positions, results):
+            verdicts[pos] = verdict
+    return verdicts
@@ -0,0 +1,125 @@
+import asyncio, json, os
+import db
+
+# How often the shared poller checks for rows written by other processes
+FEED_POLL_SECONDS = float(os.getenv("FEED_POLL_SECONDS", "2"))
+FEED_KEEPALIVE_SECONDS = 15.0
+# A client this far behind is dropped; it reconnects and catches up from the DB
+FEED_CLIENT_BUFFER = 1000
+# Rows per backlog query when a client catches up
+FEED_BACKLOG_LIMIT = 1000
+
+def _matches(row, f):
+    # Same semantics as db.list_listings' filters
+    if (row.get("score") or 0.0) < f["min_score"]:
+        return False
+    if f["profile"] and row.get("profile") != f["profile"]:
+        return False
+    if f["status"] and row.get("status") != f["status"]:
+        return False
+    if f["security_min"] is not None and (row.get("security_score") is None or row["security_score"] < f["security_min"]):
+        return False
+    return True
+
+class ListingFeed:
+    """One poller per process fanning listing changes out to SSE subscribers."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._task = None
+        self._loop = None
+        self._wake = None
+        self._rev = None
+        db.on_listings_changed(self._on_change)
+
+    def _on_change(self, changed):
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def _ensure_started(self, rev: int):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # A stopped poller's cursor is stale: resume from `rev` (read before
+            # the caller subscribed), older rows come from its backlog query
+            self._rev = rev
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wake.wait(), FEED_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if await asyncio.to_thread(db.max_listing_rev) <= self._rev:
+                    continue
+                while True:
+                    rows = await asyncio.to_thread(db.listing_changes, self._rev, FEED_BACKLOG_LIMIT)
+                    for row in rows:
+                        self._publish(row)
+                    if rows:
+                        self._rev = rows[-1]["rev"]
+                    if len(rows) < FEED_BACKLOG_LIMIT:
+                        break
+            except Exception as e:
+                print("Listing feed error:", e)
+
+    def _publish(self, row):
+        for queue, f in list(self._subscribers.values()):
+            if _matches(row, f):
+                try:
+                    queue.put_nowait(row)
+                except asyncio.QueueFull:
+                    # Too slow: end its stream; the browser reconnects with
+                    # Last-Event-ID and catches up from the database
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+                    self._subscribers.pop(id(queue), None)
+
+    async def stream(self, request, last_id: int | None, min_score: float = 0.0, profile: str | None = None,
+                     status: str | None = None, security_min: int | None = None):
+        """Yield SSE frames: missed rows after `last_id` first, then live changes."""
+        f = {"min_score": min_score, "profile": profile, "status": status, "security_min": security_min}
+        queue = asyncio.Queue(FEED_CLIENT_BUFFER)
+        current = await asyncio.to_thread(db.max_listing_rev)
+        self._subscribers[id(queue)] = (queue, f)
+        self._ensure_started(current)
+        try:
+            seen = last_id
+            if last_id is None:
+                # Fresh dashboard: it just loaded /api/listings, so start at now
+                seen = current
+            else:
+                # Page through everything missed, however far behind the client is
+                while True:
+                    backlog = await asyncio.to_thread(db.listing_changes, seen, FEED_BACKLOG_LIMIT, **f)
+                    for row in backlog:
+                        seen = row["rev"]
+                        yield _frame(row)
+                    if len(backlog) < FEED_BACKLOG_LIMIT:
+                        break
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    row = await asyncio.wait_for(queue.get(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if row is None:
+                    break
+                if row["rev"] <= seen:
+                    continue  # already sent from the backlog
+                seen = row["rev"]
+                yield _frame(row)
+        finally:
+            self._subscribers.pop(id(queue), None)
+
+def _frame(row) -> str:
+    return f"id: {row['rev']}\nevent: listing\ndata: {json.dumps(row, separators=(',', ':'))}\n\n"
+
+feed = ListingFeed()
@@ -1,9 +1,13 @@
-def score_item(item, profile):
-    # profile keys: name, keywords (comma string), price_min_cents, price_max_cents, min_score
-    title = (item.get("title") or "").lower()
-    kws = [k.strip().lower() for k in (profile.get("keywords") or "").split(",") if k.strip()]
-    hits = sum(1 for k in kws if k in title)
-    score_kw = hits / max(1, len(kws)) if kws else 0.0
+from functools import lru_cache
+
+@lru_cache(maxsize=4096)
+def parse_keywords(keywords: str) -> tuple:
+    """Comma string -> normalized keyword tuple (cached: profiles rarely change)."""
+    return tuple(k.strip().lower() for k in (keywords or "").split(",") if k.strip())
+
+def score_hits(item, profile, hits, n_kws):
+    """Blend a keyword hit count with the profile's price range -> (score, reason)."""
+    score_kw = hits / max(1, n_kws) if n_kws else 0.0
 
     price = item.get("price_cents") or 0
     pmin = profile.get("price_min_cents")
@@ -18,7 +22,14 @@ def score_item(item, profile):
         price_reason = f"price {price/100:.2f} > max {(pmax or 0)/100:.2f}"
 
     score = score_kw if price_ok else 0.0
-    reason = f"{hits}/{len(kws)} keywords matched"
+    reason = f"{hits}/{n_kws} keywords matched"
     if not price_ok:
         reason += f"; {price_reason}"
     return score, reason
+
+def score_item(item, profile):
+    # profile keys: name, keywords (comma string), price_min_cents, price_max_cents, min_score
+    title = (item.get("title") or "").lower()
+    kws = parse_keywords(profile.get("keywords") or "")
+    hits = sum(1 for k in kws if k in title)
+    return score_hits(item, profile, hits, len(kws))
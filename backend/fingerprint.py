@@ -0,0 +1,29 @@
+import hashlib, json, os
+
+def _digest(parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def item_fingerprint(item: dict) -> str:
+    """Hash of the listing fields evaluation depends on (not its timestamp)."""
+    return _digest([
+        item.get("title"),
+        item.get("price_cents"),
+        item.get("description"),
+        item.get("photos_count"),
+        item.get("seller_meta"),
+    ])
+
+def profile_fingerprint(profile: dict) -> str:
+    """Hash of a profile definition plus the evaluator that scores it."""
+    evaluator = os.getenv("OPENAI_MODEL", "gpt-4o-mini") if os.getenv("OPENAI_API_KEY") else "heuristic"
+    return _digest([
+        profile.get("name"),
+        profile.get("keywords"),
+        profile.get("price_min_cents"),
+        profile.get("price_max_cents"),
+        profile.get("min_score"),
+        profile.get("location"),
+        profile.get("radius"),
+        evaluator,
+    ])
@@ -0,0 +1,139 @@
+"""Geocoding (cached in SQLite) and a grid index of profile search areas."""
+import math, os, re
+from collections import defaultdict
+import db
+import http_client
+import metrics
+
+# Edge of one grid cell in degrees of latitude (~55 km at 0.5)
+GEO_CELL_DEG = float(os.getenv("GEO_CELL_DEG", "0.5"))
+# Circles spanning more cells than this are checked for every listing instead
+GEO_MAX_CELLS = 400
+EARTH_RADIUS_KM = 6371.0
+
+def _key(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+def _resolve(query: str):
+    """(lat, lng, label) from HERE, or None; raises when HERE cannot be asked."""
+    from places import ENDPOINTS, FIXTURES
+    if os.getenv("USE_FIXTURE") == "1":
+        data = FIXTURES["geocode"]
+    else:
+        if not os.getenv("HERE_API_KEY"):
+            raise RuntimeError("HERE_API_KEY not set")
+        url, param, timeout = ENDPOINTS["geocode"]
+        r = http_client.get("here.geocode", url, params={param: query, "limit": 1},
+                            headers={"Authorization": f"Bearer {os.getenv('HERE_API_KEY')}"}, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+    items = data.get("items") or []
+    if not items or not items[0].get("position"):
+        return None
+    pos = items[0]["position"]
+    return pos["lat"], pos["lng"], items[0].get("address", {}).get("label") or items[0].get("title")
+
+def geocode(query: str):
+    """(lat, lng) for a place name, or None; answered from the cache when possible."""
+    key = _key(query or "")
+    if not key:
+        return None
+    hit = db.geocode_cache_get(key)
+    if hit is not None:
+        metrics.inc("geocode_lookups", outcome="hit")
+        lat, lng = hit
+        return None if lat is None else (lat, lng)
+    try:
+        found = _resolve(query)
+    except Exception as e:
+        metrics.inc("geocode_lookups", outcome="error")
+        print(f"Geocoding {query!r} failed:", e)
+        return None
+    metrics.inc("geocode_lookups", outcome="miss")
+    db.geocode_cache_put(key, *(found or (None, None, None)))
+    return found[:2] if found else None
+
+def locate(item: dict):
+    """Fill item["lat"], item["lng"] from its `location` unless the source set them."""
+    if item.get("lat") is None or item.get("lng") is None:
+        pos = geocode(item["location"]) if item.get("location") else None
+        item["lat"], item["lng"] = pos or (None, None)
+    return item
+
+def locate_profiles(profiles) -> set:
+    """Geocode profiles missing a centre; returns indices of those whose lookup failed."""
+    unresolved = set()
+    for j, p in enumerate(profiles):
+        if p.get("location") and p.get("lat") is None:
+            pos = geocode(p["location"])
+            if pos:
+                p["lat"], p["lng"] = pos
+                db.set_profile_coords(p["id"], *pos)
+            elif p.get("radius") and db.geocode_cache_get(_key(p["location"])) is None:
+                unresolved.add(j)
+    return unresolved
+
+def distance_km(lat1, lng1, lat2, lng2) -> float:
+    """Great-circle distance (haversine)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class ProfileGrid:
+    """Grid of profile circles (centre + radius km); profiles without one match everywhere."""
+
+    def __init__(self, profiles, cell_deg: float = GEO_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cols = max(1, round(360 / cell_deg))
+        self.cells = defaultdict(list)
+        self.everywhere = []   # no area: always included
+        self.wide = []         # huge circles: distance-checked for every point
+        self.circles = {}
+        for j, p in enumerate(profiles):
+            lat, lng, radius = p.get("lat"), p.get("lng"), p.get("radius")
+            if lat is None or lng is None or not radius:
+                self.everywhere.append(j)
+                continue
+            self.circles[j] = (lat, lng, float(radius))
+            # Bounds of the circle on the same sphere distance_km uses
+            arc = radius / EARTH_RADIUS_KM
+            dlat = math.degrees(arc)
+            rows = range(self._row(lat - dlat), self._row(lat + dlat) + 1)
+            # Widest longitude span, reached off-centre; a circle over a pole spans them all
+            span = math.sin(min(arc, math.pi / 2)) / max(math.cos(math.radians(lat)), 1e-12)
+            if abs(lat) + dlat >= 90 or span >= 1:
+                cols = range(self.cols)
+            else:
+                dlng = math.degrees(math.asin(span))
+                cols = range(self._col(lng - dlng), self._col(lng + dlng) + 1)
+            if len(rows) * len(cols) > GEO_MAX_CELLS:
+                self.wide.append(j)
+                continue
+            for r in rows:
+                for c in cols:
+                    self.cells[(r, c % self.cols)].append(j)
+
+    def _row(self, lat):
+        return math.floor(lat / self.cell_deg)
+
+    def _col(self, lng):
+        return math.floor(lng / self.cell_deg)
+
+    def covering(self, lat, lng) -> set | None:
+        """Indices of profiles covering (lat, lng); None (all of them) for an unknown position."""
+        if lat is None or lng is None:
+            return None
+        cands = self.cells.get((self._row(lat), self._col(lng) % self.cols), []) + self.wide
+        out = set(self.everywhere)
+        for j in cands:
+            clat, clng, radius = self.circles[j]
+            if distance_km(clat, clng, lat, lng) <= radius:
+                out.add(j)
+        return out
+
+    def distance(self, j, lat, lng):
+        """km from profile j's centre, or None."""
+        if j not in self.circles or lat is None or lng is None:
+            return None
+        clat, clng, _ = self.circles[j]
+        return distance_km(clat, clng, lat, lng)
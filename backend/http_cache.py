@@ -0,0 +1,138 @@
+import os, threading, time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+import db
+
+# Rendered /item pages kept in memory
+ITEM_CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", "5000"))
+# How often the listings and profiles versions are re-read from SQLite,
+# which catches writes made by a separate worker process; writes made in
+# this process invalidate immediately
+VERSION_CHECK_SECONDS = float(os.getenv("VERSION_CHECK_SECONDS", "1"))
+# Browsers and link-preview bots may reuse an item page this long unchecked
+ITEM_MAX_AGE = int(os.getenv("ITEM_MAX_AGE", "60"))
+# Changed rows looked up per check before giving up and clearing all pages
+INVALIDATE_LIMIT = 1000
+
+def http_date(ts: float) -> str:
+    return formatdate(ts, usegmt=True)
+
+def not_modified(request, etag: str, last_modified: float | None = None) -> bool:
+    """True when If-None-Match (or else If-Modified-Since) matches this version."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def validators(etag: str, last_modified: float | None, cache_control: str = "no-cache") -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+class Versions:
+    """Change markers for listings and profiles feeding ETags, plus the /item page cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings = None
+        self._listings_changed_at = time.time()
+        # Rev last read from SQLite; changes after it may come from elsewhere
+        self._db_rev = None
+        self._checked = 0.0
+        # Bumped on every invalidation so a render that raced one is not cached
+        self.generation = 0
+        self._profiles = None
+        self._profiles_checked = 0.0
+        self.pages: "OrderedDict[int, tuple]" = OrderedDict()
+        db.on_listings_changed(self._on_listings)
+        db.on_profiles_changed(self._on_profiles)
+
+    def _on_listings(self, changed):
+        with self._lock:
+            self.generation += 1
+            for item_id, rev in changed:
+                self.pages.pop(item_id, None)
+                if self._listings is not None and rev > self._listings:
+                    self._listings = rev
+            self._listings_changed_at = time.time()
+
+    def _on_profiles(self):
+        with self._lock:
+            # Re-read on the next request; the DB triggers already moved the rev
+            self._profiles_checked = 0.0
+            # Pages show the profile name; cheap to rebuild
+            self.generation += 1
+            self.pages.clear()
+
+    def profiles(self) -> tuple[int, float]:
+        """(profiles rev, when it last moved), re-read at most every VERSION_CHECK_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if self._profiles is not None and now - self._profiles_checked < VERSION_CHECK_SECONDS:
+                return self._profiles
+        current = db.profiles_rev()
+        with self._lock:
+            if self._profiles is not None and current[0] != self._profiles[0]:
+                # Possibly changed by another process
+                self.generation += 1
+                self.pages.clear()
+            self._profiles, self._profiles_checked = current, now
+            return current
+
+    def listings(self) -> tuple[int, float]:
+        """(current listings rev, when it last moved), re-read at most every VERSION_CHECK_SECONDS."""
+        now = time.monotonic()
+        if self._listings is not None and now - self._checked < VERSION_CHECK_SECONDS:
+            return self._listings, self._listings_changed_at
+        rev = db.max_listing_rev()
+        with self._lock:
+            known, self._db_rev, self._checked = self._db_rev, rev, now
+        if known is not None and rev > known:
+            # Possibly written by another process: drop the pages that changed
+            ids = db.changed_listing_ids(known, INVALIDATE_LIMIT)
+            with self._lock:
+                self.generation += 1
+                if len(ids) >= INVALIDATE_LIMIT:
+                    self.pages.clear()
+                for item_id in ids:
+                    self.pages.pop(item_id, None)
+                self._listings_changed_at = time.time()
+        with self._lock:
+            if self._listings is None or rev > self._listings:
+                self._listings = rev
+            return self._listings, self._listings_changed_at
+
+    def page(self, item_id: int):
+        """Cached (etag, last_modified, html) for an item, or None."""
+        self.listings()
+        with self._lock:
+            entry = self.pages.get(item_id)
+            if entry is not None:
+                self.pages.move_to_end(item_id)
+            return entry
+
+    def store_page(self, item_id: int, rev, html: str, generation: int):
+        """Cache a rendered page unless an invalidation ran since `generation`."""
+        entry = (f'"i{item_id}-{rev or 0}"', time.time(), html)
+        with self._lock:
+            if generation != self.generation:
+                return entry
+            self.pages[item_id] = entry
+            while len(self.pages) > ITEM_CACHE_SIZE:
+                self.pages.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pages": len(self.pages), "max_pages": ITEM_CACHE_SIZE,
+                    "listings_rev": self._listings, "profiles_version": self._profiles and self._profiles[0]}
+
+versions = Versions()
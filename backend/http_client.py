@@ -0,0 +1,75 @@
+import os, threading, time
+import metrics
+
+# One keep-alive pool per upstream host; tune for the number of threads that
+# talk to the same host at once (AI_CONCURRENCY, uvicorn's thread pool)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+
+_lock = threading.Lock()
+_session = None
+_openai = None
+
+def session() -> "requests.Session":
+    """Process-wide pooled requests session."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                # Imported on first use: the web app mostly never needs it
+                import requests
+                from requests.adapters import HTTPAdapter
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+def request(endpoint: str, method: str, url: str, **kwargs) -> "requests.Response":
+    """Send through the shared session, timing the call under `endpoint`."""
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    with metrics.timer(f"http.{endpoint}"):
+        return session().request(method, url, **kwargs)
+
+def get(endpoint: str, url: str, **kwargs) -> "requests.Response":
+    return request(endpoint, "GET", url, **kwargs)
+
+def post(endpoint: str, url: str, **kwargs) -> "requests.Response":
+    return request(endpoint, "POST", url, **kwargs)
+
+def async_client():
+    """New pooled httpx.AsyncClient; create one per event loop and reuse it."""
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+        timeout=HTTP_TIMEOUT,
+    )
+
+def _start_timer(request):
+    request.extensions["started"] = time.perf_counter()
+
+def _stop_timer(response):
+    started = response.request.extensions.get("started")
+    if started is not None:
+        metrics.observe("http.openai", time.perf_counter() - started)
+
+def openai_client(api_key: str):
+    """Long-lived OpenAI client on a pooled httpx transport."""
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                # Lazy import to avoid dependency if user hasn't installed openai
+                import httpx
+                from openai import OpenAI
+                http = httpx.Client(
+                    limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+                    timeout=OPENAI_TIMEOUT,
+                    event_hooks={"request": [_start_timer], "response": [_stop_timer]},
+                )
+                # Retries are handled by ai_security under the host rate limit
+                _openai = OpenAI(api_key=api_key, http_client=http, max_retries=0)
+    return _openai
@@ -1,56 +1,372 @@
-import os
+import os, time
+from collections import OrderedDict
 from dotenv import load_dotenv
-from db import init_db, list_profiles, upsert_listing
-from scrape_mock import fetch_mock_results
-from filter_simple import score_item
-from notify_telegram import send_item
-from ai_security import evaluate_listing
+from db import init_db, list_profiles, upsert_listings, listing_fingerprints, listing_verdicts, close_conn, LeaseLost
+from sources import get_source, iter_listings, Spool
+from pipeline import Pipeline, Batch
+from matcher import ProfileMatcher
+from bulk_score import score_matrix
+from fingerprint import item_fingerprint, profile_fingerprint
+from notify_queue import enqueue
+import metrics
+import leases
+import local_analysis
+import tiers
+import near_dup
+import geo
 
 BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:8000")
+# Skip the AI stage for pairs scoring below the profile's min_score
+PREFILTER = os.getenv("PREFILTER", "1") != "0"
+# Listings per micro-batch, and how long a partial batch may wait
+PIPELINE_BATCH = int(os.getenv("PIPELINE_BATCH", "100"))
+PIPELINE_FLUSH_SECONDS = float(os.getenv("PIPELINE_FLUSH_SECONDS", "2"))
+# Batches allowed to queue between two stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+# Recently seen URLs remembered for de-duplication within a crawl
+DEDUPE_WINDOW = int(os.getenv("DEDUPE_WINDOW", "100000"))
+# Several worker processes share the profiles through leases in the DB
+WORKER_SHARDING = os.getenv("WORKER_SHARDING", "0") == "1"
+# Local scam signals (red flags, seller meta) on top of the AI verdict
+LOCAL_ANALYSIS = os.getenv("LOCAL_ANALYSIS", "1") != "0"
+# Reuse the verdict of a near-identical listing seen under another URL
+NEAR_DUP = os.getenv("NEAR_DUP", "1") != "0"
+# Skip the AI stage for listings outside a profile's location radius
+GEO_FILTER = os.getenv("GEO_FILTER", "1") != "0"
 
 def badge_text(score: int) -> str:
     if score >= 96: return "Safe"
     if score >= 86: return "Low risk"
     return "Scam alert"  # 70..85
 
-def run_once():
-    """Run the matching + AI scoring exactly once (no infinite loop)."""
-    load_dotenv()
-    init_db()
-    items = fetch_mock_results()
-    profiles = list_profiles()
-    if not profiles:
-        print("No profiles yet. Add some at {}/".format(BASE_URL))
-        return {"ok": True, "processed": 0, "sent": 0}
-
-    sent = 0
-    processed = 0
-    for profile in profiles:
-        print(f"Processing profile: {profile.get('name')}")
-        for it in items:
-            processed += 1
-            score, reason = score_item(it, profile)
-            it["score"] = score
-            it["reason"] = reason
-
-            ai = evaluate_listing(profile, it)
+def _dedupe(items):
+    seen = OrderedDict()
+    for it in items:
+        url = it.get("url")
+        if url is not None:
+            if url in seen:
+                seen.move_to_end(url)
+                continue
+            seen[url] = None
+            if len(seen) > DEDUPE_WINDOW:
+                seen.popitem(last=False)
+        yield it
+
+class _Cycle:
+    """Stages of one run: fetch -> dedupe -> cheap filter -> AI -> persist -> notify."""
+
+    def __init__(self, profiles, counts, held=None, lost=None, evaluator=None, outbox_ids=None):
+        self.profiles = profiles
+        # Shared by every cycle of a run, so the LLM budget is per run
+        self.evaluator = evaluator or tiers.TieredEvaluator()
+        self.matcher = ProfileMatcher(profiles)
+        self.grid = None
+        # Profiles whose area could not be looked up: matched everywhere for
+        # now, and left unfingerprinted so the radius applies once it resolves
+        self.unplaced = set()
+        if GEO_FILTER:
+            self.unplaced = geo.locate_profiles(profiles)
+            self.grid = geo.ProfileGrid(profiles)
+        self.profile_fps = [profile_fingerprint(p) for p in profiles]
+        # Live counters; callers may pass their own dict to watch progress
+        self.counts = counts
+        for name in ("processed", "queued", "skipped", "near_dups", "lease_lost", "llm_calls", "heuristic_only", "deferred",
+                     "fallbacks"):
+            counts.setdefault(name, 0)
+        # Outbox rows queued by this run, so its caller can follow their delivery
+        self.outbox_ids = outbox_ids if outbox_ids is not None else []
+        # Sharded runs: {id(profile): lease} and the set of lost lease units
+        self.held = held or {}
+        self.lost = lost if lost is not None else set()
+
+    def _lost(self, profile):
+        lease = self.held.get(id(profile))
+        return lease is not None and lease[0] in self.lost
+
+    def cheap_filter(self, batches):
+        profiles = self.profiles
+        for items in batches:
+            # Incremental: a pair is only re-evaluated when its listing or
+            # its profile changed since the stored row was written
+            for it in items:
+                it["item_fp"] = item_fingerprint(it)
+            urls = [it.get("url") for it in items]
+            known = [listing_fingerprints(p.get("name"), urls) for p in profiles]
+            stale = [
+                [known[j].get(it.get("url")) != (it["item_fp"], self.profile_fps[j]) for j in range(len(profiles))]
+                for it in items
+            ]
+            todo = [i for i, row in enumerate(stale) if any(row)]
+            self.counts["skipped"] += len(items) * len(profiles) - sum(sum(row) for row in stale)
+            if not todo:
+                continue
+            if NEAR_DUP:
+                # Indexed on upsert, so set before the per-pair copies below
+                with metrics.span("cycle.near_dup"):
+                    for i in todo:
+                        items[i]["lsh"] = near_dup.index_entry(items[i])
+
+            # Keyword/price score for every pair at once; only pairs
+            # reaching the profile's min_score go on to the AI stage. Each
+            # pair gets its own copy of the item so concurrent evaluation
+            # never sees another profile's fields.
+            with metrics.span("cycle.score"):
+                matrix = score_matrix([items[i] for i in todo], self.matcher)
+            # Profiles whose area contains each listing (None: no position, all)
+            areas = None
+            if self.grid is not None:
+                with metrics.span("cycle.geo"):
+                    areas = [self.grid.covering(*self._position(items[i])) for i in todo]
+            pairs, filtered, pair_rows, fresh = [], [], [], []
+            for row, i in enumerate(todo):
+                for j, profile in enumerate(profiles):
+                    if not stale[i][j] or self._lost(profile):
+                        continue
+                    it = dict(items[i])
+                    it["profile_fp"] = None if j in self.unplaced else self.profile_fps[j]
+                    it["score"] = float(matrix.scores[row, j])
+                    it["reason"] = matrix.reason(row, j)
+                    it["keyword_hits"] = int(matrix.hits[row, j])
+                    if areas is not None and areas[row] is not None and j not in areas[row]:
+                        it["distance_km"] = self.grid.distance(j, it["lat"], it["lng"])
+                        filtered.append((profile, it))
+                    elif matrix.passed[row, j] or not PREFILTER:
+                        pairs.append((profile, it))
+                        pair_rows.append(i)
+                        fresh.append(items[i].get("url") not in known[j])
+                    else:
+                        filtered.append((profile, it))
+            dups = []
+            if NEAR_DUP and any(fresh):
+                with metrics.span("cycle.near_dup"):
+                    pairs, pair_rows, dups = self._collapse(items, pairs, pair_rows, fresh)
+            # Local analysis of the listings going to the AI stage starts
+            # now in the process pool and is collected after the AI calls
+            analysis = None
+            if LOCAL_ANALYSIS and pairs:
+                rows = sorted(set(pair_rows))
+                pending = local_analysis.submit([items[i] for i in rows])
+                analysis = (pending, {i: k for k, i in enumerate(rows)}, pair_rows)
+            yield pairs, filtered, dups, analysis
+
+    @staticmethod
+    def _position(item):
+        geo.locate(item)
+        return item["lat"], item["lng"]
+
+    def _collapse(self, items, pairs, pair_rows, fresh):
+        """Split off new pairs that nearly duplicate a listing already judged, copying its verdict."""
+        rows = sorted({i for i, f in zip(pair_rows, fresh) if f})
+        match = {rows[k]: m for k, m in near_dup.find([items[i] for i in rows]).items()}
+        if not match:
+            return pairs, pair_rows, []
+        wanted = {}
+        for (profile, _), i, f in zip(pairs, pair_rows, fresh):
+            if f and i in match:
+                wanted.setdefault(profile.get("name"), set()).add(match[i][0])
+        verdicts = {name: listing_verdicts(name, urls) for name, urls in wanted.items()}
+        kept, kept_rows, dups = [], [], []
+        for (profile, it), i, f in zip(pairs, pair_rows, fresh):
+            url, sim = match.get(i, (None, 0.0)) if f else (None, 0.0)
+            prev = verdicts.get(profile.get("name"), {}).get(url)
+            if prev is None:
+                kept.append((profile, it))
+                kept_rows.append(i)
+                continue
+            reasons = prev["ai_reasons"] or ""
+            if prev["ai_model"] == "near-duplicate":
+                reasons = reasons.split("; ", 1)[-1]
+            it["security_score"] = prev["security_score"]
+            it["status"] = prev["status"]
+            it["ai_model"] = "near-duplicate"
+            it["ai_reasons"] = f"near-duplicate of #{prev['id']} ({sim:.0%} similar); {reasons}"
+            it["duplicate_of"] = prev["id"]
+            dups.append((profile, it))
+        self.counts["near_dups"] += len(dups)
+        return kept, kept_rows, dups
+
+    def evaluate(self, units):
+        for pairs, filtered, dups, analysis in units:
+            with metrics.span("cycle.evaluate"):
+                results = self.evaluator.evaluate(pairs)
+            if analysis is not None:
+                pending, slot, pair_rows = analysis
+                with metrics.span("cycle.local_analysis_wait"):
+                    signals = pending.result()
+                # Kept on the item: a pair held for budget ranking is judged in a later unit
+                for (_, it), i in zip(pairs, pair_rows):
+                    it["local_signals"] = signals[slot[i]]
+            for profile, it in filtered:
+                it["security_score"] = None
+                it["ai_model"] = "prefilter"
+                if it.get("distance_km") is not None:
+                    it["ai_reasons"] = f"{it['distance_km']:.0f} km away, outside profile radius {profile.get('radius')} km"
+                else:
+                    it["ai_reasons"] = f"score {it['score']:.2f} below profile minimum {profile.get('min_score') or 0:.2f}"
+                it["status"] = "rejected"
+            yield self._judge(results) + filtered + dups
+        # Pairs held back so the LLM budget goes to the cycle's best candidates
+        results = self.evaluator.flush()
+        if results:
+            yield self._judge(results)
+
+    def _judge(self, results):
+        """Apply verdicts to their items; returns the (profile, item) pairs."""
+        pairs = []
+        for (profile, it), ai in results:
+            pairs.append((profile, it))
+            ai = local_analysis.apply(ai, it.pop("local_signals", None))
+            tier = ai.get("tier")
+            if tier == "deferred":
+                # Over this run's LLM budget: stored without a verdict or
+                # profile fingerprint, so the next run evaluates it
+                it["security_score"] = None
+                it["ai_model"] = "deferred"
+                it["ai_reasons"] = "waiting for AI evaluation (budget reached)"
+                it["status"] = "deferred"
+                it["profile_fp"] = None
+                self.counts["deferred"] += 1
+                continue
+            if tier in ("llm", "heuristic"):
+                self.counts["llm_calls" if tier == "llm" else "heuristic_only"] += 1
             sec = int(ai.get("security_score", 0))
             decision = ai.get("final_decision", "reject")
             it["security_score"] = sec
-            it["ai_model"] = os.getenv("OPENAI_MODEL") if os.getenv("OPENAI_API_KEY") else "heuristic"
             it["ai_reasons"] = "; ".join(ai.get("reasons", []))
+            if "fallback" in ai:
+                # The AI call failed: keep the heuristic score for now, never
+                # as a pass, and leave the pair unfingerprinted so the next
+                # run asks again
+                it["ai_model"] = "fallback"
+                it["status"] = "unverified"
+                it["profile_fp"] = None
+                self.counts["fallbacks"] += 1
+                continue
+            it["ai_model"] = os.getenv("OPENAI_MODEL") if os.getenv("OPENAI_API_KEY") and tier != "heuristic" else "heuristic"
             it["status"] = "accepted" if (decision == "accept" and sec >= 70) else "rejected"
+        return pairs
 
-            item_id = upsert_listing(it, profile.get("name"))
-            if it["status"] == "accepted":
-                res = send_item(it, profile)
-                if res is True:
-                    sent += 1
-                    print(f"  Sent: {it['title']} {score:.2f} — {sec}/100")
-                elif res is None:
-                    print(f"  Skipped (Telegram not configured): {it['title']} {score:.2f} — {sec}/100")
-                else:
-                    print(f"  Failed to send Telegram: {it['title']} {score:.2f} — {sec}/100")
+    def persist(self, units):
+        for pairs in units:
+            # One transaction per profile per batch
+            by_profile = {}
+            for profile, it in pairs:
+                by_profile.setdefault(id(profile), (profile, []))[1].append(it)
+            for profile, its in by_profile.values():
+                lease = self.held.get(id(profile))
+                try:
+                    with metrics.span("cycle.upsert"):
+                        ids = upsert_listings(its, profile.get("name"), lease=lease)
+                except LeaseLost:
+                    # Another worker owns this profile now and redoes the work
+                    self.lost.add(lease[0])
+                    self.counts["lease_lost"] += len(its)
+                    print(f"  Lease lost, dropped {len(its)} results for {profile.get('name')}")
+                    continue
+                self.counts["processed"] += len(its)
+                for it, item_id in zip(its, ids):
+                    score, sec = it["score"], it["security_score"]
+                    if it.get("duplicate_of"):
+                        # Already judged (and notified) under its earlier URL
+                        print(f"  Near-duplicate of #{it['duplicate_of']}: {it['title']}")
+                    elif it["status"] == "accepted":
+                        yield profile, it, item_id
+                    elif it["status"] == "unverified":
+                        # Heuristic stand-in for a failed AI call; judged again next run
+                        print(f"  Held (AI unavailable): {it['title']} — {sec}/100")
+                    elif it["status"] == "deferred":
+                        print(f"  Deferred (AI budget reached): {it['title']}")
+                    elif it.get("distance_km") is not None:
+                        print(f"  Filtered ({it['distance_km']:.0f} km away): {it['title']}")
+                    elif sec is None:
+                        print(f"  Filtered (score {score:.2f} < min): {it['title']}")
+                    else:
+                        print(f"  Rejected (<70): {it['title']} — {sec}/100")
+
+    def notify(self, accepted):
+        # Hand matches to the outbox; the dispatcher sends them in the
+        # background, so Telegram latency never slows this pipeline
+        for profile, it, item_id in accepted:
+            score, sec = it["score"], it["security_score"]
+            # Include link to item page on our site + direct FB link
+            site_link = f"{BASE_URL}/item/{item_id}" if item_id else BASE_URL
+            suffix = f"[{badge_text(sec)} — {sec}/100]"
+            with metrics.span("cycle.enqueue"):
+                res = enqueue(it, profile, item_id, site_link=site_link, reason=suffix)
+            if res:
+                self.outbox_ids.append(res)
+                self.counts["queued"] += 1
+                print(f"  Queued: {it['title']} {score:.2f} — {sec}/100")
+            elif res is None:
+                print(f"  Skipped (Telegram not configured): {it['title']} {score:.2f} — {sec}/100")
             else:
-                print(f"  Rejected (<70): {it['title']} — {sec}/100")
-    return {"ok": True, "processed": processed, "sent": sent}
+                print(f"  Already notified: {it['title']} {score:.2f} — {sec}/100")
+        return ()
+
+def run_once(source=None, progress: dict | None = None, outbox_ids: list | None = None):
+    """Run the matching + AI scoring exactly once (no infinite loop)."""
+    load_dotenv()
+    init_db()
+    profiles = list_profiles()
+    if not profiles:
+        print("No profiles yet. Add some at {}/".format(BASE_URL))
+        return {"ok": True, "processed": 0, "queued": 0, "skipped": 0}
+    source = source if source is not None else get_source()
+    if NEAR_DUP:
+        near_dup.prune()
+
+    counts = progress if progress is not None else {}
+    evaluator = tiers.TieredEvaluator()
+    if WORKER_SHARDING:
+        _run_sharded(profiles, source, counts, evaluator, outbox_ids)
+    else:
+        _run_cycle(_Cycle(profiles, counts, evaluator=evaluator, outbox_ids=outbox_ids), source)
+
+    if counts["skipped"]:
+        print(f"Unchanged, skipped: {counts['skipped']}")
+    if counts["near_dups"]:
+        print(f"Near-duplicates, verdict reused: {counts['near_dups']}")
+    if counts["llm_calls"] or counts["deferred"] or counts["fallbacks"]:
+        print(f"AI evaluated: {counts['llm_calls']}, heuristic only: {counts['heuristic_only']}, "
+              f"deferred: {counts['deferred']}, AI unavailable: {counts['fallbacks']}")
+    for name in ("processed", "queued", "skipped", "near_dups", "deferred"):
+        metrics.inc(f"cycle_{name}", counts[name])
+    return {"ok": True, "processed": counts["processed"], "queued": counts["queued"], "skipped": counts["skipped"],
+            "near_dups": counts["near_dups"], "llm_calls": counts["llm_calls"],
+            "heuristic_only": counts["heuristic_only"], "deferred": counts["deferred"], "fallbacks": counts["fallbacks"]}
+
+def _run_cycle(cycle, source):
+    stages = [
+        lambda: metrics.timed_iter("cycle.scrape", iter_listings(source)),
+        _dedupe,
+        Batch(PIPELINE_BATCH, PIPELINE_FLUSH_SECONDS),
+        cycle.cheap_filter,
+        cycle.evaluate,
+        cycle.persist,
+        cycle.notify,
+    ]
+    with metrics.span("cycle"):
+        # Stage threads live for one cycle: close the SQLite connections they opened
+        Pipeline(stages, queue_size=PIPELINE_QUEUE_SIZE, on_exit=close_conn).run()
+
+def _run_sharded(profiles, source, counts, evaluator=None, outbox_ids=None):
+    """Process only the profiles this worker can lease, SHARD_CLAIM_SIZE at a time."""
+    owner = leases.worker_id()
+    round_started = time.time()
+    # One crawl per run: later claims replay the listings from disk
+    with Spool(source) as source, leases.Heartbeat(owner) as beat:
+        while True:
+            claimed = leases.claim_profiles(profiles, owner, round_started)
+            if not claimed:
+                break
+            held = [lease for _, lease in claimed]
+            beat.hold(unit for unit, _, _ in held)
+            print(f"Claimed {len(claimed)} profile(s) as {owner}")
+            cycle = _Cycle([p for p, _ in claimed], counts, {id(p): lease for p, lease in claimed}, beat.lost, evaluator,
+                           outbox_ids)
+            try:
+                _run_cycle(cycle, source)
+            except BaseException:
+                leases.release(held, finished=False)
+                raise
+            leases.release(held)
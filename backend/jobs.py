@@ -0,0 +1,125 @@
+import os, threading, time, traceback, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import db
+import metrics
+
+# Finished jobs kept for /jobs/{id}
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))
+# In-process scheduler: run a cycle every N seconds (0 = rely on external cron)
+WORKER_INTERVAL_SECONDS = float(os.getenv("WORKER_INTERVAL_SECONDS", "0"))
+
+_lock = threading.Lock()
+_jobs: "OrderedDict[str, dict]" = OrderedDict()
+_active_id = None
+# One cycle at a time; a second trigger joins the running/queued one
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cycle")
+
+def _now():
+    return time.time()
+
+def _run(job):
+    # Imported here so the web app starts without loading the worker stack
+    from job_runner import run_once
+    global _active_id
+    # get_job reads the job without waiting for us: fill it in before the status says running
+    job["started_at"] = _now()
+    job["status"] = "running"
+    try:
+        if job["profile"] is not None:
+            with metrics.Sampler() as sampler:
+                job["result"] = run_once(progress=job["progress"], outbox_ids=job["_outbox_ids"])
+            job["profile"] = {"samples": sampler.samples, "path": sampler.save(f"cycle-{job['id']}"), "top": sampler.top()}
+        else:
+            job["result"] = run_once(progress=job["progress"], outbox_ids=job["_outbox_ids"])
+        job["status"] = "done"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = f"{type(e).__name__}: {e}"
+        job["progress"]["errors"] = job["progress"].get("errors", 0) + 1
+        traceback.print_exc()
+    finally:
+        job["finished_at"] = _now()
+        with _lock:
+            if _active_id == job["id"]:
+                _active_id = None
+
+def submit_cycle(trigger: str = "http", profile: bool = False):
+    """Queue a cycle unless one is in flight; returns (job, created)."""
+    global _active_id
+    with _lock:
+        if _active_id is not None:
+            return _jobs[_active_id], False
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": "cycle",
+            "trigger": trigger,
+            "status": "queued",
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": {"processed": 0, "queued": 0, "skipped": 0, "sent": 0, "errors": 0},
+            "result": None,
+            "error": None,
+            "profile": {} if profile else None,
+            # Outbox rows this cycle queued; "sent" counts the ones delivered
+            "_outbox_ids": [],
+        }
+        _jobs[job["id"]] = job
+        _active_id = job["id"]
+        while len(_jobs) > JOB_HISTORY:
+            oldest = next(iter(_jobs))
+            if oldest == _active_id:
+                break
+            _jobs.pop(oldest)
+    _executor.submit(_run, job)
+    return job, True
+
+def get_job(job_id: str):
+    """Snapshot of a job with timing, or None if unknown/expired."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        out = {k: v for k, v in job.items() if not k.startswith("_")}
+        out["progress"] = dict(job["progress"])
+        outbox_ids = list(job["_outbox_ids"])
+    # A failed cycle, plus every listing whose AI call fell back to the heuristic
+    out["progress"]["errors"] = out["progress"].get("errors", 0) + out["progress"].get("fallbacks", 0)
+    # This cycle's messages delivered so far (the dispatcher may still be sending after it ends)
+    out["progress"]["sent"] = db.outbox_sent_count(outbox_ids) if outbox_ids else 0
+    start, end = out["started_at"], out["finished_at"]
+    out["queued_seconds"] = round((start or _now()) - out["created_at"], 3)
+    out["run_seconds"] = round((end or _now()) - start, 3) if start else None
+    return out
+
+def list_jobs():
+    """Snapshots of the kept jobs, newest first."""
+    with _lock:
+        ids = list(_jobs)
+    return [get_job(i) for i in reversed(ids)]
+
+class Scheduler:
+    """Triggers a cycle every `interval` seconds, replacing the external cron."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            job, created = submit_cycle(trigger="scheduler")
+            if not created:
+                print(f"Scheduler: cycle {job['id']} still {job['status']}, not starting another")
+
+    def start(self):
+        if self.interval > 0 and not (self._thread and self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+scheduler = Scheduler(WORKER_INTERVAL_SECONDS)
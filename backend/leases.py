@@ -0,0 +1,75 @@
+import os, socket, threading, time, uuid
+import db
+
+# Seconds a claim survives without a heartbeat; a crashed worker's profiles
+# are picked up by the next worker after this long
+LEASE_TTL = float(os.getenv("LEASE_TTL", "120"))
+# Profiles claimed at a time; each claim is one pass over the run's listings
+SHARD_CLAIM_SIZE = int(os.getenv("SHARD_CLAIM_SIZE", "25"))
+
+_worker_id = None
+
+def worker_id() -> str:
+    """Stable id for this process, used as the lease owner."""
+    global _worker_id
+    if _worker_id is None:
+        _worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    return _worker_id
+
+def unit_for(profile) -> str:
+    return f"profile:{profile['id']}"
+
+class Heartbeat:
+    """Renews this worker's leases every LEASE_TTL/3 seconds; expired units go to `lost`."""
+
+    def __init__(self, owner: str, ttl: float | None = None):
+        self.owner = owner
+        self.ttl = ttl or LEASE_TTL
+        self.lost = set()
+        self._held = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def hold(self, units):
+        self._held |= set(units)
+
+    def _loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                held = db.lease_renew(self.owner, self.ttl)
+            except Exception as e:
+                # Transient (locked DB): the next beat retries well before expiry
+                print("Lease heartbeat error:", e)
+                continue
+            for unit in self._held - held:
+                print(f"Lease lost: {unit}")
+            self.lost |= self._held - held
+            self._held &= held
+        db.close_conn()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+def claim_profiles(profiles, owner: str, round_started: float, limit: int | None = None):
+    """Claim up to `limit` profiles not yet done this round; returns [(profile, lease)]."""
+    by_unit = {unit_for(p): p for p in profiles}
+    claimed = db.lease_claim(by_unit, owner, LEASE_TTL, limit or SHARD_CLAIM_SIZE, round_started)
+    return [(by_unit[unit], (unit, owner, token)) for unit, token in claimed.items()]
+
+def release(leases, finished: bool = True):
+    for unit, owner, token in leases:
+        db.lease_release(unit, owner, token, finished)
+
+def stats() -> list:
+    now = time.time()
+    rows = db.lease_list()
+    for r in rows:
+        r["held"] = bool(r["owner"]) and (r["expires_at"] or 0) > now
+    return rows
@@ -0,0 +1,177 @@
+"""Local scam signals, computed in a process pool off the main interpreter."""
+import atexit, hashlib, importlib, json, os, re, threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Processes for local analysis; 0 runs it inline in the calling thread
+LOCAL_ANALYSIS_WORKERS = int(os.getenv("LOCAL_ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Listings per task sent to a worker process
+LOCAL_ANALYSIS_CHUNK = int(os.getenv("LOCAL_ANALYSIS_CHUNK", "64"))
+LOCAL_ANALYZERS = [m.strip() for m in os.getenv("LOCAL_ANALYZERS", "").split(",") if m.strip()]
+# Most points local signals may take off a verdict's security score
+MAX_PENALTY = 40
+
+ANALYZERS = {}
+
+def analyzer(name):
+    # fn(item) -> {"penalty": points off, "reasons": [...]}; modules named in
+    # LOCAL_ANALYZERS are imported in every worker to register more
+    def register(fn):
+        ANALYZERS[name] = fn
+        return fn
+    return register
+
+# ---------- Built-in analyzers ----------
+RED_FLAGS = {
+    "off-platform payment": r"\b(western union|moneygram|bank transfer|wire transfer|gift ?cards?|crypto|bitcoin|usdt)\b",
+    "friends & family payment": r"\bpay ?pal\W+(f&f|friends|family)|\bfriends (and|&) family\b",
+    "moves chat off-site": r"\b(whats ?app|telegram|signal|text me|email me)\b",
+    "phone number in text": r"(?:\+?\d[\s-]?){10,13}",
+    "deposit up front": r"\b(deposit|pay first|upfront|up front|advance payment)\b",
+    "shipping only": r"\b(shipping only|ship only|no collection|courier only|can'?t meet)\b",
+    "pressure to hurry": r"\b(urgent|today only|first to pay|quick sale|must go today)\b",
+    "no photos of item": r"\b(stock (photo|image)|photos? (on|upon) request)\b",
+}
+_RED_FLAG_RE = [(name, re.compile(rx, re.I)) for name, rx in RED_FLAGS.items()]
+
+@analyzer("red_flags")
+def red_flags(fields):
+    text = f"{fields['title']}\n{fields['description']}"
+    found = [name for name, rx in _RED_FLAG_RE if rx.search(text)]
+    return {"penalty": 10 * len(found), "reasons": [f"red flag: {name}" for name in found], "red_flags": found}
+
+@analyzer("seller")
+def seller(fields):
+    try:
+        meta = json.loads(fields["seller_meta"] or "{}")
+    except (TypeError, ValueError):
+        return {"reasons": ["seller signals unreadable"]}
+    if not isinstance(meta, dict):
+        return {}
+    penalty, reasons = 0, []
+    rating = meta.get("rating")
+    if isinstance(rating, (int, float)) and rating < 3.5:
+        penalty += 10
+        reasons.append(f"seller rating {rating}")
+    joined = meta.get("joined_days")
+    if isinstance(joined, (int, float)) and joined < 30:
+        penalty += 10
+        reasons.append(f"seller account {int(joined)} days old")
+    if meta.get("verified") is False:
+        penalty += 5
+        reasons.append("seller not verified")
+    return {"penalty": penalty, "reasons": reasons}
+
+_WORD = re.compile(r"\w+")
+
+def simhash(text: str, bits: int = 64) -> int:
+    """64-bit SimHash over word 3-shingles; near-identical texts differ in few bits."""
+    words = _WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * bits
+    for sh in shingles:
+        h = int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(), "big")
+        for b in range(bits):
+            weights[b] += 1 if h >> b & 1 else -1
+    return sum(1 << b for b in range(bits) if weights[b] > 0)
+
+@analyzer("text_fp")
+def text_fp(fields):
+    return {"simhash": format(simhash(f"{fields['title']} {fields['description']}"), "016x")}
+
+# ---------- Running them ----------
+def _load_plugins():
+    for module in LOCAL_ANALYZERS:
+        importlib.import_module(module)
+
+def analyze(fields) -> dict:
+    """Run every analyzer on one listing's fields; merges their results."""
+    out = {"penalty": 0, "reasons": []}
+    for name, fn in ANALYZERS.items():
+        try:
+            res = fn(fields) or {}
+        except Exception as e:
+            res = {"reasons": [f"{name} failed: {type(e).__name__}"]}
+        out["penalty"] += int(res.pop("penalty", 0))
+        out["reasons"] += res.pop("reasons", [])
+        out.update(res)
+    out["penalty"] = min(MAX_PENALTY, out["penalty"])
+    return out
+
+def _analyze_chunk(rows):
+    # Runs in a worker process: rows are (title, description, seller_meta)
+    return [analyze({"title": t, "description": d, "seller_meta": s}) for t, d, s in rows]
+
+def _fields(item):
+    return (item.get("title") or "", item.get("description") or "", item.get("seller_meta") or "")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # forkserver/spawn: forking a process that runs threads can
+                # copy held locks into the child
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _pool = ProcessPoolExecutor(
+                    max_workers=LOCAL_ANALYSIS_WORKERS,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_load_plugins,
+                )
+    return _pool
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown)
+
+class Pending:
+    """Results of `submit`, in item order once `result()` returns."""
+
+    def __init__(self, rows, futures=None, done=None):
+        self._rows = rows
+        self._futures = futures or []
+        self._done = done
+
+    def result(self) -> list:
+        if self._done is None:
+            try:
+                self._done = [res for fut in self._futures for res in fut.result()]
+            except Exception as e:
+                # A worker died (BrokenProcessPool) or similar: redo it here
+                print("Local analysis failed in the pool, running inline:", e)
+                self._done = _analyze_chunk(self._rows)
+        return self._done
+
+def submit(items) -> Pending:
+    """Start analysing `items` and return at once; collect with `.result()`."""
+    rows = [_fields(it) for it in items]
+    if LOCAL_ANALYSIS_WORKERS <= 0 or not rows:
+        return Pending(rows, done=_analyze_chunk(rows))
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(_analyze_chunk, rows[i:i + LOCAL_ANALYSIS_CHUNK])
+                   for i in range(0, len(rows), LOCAL_ANALYSIS_CHUNK)]
+    except Exception as e:
+        print("Local analysis pool unavailable, running inline:", e)
+        return Pending(rows, done=_analyze_chunk(rows))
+    return Pending(rows, futures)
+
+def apply(verdict: dict, signals: dict) -> dict:
+    """Copy of `verdict` with the local penalty and reasons folded in."""
+    if not signals or not signals.get("penalty") and not signals.get("reasons"):
+        return verdict
+    out = dict(verdict)
+    sec = max(0, int(out.get("security_score", 0)) - signals.get("penalty", 0))
+    out["security_score"] = sec
+    out["reasons"] = list(out.get("reasons", [])) + signals.get("reasons", [])
+    if sec < 70:
+        out["final_decision"] = "reject"
+    return out
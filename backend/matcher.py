@@ -0,0 +1,98 @@
+from collections import deque
+from filter_simple import parse_keywords, score_hits
+
+class ProfileMatcher:
+    """Aho-Corasick keyword matcher over every profile; scores match `score_item`."""
+
+    def __init__(self, profiles):
+        self.profiles = list(profiles)
+        self.kw_counts = []
+        ids = {}
+        # keyword id -> [(profile index, times the profile lists it)]
+        self._owners = []
+        for pidx, profile in enumerate(self.profiles):
+            kws = parse_keywords(profile.get("keywords") or "")
+            self.kw_counts.append(len(kws))
+            counts = {}
+            for k in kws:
+                counts[k] = counts.get(k, 0) + 1
+            for k, n in counts.items():
+                kid = ids.get(k)
+                if kid is None:
+                    kid = ids[k] = len(self._owners)
+                    self._owners.append([])
+                self._owners[kid].append((pidx, n))
+        self._build(ids)
+        # Per-profile constants so score_all only formats what varies per item
+        self._rows = [
+            (p.get("price_min_cents"), p.get("price_max_cents"), n, f"/{n} keywords matched",
+             f"{(p.get('price_min_cents') or 0)/100:.2f}", f"{(p.get('price_max_cents') or 0)/100:.2f}")
+            for p, n in zip(self.profiles, self.kw_counts)
+        ]
+
+    def _build(self, ids):
+        goto, fail, out = [{}], [0], [()]
+        for word, kid in ids.items():
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({}); fail.append(0); out.append(())
+                state = nxt
+            out[state] = out[state] + (kid,)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def keywords_in(self, title: str) -> set:
+        """Ids of every keyword occurring as a substring of `title`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in (title or "").lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def hits(self, title: str) -> dict:
+        """Sparse {profile index: keyword hits} for one title."""
+        hits = {}
+        for kid in self.keywords_in(title):
+            for pidx, n in self._owners[kid]:
+                hits[pidx] = hits.get(pidx, 0) + n
+        return hits
+
+    def score(self, item, pidx: int, hits: dict | None = None):
+        """(score, reason) of `item` for profile number `pidx`, as `score_item` returns it."""
+        if hits is None:
+            hits = self.hits(item.get("title"))
+        return score_hits(item, self.profiles[pidx], hits.get(pidx, 0), self.kw_counts[pidx])
+
+    def score_all(self, item):
+        """[(score, reason)] for every profile, in profile order, from one scan."""
+        hits = self.hits(item.get("title"))
+        price = item.get("price_cents") or 0
+        price_s = f"{price/100:.2f}"
+        out = []
+        append = out.append
+        for pidx, (pmin, pmax, n, suffix, pmin_s, pmax_s) in enumerate(self._rows):
+            h = hits.get(pidx, 0)
+            if pmax is not None and price > pmax:
+                append((0.0, f"{h}{suffix}; price {price_s} > max {pmax_s}"))
+            elif pmin is not None and price < pmin:
+                append((0.0, f"{h}{suffix}; price {price_s} < min {pmin_s}"))
+            else:
+                append((h / max(1, n) if n else 0.0, f"{h}{suffix}"))
+        return out
@@ -0,0 +1,238 @@
+import os, sys, threading, time
+from collections import Counter, deque
+
+# Recent samples kept per endpoint for percentile estimates
+LATENCY_WINDOW = 1024
+# Histogram bucket upper bounds (seconds) for /metrics
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Prefix of every exported metric name
+METRICS_PREFIX = "dealai"
+
+_lock = threading.Lock()
+_latency: dict = {}
+_totals: dict = {}
+_buckets: dict = {}
+_counters: dict = {}
+_gauges: dict = {}
+
+def _key(name: str, labels: dict):
+    return (name, tuple(sorted(labels.items()))) if labels else name
+
+def _split(key):
+    return key if isinstance(key, tuple) else (key, ())
+
+def observe(name: str, seconds: float, **labels):
+    """Record one latency sample (in seconds) for `name`."""
+    key = _key(name, labels)
+    with _lock:
+        window = _latency.get(key)
+        if window is None:
+            window = _latency[key] = deque(maxlen=LATENCY_WINDOW)
+            _totals[key] = [0, 0.0]
+            _buckets[key] = [0] * len(BUCKETS)
+        window.append(seconds)
+        _totals[key][0] += 1
+        _totals[key][1] += seconds
+        counts = _buckets[key]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+
+def inc(name: str, value: float = 1, **labels):
+    """Add `value` to the counter `name`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def gauge(name: str, value: float, **labels):
+    """Set the current value of `name`."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+class timer:
+    """Context manager recording the wall time of its block under `name`."""
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+# Spans around the stages of a cycle share the timer machinery
+span = timer
+
+def timed_iter(name: str, iterable):
+    """Yield from `iterable`, timing each fetch (not the consumer) under `name`."""
+    it = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            value = next(it)
+        except StopIteration:
+            return
+        observe(name, time.perf_counter() - start)
+        yield value
+
+def _pct(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+def _label_str(labels) -> str:
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{esc(v)}"' for k, v in labels)
+
+def _display(key) -> str:
+    name, labels = _split(key)
+    return f"{name}{{{_label_str(labels)}}}" if labels else name
+
+def latency_summary() -> dict:
+    """count/mean over all samples, p50/p95/p99 over the recent window (ms)."""
+    with _lock:
+        snap = {_display(k): (sorted(v), list(_totals[k])) for k, v in _latency.items()}
+    out = {}
+    for name, (samples, (count, total)) in sorted(snap.items()):
+        out[name] = {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2),
+            "p50_ms": round(_pct(samples, 0.50) * 1000, 2),
+            "p95_ms": round(_pct(samples, 0.95) * 1000, 2),
+            "p99_ms": round(_pct(samples, 0.99) * 1000, 2),
+        }
+    return out
+
+def _metric_name(name: str) -> str:
+    return METRICS_PREFIX + "_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def render_prometheus() -> str:
+    """All counters, gauges and latency histograms in the Prometheus text format."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        hist = {k: (list(_buckets[k]), list(_totals[k])) for k in _latency}
+    lines = []
+    families = {}
+    for key, value in counters.items():
+        name, labels = _split(key)
+        families.setdefault((_metric_name(name) + "_total", "counter"), []).append((labels, value))
+    for key, value in gauges.items():
+        name, labels = _split(key)
+        families.setdefault((_metric_name(name), "gauge"), []).append((labels, value))
+    for (metric, kind), samples in sorted(families.items()):
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in sorted(samples):
+            lines.append(f"{metric}{{{_label_str(labels)}}} {value}" if labels else f"{metric} {value}")
+    metric = METRICS_PREFIX + "_latency_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for key, (counts, (count, total)) in sorted(hist.items(), key=lambda kv: _display(kv[0])):
+        name, labels = _split(key)
+        base = _label_str((("span", name),) + labels)
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f'{metric}_bucket{{{base},le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{{base},le="+Inf"}} {count}')
+        lines.append(f"{metric}_sum{{{base}}} {total}")
+        lines.append(f"{metric}_count{{{base}}} {count}")
+    return "\n".join(lines) + "\n"
+
+class LatencyMiddleware:
+    """ASGI middleware timing each request to its response headers, by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        done = False
+
+        def record(status):
+            route = scope.get("route")
+            observe("api", time.perf_counter() - start, method=scope["method"],
+                    route=getattr(route, "path", "unmatched"), status=status)
+
+        async def timed_send(message):
+            nonlocal done
+            if message["type"] == "http.response.start" and not done:
+                done = True
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not done:
+                record(500)
+
+# ---------- Opt-in sampling profiler ----------
+# Seconds between stack samples while a profiled cycle runs
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+# Leaf frames of threads parked on a queue or event, left out of `top()`
+_IDLE = {"threading.py:wait", "queue.py:get", "queue.py:put", "selectors.py:select", "base_events.py:_run_once"}
+
+class Sampler:
+    """Samples the stacks of every other thread at a fixed interval."""
+
+    def __init__(self, interval: float | None = None):
+        self.interval = interval or PROFILE_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                # Thread name first so pipeline stages show up as separate roots
+                stack.append(names.get(ident, "thread").rstrip("0123456789_-"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, name="sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 15) -> list:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if leaf not in _IDLE:
+                leaves[leaf] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": f, "samples": c, "share": round(c / total, 4)} for f, c in leaves.most_common(n)]
+
+    def save(self, name: str) -> str:
+        """Write the folded stacks to PROFILE_DIR/<name>.folded and return the path."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
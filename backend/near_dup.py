@@ -0,0 +1,80 @@
+"""Near-duplicate listings: MinHash signatures banded into an LSH index stored in SQLite."""
+import hashlib, math, os, re, zlib
+import numpy as np
+import db
+
+# Estimated Jaccard similarity at which a listing counts as a near-duplicate
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+# Signature length and bands; rows per band = hashes / bands. 32 x 8 finds
+# pairs above ~0.6 similarity almost always, below ~0.3 almost never
+NEAR_DUP_HASHES = int(os.getenv("NEAR_DUP_HASHES", "32"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "8"))
+# Newest URLs read per bucket
+NEAR_DUP_MAX_CANDIDATES = int(os.getenv("NEAR_DUP_MAX_CANDIDATES", "20"))
+NEAR_DUP_RETENTION_DAYS = float(os.getenv("NEAR_DUP_RETENTION_DAYS", "90"))
+
+# Fixed seed: signatures are stored, so the hash family must never change
+_rng = np.random.default_rng(0x6E656172)
+_A = _rng.integers(1, 2**63, size=NEAR_DUP_HASHES, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NEAR_DUP_HASHES, dtype=np.uint64)
+_ROWS = NEAR_DUP_HASHES // NEAR_DUP_BANDS
+
+_WORD = re.compile(r"[^\W_]+")
+
+def shingles(item: dict) -> set:
+    """Title words and word pairs, description 3-word shingles, and a price bucket."""
+    title = _WORD.findall((item.get("title") or "").lower())
+    desc = _WORD.findall((item.get("description") or "").lower())
+    out = {f"t:{w}" for w in title}
+    out.update(f"t:{a} {b}" for a, b in zip(title, title[1:]))
+    out.update("d:" + " ".join(desc[i:i + 3]) for i in range(max(0, len(desc) - 2)))
+    price = item.get("price_cents")
+    if price:
+        # ~10% wide buckets: a small price drop on a relisting still matches
+        out.add(f"p:{round(math.log(price) / math.log(1.1))}")
+    return out
+
+def signature(item: dict) -> np.ndarray:
+    """MinHash of `item` as NEAR_DUP_HASHES uint32 values."""
+    sh = shingles(item)
+    if not sh:
+        return np.full(NEAR_DUP_HASHES, 0xFFFFFFFF, dtype=np.uint32)
+    x = np.fromiter((zlib.crc32(s.encode()) for s in sh), dtype=np.uint64, count=len(sh))
+    # Multiply-shift hashing: (a*x + b) mod 2^64, top 32 bits
+    h = (_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)
+    return h.min(axis=1).astype(np.uint32)
+
+def band_keys(sig: np.ndarray) -> list:
+    keys = []
+    for band in range(NEAR_DUP_BANDS):
+        chunk = sig[band * _ROWS:(band + 1) * _ROWS].tobytes()
+        digest = hashlib.blake2b(bytes([band]) + chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big") >> 1)  # fits a signed SQLite INTEGER
+    return keys
+
+def index_entry(item: dict):
+    """(signature bytes, band keys) as `db.upsert_listings` stores them under item["lsh"]."""
+    sig = signature(item)
+    return sig.tobytes(), band_keys(sig)
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two stored signatures."""
+    x, y = np.frombuffer(a, dtype=np.uint32), np.frombuffer(b, dtype=np.uint32)
+    if len(x) != len(y):
+        return 0.0
+    return float(np.mean(x == y))
+
+def find(items) -> dict:
+    """{index in items: (url, similarity)} of the closest indexed listing at the threshold or above."""
+    out = {}
+    for i, it in enumerate(items):
+        sig, keys = it["lsh"]
+        cands = db.lsh_candidates(keys, NEAR_DUP_MAX_CANDIDATES)
+        cands.pop(it.get("url"), None)
+        best = max(((similarity(sig, s), url) for url, s in cands.items()), default=None)
+        if best and best[0] >= NEAR_DUP_THRESHOLD:
+            out[i] = (best[1], best[0])
+    return out
+
+def prune():
+    return db.lsh_prune(NEAR_DUP_RETENTION_DAYS * 86400)
@@ -0,0 +1,212 @@
+import asyncio, os, random, threading, time
+import db
+import metrics
+import http_client
+import ratelimit
+import notify_telegram
+from notify_telegram import format_item, chat_for
+
+# Telegram allows about one message per second per chat and 30 per second
+# per bot overall
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_MAX_ATTEMPTS = int(os.getenv("TELEGRAM_MAX_ATTEMPTS", "8"))
+TELEGRAM_BACKOFF = float(os.getenv("TELEGRAM_BACKOFF", "2"))
+# Claimed messages not finished within this many seconds are retried
+TELEGRAM_CLAIM_TIMEOUT = float(os.getenv("TELEGRAM_CLAIM_TIMEOUT", "120"))
+# Finished outbox rows are kept this long for de-duplication and auditing
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(30 * 24 * 3600)))
+CLAIM_BATCH = 100
+POLL_SECONDS = 5.0
+MESSAGE_LIMIT = 4096  # Telegram's maximum text length
+
+def enqueue(item, profile, listing_id, site_link=None, reason=None):
+    """Queue a match for its chat. Returns the outbox row id if queued, False
+    if it was already queued before, None if Telegram is not configured."""
+    chat = chat_for(profile)
+    if not os.getenv("TELEGRAM_BOT_TOKEN") or not chat:
+        return None
+    added = db.outbox_add([{
+        "chat_id": chat,
+        # Same listing version is never sent to the same chat twice
+        "dedupe_key": f"{listing_id}:{item.get('item_fp') or item.get('url')}",
+        "listing_id": listing_id,
+        "profile": profile.get("name"),
+        "text": format_item(item, profile, site_link=site_link, reason=reason),
+    }])
+    if added:
+        wake()
+        return added[0]
+    return False
+
+def _digests(rows):
+    """Coalesce one chat's messages into as few texts as fit the size limit."""
+    if len(rows) == 1:
+        yield rows, rows[0]["text"][:MESSAGE_LIMIT]
+        return
+    group, size = [], 0
+    for row in rows:
+        text = row["text"][:MESSAGE_LIMIT - 40]
+        if group and size + len(text) + 2 > MESSAGE_LIMIT - 40:
+            yield group, _digest_text(group)
+            group, size = [], 0
+        group.append(dict(row, text=text))
+        size += len(text) + 2
+    if group:
+        yield group, _digest_text(group)
+
+def _digest_text(group):
+    if len(group) == 1:
+        return group[0]["text"]
+    return f"🔔 {len(group)} new matches\n\n" + "\n\n".join(r["text"] for r in group)
+
+class Dispatcher:
+    """Background sender draining the outbox, on its own asyncio thread."""
+
+    def __init__(self):
+        self.sent = self.failed = self.retried = 0
+        self._chat_limiters = {}
+        self._global = ratelimit.RateLimiter(TELEGRAM_GLOBAL_RATE)
+        self._thread = None
+        self._loop = None
+        self._wake = None
+        self._stopping = False
+
+    def _limiter(self, chat):
+        lim = self._chat_limiters.get(chat)
+        if lim is None:
+            lim = self._chat_limiters[chat] = ratelimit.RateLimiter(TELEGRAM_CHAT_RATE, 1)
+        return lim
+
+    async def _send(self, client, token, chat, rows, text):
+        await self._limiter(chat).acquire_async()
+        await self._global.acquire_async()
+        ids = [r["id"] for r in rows]
+        attempts = max(r["attempts"] for r in rows) + 1
+        # Claim stamp: if another dispatcher re-claimed these rows meanwhile,
+        # our outcome must not overwrite its state
+        claimed = rows[0]["claimed_at"]
+        try:
+            with metrics.timer("http.telegram.sendMessage"):
+                r = await client.post(f"{notify_telegram.TELEGRAM_API_URL}/bot{token}/sendMessage", json={
+                    "chat_id": chat,
+                    "text": text,
+                    "disable_web_page_preview": True
+                })
+        except Exception as e:
+            return self._retry(ids, attempts, TELEGRAM_BACKOFF * 2 ** attempts, f"network: {e}", claimed)
+        if r.status_code == 429:
+            try:
+                delay = float(r.json().get("parameters", {}).get("retry_after", 1))
+            except Exception:
+                delay = TELEGRAM_BACKOFF
+            return self._retry(ids, attempts, delay, "429 rate limited", claimed)
+        if r.status_code >= 500:
+            return self._retry(ids, attempts, TELEGRAM_BACKOFF * 2 ** attempts, f"HTTP {r.status_code}", claimed)
+        ok = r.is_success
+        if ok:
+            try:
+                ok = bool(r.json().get("ok", False))
+            except Exception:
+                # If JSON parse fails but HTTP 200, count as success
+                ok = True
+        if ok:
+            self.sent += len(ids)
+            metrics.inc("telegram_messages", len(ids), outcome="sent")
+            db.outbox_finish(ids, "sent", claimed_at=claimed)
+        else:
+            self.failed += len(ids)
+            metrics.inc("telegram_messages", len(ids), outcome="failed")
+            db.outbox_finish(ids, "failed", f"HTTP {r.status_code}: {r.text[:200]}", claimed)
+
+    def _retry(self, ids, attempts, delay, error, claimed=None):
+        if attempts >= TELEGRAM_MAX_ATTEMPTS:
+            self.failed += len(ids)
+            metrics.inc("telegram_messages", len(ids), outcome="failed")
+            db.outbox_finish(ids, "failed", error, claimed)
+            return
+        self.retried += len(ids)
+        metrics.inc("telegram_messages", len(ids), outcome="retried")
+        db.outbox_retry(ids, delay * (0.5 + random.random()), error, claimed)
+
+    async def _drain_once(self, client) -> int:
+        """Send everything currently due; returns how many messages were claimed."""
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        rows = db.outbox_claim(CLAIM_BATCH, TELEGRAM_CLAIM_TIMEOUT)
+        if not rows:
+            return 0
+        if not token:
+            db.outbox_finish([r["id"] for r in rows], "failed", "TELEGRAM_BOT_TOKEN not set")
+            return len(rows)
+        by_chat = {}
+        for r in rows:
+            by_chat.setdefault(r["chat_id"], []).append(r)
+
+        async def per_chat(chat, chat_rows):
+            for group, text in _digests(chat_rows):
+                await self._send(client, token, chat, group, text)
+
+        await asyncio.gather(*(per_chat(chat, chat_rows) for chat, chat_rows in by_chat.items()))
+        return len(rows)
+
+    async def _run(self):
+        self._wake = asyncio.Event()
+        try:
+            async with http_client.async_client() as client:
+                db.outbox_prune(OUTBOX_RETENTION)
+                while not self._stopping:
+                    try:
+                        while await self._drain_once(client):
+                            pass
+                    except Exception as e:
+                        print("Telegram dispatcher error:", e)
+                    due = db.outbox_next_due()
+                    timeout = POLL_SECONDS if due is None else min(POLL_SECONDS, max(0.05, due - time.time()))
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wake.clear()
+        finally:
+            db.close_conn()
+
+    def start(self):
+        """Run the dispatcher on a daemon thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._run(),),
+                                        name="telegram-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        self.wake()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Look at the outbox now instead of at the next poll."""
+        if self._loop is not None and self._wake is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def drain(self, timeout: float = 60.0):
+        """Send what is due in the calling thread (for one-shot CLI runs)."""
+        async def run():
+            deadline = time.time() + timeout
+            async with http_client.async_client() as client:
+                while time.time() < deadline and await self._drain_once(client):
+                    pass
+        asyncio.run(run())
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, "outbox": db.outbox_stats()}
+
+dispatcher = Dispatcher()
+
+def start():
+    dispatcher.start()
+
+def wake():
+    dispatcher.wake()
@@ -1,19 +1,11 @@
-import os, requests
+import os
+import http_client
 
-def send_item(item, profile, site_link=None, reason=None):
-    """Send a Telegram message.
-    Returns:
-      True  -> sent successfully
-      False -> API call attempted but failed
-      None  -> not configured (missing token or chat)
-    """
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat = profile.get("chat_id") or os.getenv("TELEGRAM_CHAT_ID")
-    if not token or not chat:
-        # Not configured
-        return None
+# Overridable for a local Bot API server or a test stand-in
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
 
-    price = item.get("price_cents", 0) / 100
+def format_item(item, profile, site_link=None, reason=None) -> str:
+    price = (item.get("price_cents") or 0) / 100
     text = (
         f"✅ [{profile.get('name')}] Match\n"
         f"{item.get('title')}\n"
@@ -24,9 +16,27 @@ def send_item(item, profile, site_link=None, reason=None):
     # Add our site link if provided
     if site_link:
         text += f"\nView on our site: {site_link}"
+    return text
+
+def chat_for(profile) -> str | None:
+    return profile.get("chat_id") or os.getenv("TELEGRAM_CHAT_ID")
+
+def send_item(item, profile, site_link=None, reason=None):
+    """Send a Telegram message.
+    Returns:
+      True  -> sent successfully
+      False -> API call attempted but failed
+      None  -> not configured (missing token or chat)
+    """
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    chat = chat_for(profile)
+    if not token or not chat:
+        # Not configured
+        return None
 
+    text = format_item(item, profile, site_link, reason)
     try:
-        r = requests.post(f"https://api.telegram.org/bot{token}/sendMessage", json={
+        r = http_client.post("telegram.sendMessage", f"{TELEGRAM_API_URL}/bot{token}/sendMessage", json={
             "chat_id": chat,
             "text": text,
             "disable_web_page_preview": True
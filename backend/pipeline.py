@@ -0,0 +1,97 @@
+import queue, threading, time
+
+_DONE = object()
+
+class Batch:
+    """Stage grouping items into lists of up to `size`, flushed after `max_wait` seconds."""
+
+    def __init__(self, size: int, max_wait: float = 1.0):
+        self.size = size
+        self.max_wait = max_wait
+
+class Pipeline:
+    """Run generator stages in their own threads joined by bounded queues."""
+
+    def __init__(self, stages, queue_size: int = 8, on_exit=None):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        # Called in each stage thread as it ends (per-thread cleanup)
+        self.on_exit = on_exit
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _iter(self, q):
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _batches(self, q, batch: Batch):
+        buf, deadline = [], None
+        while not self._stop.is_set():
+            timeout = 0.1 if deadline is None else max(0.0, min(0.1, deadline - time.monotonic()))
+            try:
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                if not buf:
+                    deadline = time.monotonic() + batch.max_wait
+                buf.append(item)
+            if buf and (len(buf) >= batch.size or time.monotonic() >= deadline):
+                yield buf
+                buf, deadline = [], None
+        if buf and not self._stop.is_set():
+            yield buf
+
+    def _worker(self, stage, inbox, outbox):
+        try:
+            if isinstance(stage, Batch):
+                results = self._batches(inbox, stage)
+            else:
+                results = stage(self._iter(inbox)) if inbox is not None else stage()
+            for result in results:
+                if not self._put(outbox, result):
+                    break
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+        finally:
+            if not self._stop.is_set():
+                self._put(outbox, _DONE)
+            if self.on_exit is not None:
+                self.on_exit()
+
+    def run(self):
+        """Drive every stage to completion; the last stage's output is discarded."""
+        queues = [None] + [queue.Queue(self.queue_size) for _ in self.stages]
+        threads = [
+            threading.Thread(target=self._worker, args=(stage, queues[i], queues[i + 1]),
+                             name=f"pipeline-{i}", daemon=True)
+            for i, stage in enumerate(self.stages)
+        ]
+        for t in threads:
+            t.start()
+        for _ in self._iter(queues[-1]):
+            pass
+        self._stop.set()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,80 @@
+import asyncio, os, re
+from fastapi import HTTPException
+import http_client
+import metrics
+from ttl_cache import TTLCache
+
+# Places barely change; identical lookups from any user are served from here
+PLACES_CACHE_TTL = float(os.getenv("PLACES_CACHE_TTL", "3600"))
+PLACES_CACHE_SIZE = int(os.getenv("PLACES_CACHE_SIZE", "2048"))
+
+ENDPOINTS = {
+    "autosuggest": ("https://autosuggest.search.hereapi.com/v1/autosuggest", "q", 5),
+    "geocode": ("https://geocode.search.hereapi.com/v1/geocode", "q", 7),
+    "lookup": ("https://lookup.search.hereapi.com/v1/lookup", "id", 5),
+}
+
+# Local stand-ins for HERE when USE_FIXTURE=1
+FIXTURES = {
+    "autosuggest": {
+        "items": [
+            { "id": "here:af:street:123", "title": "10 Downing Street", "address": { "label": "10 Downing St, London SW1A 2AA, UK" }, "position": { "lat": 51.5034, "lng": -0.1276 } },
+            { "id": "here:af:postal:SW1A1AA", "title": "SW1A 1AA", "address": { "label": "SW1A 1AA, London, UK" }, "position": { "lat": 51.5010, "lng": -0.1416 } },
+        ]
+    },
+    "geocode": {
+        "items": [
+            { "id": "here:af:street:123", "title": "10 Downing Street", "address": { "label": "10 Downing St, London SW1A 2AA, UK" }, "position": { "lat": 51.5034, "lng": -0.1276 } },
+        ]
+    },
+    "lookup": { "id": "here:af:street:123", "title": "10 Downing Street", "address": { "label": "10 Downing St, London SW1A 2AA, UK" }, "position": { "lat": 51.5034, "lng": -0.1276 } },
+}
+
+cache = TTLCache(PLACES_CACHE_SIZE, PLACES_CACHE_TTL)
+_clients = {}
+
+def _client():
+    # httpx async clients are bound to the loop that created them
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = http_client.async_client()
+    return client
+
+def cache_key(endpoint: str, params: dict) -> tuple:
+    """Normalize params so trivially different keystrokes share an entry."""
+    norm = []
+    for k, v in params.items():
+        if k in ("q", "id"):
+            v = re.sub(r"\s+", " ", v).strip().casefold()
+        norm.append((k, v))
+    return (endpoint, tuple(sorted(norm)))
+
+async def _fetch(endpoint: str, params: dict):
+    url, _, timeout = ENDPOINTS[endpoint]
+    with metrics.timer(f"http.here.{endpoint}"):
+        if os.getenv("USE_FIXTURE") == "1":
+            return FIXTURES[endpoint]
+        headers = {"Authorization": f"Bearer {os.getenv('HERE_API_KEY')}"}
+        try:
+            r = await _client().get(url, params=params, headers=headers, timeout=timeout)
+        except Exception as e:
+            raise HTTPException(500, str(e))
+    if not r.is_success:
+        # Errors are passed through and never cached
+        raise HTTPException(r.status_code, r.text or "HERE API error")
+    return r.json()
+
+async def proxy(endpoint: str, params: dict):
+    """Answer a HERE proxy request from the cache or one shared upstream call."""
+    required = ENDPOINTS[endpoint][1]
+    if not params.get(required):
+        raise HTTPException(400, f"Missing {required}")
+    return await cache.get_or_fetch(cache_key(endpoint, params), lambda: _fetch(endpoint, params))
+
+def stats() -> dict:
+    latency = metrics.latency_summary()
+    return {
+        "cache": cache.stats(),
+        "upstream": {name: latency[f"http.here.{name}"] for name in ENDPOINTS if f"http.here.{name}" in latency},
+    }
@@ -1,8 +1,11 @@
 from datetime import datetime, timezone
 
 def fetch_mock_results():
+    return list(iter_mock_results())
+
+def iter_mock_results():
     now = datetime.now(timezone.utc).isoformat()
-    return [
+    yield from [
         {
             "title": "Apple iPhone 13 128GB — Great condition",
             "price_cents": 25000,
@@ -0,0 +1,80 @@
+import abc, asyncio, json, os, tempfile
+from scrape_mock import iter_mock_results
+
+class Source(abc.ABC):
+    """Where listings come from: `__iter__` yields listing dicts."""
+    name = "source"
+
+    @abc.abstractmethod
+    def __iter__(self):
+        ...
+
+class AsyncSource(abc.ABC):
+    """A source whose `__aiter__` yields listing dicts (e.g. an async HTTP scraper)."""
+    name = "source"
+
+    @abc.abstractmethod
+    def __aiter__(self):
+        ...
+
+class MockSource(Source):
+    """Reference source: the fixed mock listings."""
+    name = "mock"
+
+    def __iter__(self):
+        return iter_mock_results()
+
+SOURCES = {"mock": MockSource}
+
+def get_source(name: str | None = None) -> Source:
+    name = name or os.getenv("LISTING_SOURCE", "mock")
+    if name not in SOURCES:
+        raise ValueError(f"unknown listing source: {name}")
+    return SOURCES[name]()
+
+class Spool:
+    """Reads `source` once; later passes replay its listings from a temp file."""
+
+    def __init__(self, source):
+        self._live = iter_listings(source)
+        self._file = tempfile.TemporaryFile()
+
+    def __iter__(self):
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+        # A pass that stopped early left the rest unread: continue from the source
+        for it in self._live:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(json.dumps(it, default=str).encode() + b"\n")
+            yield it
+
+    def close(self):
+        self._live.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def iter_listings(source):
+    """Iterate a sync or async source from plain (threaded) code."""
+    if not hasattr(source, "__aiter__"):
+        yield from source
+        return
+    loop = asyncio.new_event_loop()
+    agen = source.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            loop.run_until_complete(aclose())
+        loop.close()
@@ -0,0 +1,100 @@
+"""Streamed, compact JSON (array or NDJSON) for the list endpoints."""
+import json, os, zlib
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Rows encoded (and flushed through the compressor) per chunk
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "100"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+NDJSON = "application/x-ndjson"
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+def parse_fields(fields: str | None, allowed) -> list | None:
+    """Column list from `fields=a,b,c`; None means all. ValueError on unknown names."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in allowed]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+def wants_ndjson(request, fmt: str | None) -> bool:
+    if fmt:
+        return fmt == "ndjson"
+    return NDJSON in request.headers.get("accept", "")
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """br or gzip if the client accepts it (q > 0), br first when available."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for enc in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(enc, accepted.get("*", 0)) > 0:
+            return enc
+    return None
+
+def _chunks(rows, ndjson: bool):
+    buf, first = [], True
+    for row in rows:
+        buf.append(dumps(row))
+        if len(buf) >= STREAM_CHUNK_ROWS:
+            yield _join(buf, ndjson, first)
+            buf, first = [], False
+    if not ndjson:
+        yield (b"[" if first else b"") + (b"," if buf and not first else b"") + b",".join(buf) + b"]"
+    elif buf:
+        yield b"\n".join(buf) + b"\n"
+
+def _join(buf, ndjson, first):
+    if ndjson:
+        return b"\n".join(buf) + b"\n"
+    return (b"[" if first else b",") + b",".join(buf)
+
+def _compress(chunks, encoding):
+    # Flushed per chunk so compression never holds back the first bytes
+    if encoding == "br":
+        comp = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = comp.process(chunk) + comp.flush()
+            if out:
+                yield out
+        yield comp.finish()
+    else:
+        comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            out = comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield comp.flush()
+
+def rows_response(request, rows, ndjson: bool = False, headers: dict | None = None) -> StreamingResponse:
+    """Stream the dicts from iterator `rows` as the response body."""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept, Accept-Encoding"
+    body = _chunks(rows, ndjson)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = _compress(body, encoding)
+    return StreamingResponse(body, media_type=NDJSON if ndjson else "application/json", headers=headers)
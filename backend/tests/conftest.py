@@ -0,0 +1,29 @@
+import os, sys
+from pathlib import Path
+
+# Set before any backend import: modules read these at import time, and
+# run_once's load_dotenv() never overrides variables that are already set
+os.environ.update({
+    "TELEGRAM_BOT_TOKEN": "",
+    "TELEGRAM_CHAT_ID": "",
+    "OPENAI_API_KEY": "",
+    "OPENAI_MODEL": "test-model",
+    "HERE_API_KEY": "",
+    "USE_FIXTURE": "1",
+    "PUBLIC_BASE_URL": "http://testserver",
+    "LOCAL_ANALYSIS": "0",
+    "WORKER_INTERVAL_SECONDS": "0",
+    "TIER_AUDIT_RATE": "0",
+})
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+import db
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """An empty, migrated database for the test."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "test.db")
+    db.init_db()
+    yield db
+    db.close_conn()
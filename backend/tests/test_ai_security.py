@@ -0,0 +1,148 @@
+import json
+import pytest
+import ai_security
+import ratelimit
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+@pytest.fixture
+def retries(monkeypatch):
+    """Records backoff sleeps instead of sleeping; no rate limit."""
+    monkeypatch.setattr(ai_security, "AI_RETRIES", 3)
+    monkeypatch.setattr(ai_security, "AI_BACKOFF", 0.5)
+    monkeypatch.setattr(ai_security.random, "random", lambda: 0.5)
+    monkeypatch.setattr(ai_security.ratelimit, "for_host", lambda *a: ratelimit.RateLimiter(0))
+    sleeps = []
+    monkeypatch.setattr(ai_security.time, "sleep", sleeps.append)
+    return sleeps
+
+def _failing(*errors, result="ok"):
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    call.calls = calls
+    return call
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_errors_are_retried_with_backoff(retries, status):
+    call = _failing(ApiError(status), ApiError(status))
+    assert ai_security._with_retries(call) == "ok"
+    assert len(call.calls) == 3
+    assert retries == [0.5, 1.0]
+
+def test_gives_up_after_the_last_retry(retries):
+    call = _failing(*[ApiError(429)] * 4)
+    with pytest.raises(ApiError):
+        ai_security._with_retries(call)
+    assert len(call.calls) == 4
+    assert retries == [0.5, 1.0, 2.0]
+
+@pytest.mark.parametrize("error", [ApiError(400), ApiError(401), ApiError(404), ValueError("bad json")])
+def test_other_errors_are_raised_at_once(retries, error):
+    call = _failing(error)
+    with pytest.raises(type(error)):
+        ai_security._with_retries(call)
+    assert len(call.calls) == 1
+    assert retries == []
+
+PROFILE = {"name": "bikes", "keywords": "bike"}
+VERDICT = {"security_score": 90, "relevant": True, "reasons": ["ok"], "final_decision": "accept"}
+
+@pytest.fixture
+def llm(fresh_db, monkeypatch):
+    """Counts single-listing OpenAI calls; each answers VERDICT."""
+    monkeypatch.setattr(ai_security, "OPENAI_API_KEY", "test")
+    calls = []
+
+    def call(profile, item, prompt=None):
+        calls.append(item["url"])
+        return dict(VERDICT)
+    monkeypatch.setattr(ai_security, "_call_openai", call)
+    return calls
+
+def _item(n):
+    return {"title": f"bike {n}", "price_cents": 1000, "url": f"u{n}"}
+
+def test_cache_hit_skips_the_client(llm):
+    assert ai_security.evaluate_listing(PROFILE, _item(1)) == VERDICT
+    assert ai_security.evaluate_listing(PROFILE, _item(1)) == VERDICT
+    assert llm == ["u1"]
+    # A different prompt is a different key
+    ai_security.evaluate_listing(PROFILE, dict(_item(1), title="bike 1 (edited)"))
+    assert llm == ["u1", "u1"]
+
+def test_expired_entry_is_evaluated_again(llm, fresh_db, monkeypatch):
+    monkeypatch.setattr(ai_security, "AI_CACHE_TTL", 60)
+    ai_security.evaluate_listing(PROFILE, _item(1))
+    with fresh_db.transaction() as c:
+        c.execute("UPDATE ai_cache SET created_at = created_at - 61")
+    ai_security.evaluate_listing(PROFILE, _item(1))
+    assert llm == ["u1", "u1"]
+
+def test_cache_is_evicted_down_to_max_rows(llm, fresh_db, monkeypatch):
+    monkeypatch.setattr(ai_security, "AI_CACHE_MAX_ROWS", 3)
+    monkeypatch.setattr(ai_security, "AI_CACHE_EVICT_EVERY", 1)
+    for n in range(5):
+        ai_security.evaluate_listing(PROFILE, _item(n))
+        with fresh_db.transaction() as c:
+            # Distinct ages, oldest first
+            c.execute("UPDATE ai_cache SET created_at = created_at - 1")
+    assert fresh_db.cache_size() == 3
+    # The newest entries are the ones kept
+    for n in (2, 3, 4):
+        ai_security.evaluate_listing(PROFILE, _item(n))
+    assert llm == ["u0", "u1", "u2", "u3", "u4"]
+
+@pytest.fixture
+def chat(fresh_db, monkeypatch):
+    """Batch requests answer with `chat.reply` (JSON text or an exception)."""
+    monkeypatch.setattr(ai_security, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ai_security.ratelimit, "for_host", lambda *a: ratelimit.RateLimiter(0))
+
+    def fake(prompt, max_tokens):
+        fake.prompts.append(prompt)
+        if isinstance(fake.reply, Exception):
+            raise fake.reply
+        return fake.reply
+    fake.prompts = []
+    monkeypatch.setattr(ai_security, "_chat", fake)
+    return fake
+
+def _scored(index, score, **extra):
+    return dict(VERDICT, index=index, security_score=score, **extra)
+
+def test_bad_elements_fall_back_one_by_one(chat):
+    chat.reply = json.dumps([
+        _scored(0, 91),
+        {"index": 1, "final_decision": "accept", "reasons": []},  # no score
+        _scored(2, 93, final_decision="maybe"),
+        "not an object",
+    ])  # #3 missing
+    out = ai_security.evaluate_batch(PROFILE, [_item(n) for n in range(4)], 4)
+    assert len(chat.prompts) == 1
+    assert out[0]["security_score"] == 91 and "fallback" not in out[0] and "index" not in out[0]
+    assert [v.get("fallback") for v in out[1:]] == ["invalid"] * 3
+
+def test_whole_call_failure_falls_back_with_error(chat):
+    for reply in (ValueError("boom"), "not json"):
+        chat.reply = reply
+        out = ai_security.evaluate_batch(PROFILE, [_item(n) for n in range(3)], 3)
+        assert [v.get("fallback") for v in out] == ["error"] * 3
+
+def test_index_maps_back_to_its_item(chat):
+    chat.reply = json.dumps({"results": [
+        _scored(2, 72), _scored(7, 10), _scored(-1, 11), _scored(0, 80), _scored(0, 12), _scored(1, 75),
+    ]})
+    out = ai_security.evaluate_batch(PROFILE, [_item(n) for n in range(3)], 3)
+    # Out-of-range indices are ignored and the first answer for an index wins
+    assert [v["security_score"] for v in out] == [80, 75, 72]
+    assert "#0" in chat.prompts[0] and "#2" in chat.prompts[0]
+    # Verdicts are cached under each listing's own prompt
+    assert ai_security.evaluate_listing(PROFILE, _item(2))["security_score"] == 72
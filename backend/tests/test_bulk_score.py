@@ -0,0 +1,36 @@
+from bulk_score import score_matrix
+from filter_simple import score_item
+from matcher import ProfileMatcher
+
+PROFILES = [
+    {"name": "range", "keywords": "bike, road", "price_min_cents": 1000, "price_max_cents": 5000, "min_score": 0.5},
+    {"name": "min only", "keywords": "bike", "price_min_cents": 1000},
+    {"name": "max only", "keywords": "Road, Bike, helmet", "price_max_cents": 5000, "min_score": 0.3},
+    {"name": "no keywords", "keywords": "", "price_min_cents": 1000, "min_score": 0.0},
+    {"name": "unset", "keywords": None},
+    {"name": "zero bounds", "keywords": "bike", "price_min_cents": 0, "price_max_cents": 0},
+]
+
+ITEMS = [
+    {"title": f"{title} #{n}", "price_cents": price}
+    for n, (title, price) in enumerate(
+        (title, price)
+        for title in ("road bike", "Bike helmet", "tent", "")
+        # Each bound, one cent either side of it, and no price at all
+        for price in (0, 999, 1000, 1001, 4999, 5000, 5001, None)
+    )
+]
+
+def test_matches_score_item_for_every_pair():
+    m = score_matrix(ITEMS, ProfileMatcher(PROFILES))
+    assert m.scores.shape == (len(ITEMS), len(PROFILES))
+    for i, item in enumerate(ITEMS):
+        for j, profile in enumerate(PROFILES):
+            score, reason = score_item(item, profile)
+            assert m.scores[i, j] == score, (item, profile["name"])
+            assert m.reason(i, j) == reason
+            assert m.passed[i, j] == (score >= (profile.get("min_score") or 0.0))
+
+def test_empty_batch():
+    m = score_matrix([], ProfileMatcher(PROFILES))
+    assert m.scores.shape == (0, len(PROFILES))
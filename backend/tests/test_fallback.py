@@ -0,0 +1,44 @@
+import ai_security
+import eval_pool
+import tiers
+from job_runner import run_once
+
+SOURCE = [{"title": "road bike", "price_cents": 10000, "url": "https://example.com/1"}]
+ACCEPT = {"security_score": 90, "relevant": True, "reasons": ["looks fine"], "final_decision": "accept"}
+
+def _row(db):
+    return dict(db.get_conn().execute("SELECT ai_model, status, profile_fp FROM listings").fetchone())
+
+def _with_ai(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(ai_security, "OPENAI_API_KEY", "test")
+
+def test_failed_ai_call_is_retried_next_run(fresh_db, monkeypatch):
+    _with_ai(monkeypatch)
+    monkeypatch.setattr(tiers, "TIERED_EVAL", False)
+    fresh_db.create_profile({"name": "bikes", "keywords": "bike", "min_score": 0})
+
+    monkeypatch.setattr(eval_pool, "evaluate_batch",
+                        lambda p, items, size: [ai_security._fallback(p, it, "error") for it in items])
+    first = run_once(source=SOURCE)
+    assert first["fallbacks"] == 1
+    assert first["queued"] == 0
+    row = _row(fresh_db)
+    assert row["ai_model"] == "fallback"
+    assert row["status"] == "unverified"
+    assert row["profile_fp"] is None
+
+    monkeypatch.setattr(eval_pool, "evaluate_batch", lambda p, items, size: [dict(ACCEPT) for _ in items])
+    second = run_once(source=SOURCE)
+    assert second["skipped"] == 0 and second["processed"] == 1
+    row = _row(fresh_db)
+    assert row["ai_model"] == "test-model"
+    assert row["status"] == "accepted"
+    assert row["profile_fp"] is not None
+
+    assert run_once(source=SOURCE)["skipped"] == 1
+
+def test_fallback_verdict_is_not_copied_to_near_duplicates(fresh_db):
+    fresh_db.upsert_listings([{"url": "u1", "title": "t", "status": "accepted", "security_score": 90,
+                               "ai_model": "fallback"}], "bikes")
+    assert fresh_db.listing_verdicts("bikes", ["u1"]) == {}
@@ -0,0 +1,42 @@
+import asyncio
+import events
+
+def _rev(db, url="u1"):
+    return db.get_conn().execute("SELECT rev FROM listings WHERE url = ?", (url,)).fetchone()[0]
+
+ROW = {"url": "u1", "title": "bike", "price_cents": 100, "created_at": "2024-01-01T00:00:00", "score": 0.5,
+       "status": "accepted"}
+
+def test_rev_moves_with_any_visible_change(fresh_db):
+    row = dict(ROW)
+    fresh_db.upsert_listings([row], "bikes")
+    rev = _rev(fresh_db)
+    fresh_db.upsert_listings([dict(row)], "bikes")
+    assert _rev(fresh_db) == rev
+    for change in ({"created_at": "2024-02-01T00:00:00"}, {"lat": 51.5}, {"lng": -0.1}, {"status": "rejected"}):
+        row.update(change)
+        fresh_db.upsert_listings([dict(row)], "bikes")
+        assert _rev(fresh_db) > rev, change
+        rev = _rev(fresh_db)
+
+class Request:
+    """Disconnects once the stream has caught up and starts waiting for live rows."""
+
+    async def is_disconnected(self):
+        return True
+
+def _frames(last_id, **filters):
+    async def run():
+        return [frame async for frame in events.feed.stream(Request(), last_id, **filters)]
+    return asyncio.run(run())
+
+def test_reconnect_replays_the_whole_backlog(fresh_db, monkeypatch):
+    monkeypatch.setattr(events, "FEED_BACKLOG_LIMIT", 3)
+    fresh_db.upsert_listings([dict(ROW, url=f"u{n}", score=n / 10) for n in range(10)], "bikes")
+    frames = _frames(2)
+    ids = [int(f.split("\n")[0][4:]) for f in frames if f.startswith("id: ")]
+    assert ids == list(range(3, 11))
+    assert frames[-1] == "retry: 3000\n\n"
+    # Filters apply to every page
+    high = _frames(0, min_score=0.45)
+    assert len([f for f in high if f.startswith("id: ")]) == 5
@@ -0,0 +1,66 @@
+import math, random
+import pytest
+import geo
+
+PROFILES = [
+    {"lat": 51.5, "lng": -0.12, "radius": 30},
+    {"lat": 0.0, "lng": 0.0, "radius": 200},
+    # Either side of the antimeridian
+    {"lat": -17.7, "lng": 179.9, "radius": 120},
+    {"lat": 65.0, "lng": -179.6, "radius": 80},
+    # Near and over the poles
+    {"lat": 89.0, "lng": 30.0, "radius": 50},
+    {"lat": 88.0, "lng": -100.0, "radius": 300},
+    {"lat": -89.9, "lng": 0.0, "radius": 20},
+    # Spans too many cells: checked for every point
+    {"lat": 40.0, "lng": -100.0, "radius": 3000},
+    # No area: match everywhere
+    {"lat": None, "lng": None, "radius": 50},
+    {"lat": 48.8, "lng": 2.3, "radius": None},
+    {"lat": 48.8, "lng": 2.3, "radius": 0},
+]
+
+def _destination(lat, lng, km, bearing):
+    """The point `km` from (lat, lng) along `bearing` degrees."""
+    d, b = km / geo.EARTH_RADIUS_KM, math.radians(bearing)
+    p1, l1 = math.radians(lat), math.radians(lng)
+    p2 = math.asin(math.sin(p1) * math.cos(d) + math.cos(p1) * math.sin(d) * math.cos(b))
+    l2 = l1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(p1), math.cos(d) - math.sin(p1) * math.sin(p2))
+    return math.degrees(p2), (math.degrees(l2) + 540) % 360 - 180
+
+def _brute(lat, lng):
+    out = set()
+    for j, p in enumerate(PROFILES):
+        if p["lat"] is None or not p["radius"]:
+            out.add(j)
+        elif geo.distance_km(p["lat"], p["lng"], lat, lng) <= p["radius"]:
+            out.add(j)
+    return out
+
+def _points():
+    rng = random.Random(7)
+    for p in PROFILES:
+        if p["lat"] is None or not p["radius"]:
+            continue
+        # Just inside and just outside the circle, all the way round
+        for bearing in range(0, 360, 5):
+            for f in (0.5, 0.995, 1.005):
+                yield _destination(p["lat"], p["lng"], p["radius"] * f, bearing)
+    for _ in range(2000):
+        yield math.degrees(math.asin(rng.uniform(-1, 1))), rng.uniform(-180, 180)
+    yield from [(90.0, 0.0), (90.0, 123.0), (-90.0, -45.0), (-17.7, -180.0), (-17.7, 180.0), (65.0, 180.0)]
+
+@pytest.mark.parametrize("cell_deg", [0.5, 0.1, 2.0])
+def test_grid_matches_brute_force(cell_deg):
+    grid = geo.ProfileGrid(PROFILES, cell_deg)
+    for lat, lng in _points():
+        assert grid.covering(lat, lng) == _brute(lat, lng), (lat, lng)
+
+def test_unknown_position_matches_every_profile():
+    assert geo.ProfileGrid(PROFILES).covering(None, 10.0) is None
+
+def test_distance():
+    grid = geo.ProfileGrid(PROFILES)
+    assert grid.distance(0, 51.5, -0.12) == 0
+    assert grid.distance(8, 51.5, -0.12) is None
+    assert geo.distance_km(0, 179.5, 0, -179.5) == pytest.approx(111.2, abs=0.1)
@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+import app as app_module
+import http_cache
+
+@pytest.fixture
+def client(fresh_db, monkeypatch):
+    monkeypatch.setattr(http_cache, "VERSION_CHECK_SECONDS", 0)
+    monkeypatch.setattr(app_module, "versions", http_cache.Versions())
+    return TestClient(app_module.app)
+
+def _other_process(db, sql, *args):
+    # A separate connection, as worker.py or a second app worker would use
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute(sql, args)
+    conn.commit()
+    conn.close()
+
+def test_profiles_etag_moves_on_writes_from_other_processes(client, fresh_db):
+    pid = fresh_db.create_profile({"name": "bikes", "keywords": "bike", "location": "London"})
+    first = client.get("/api/profiles")
+    etag = first.headers["etag"]
+    assert client.get("/api/profiles", headers={"If-None-Match": etag}).status_code == 304
+
+    # The worker stores geocoded coordinates
+    _other_process(fresh_db, "UPDATE profiles SET lat = 51.5, lng = -0.1 WHERE id = ?", pid)
+    second = client.get("/api/profiles", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json()[0]["lat"] == 51.5
+    assert second.headers["etag"] != etag
+
+    etag = second.headers["etag"]
+    _other_process(fresh_db, "DELETE FROM profiles WHERE id = ?", pid)
+    third = client.get("/api/profiles", headers={"If-None-Match": etag})
+    assert third.status_code == 200 and third.json() == []
+
+def test_listings_etag_carries_the_profiles_rev(client, fresh_db):
+    etag = client.get("/api/listings").headers["etag"]
+    _other_process(fresh_db, "INSERT INTO profiles (name) VALUES ('cars')")
+    assert client.get("/api/listings", headers={"If-None-Match": etag}).status_code == 200
+
+def test_rev_survives_a_restart(fresh_db):
+    fresh_db.create_profile({"name": "bikes"})
+    before = http_cache.Versions().profiles()
+    assert http_cache.Versions().profiles() == before
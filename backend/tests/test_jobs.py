@@ -0,0 +1,55 @@
+import threading
+import job_runner
+import jobs
+
+def _wait_for(job_id, status):
+    for _ in range(200):
+        snap = jobs.get_job(job_id)
+        if snap["status"] == status:
+            return snap
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job never reached {status}")
+
+def test_sent_counts_only_this_cycles_messages(fresh_db, monkeypatch):
+    # Left over from an earlier cycle and delivered while this one runs
+    [old] = fresh_db.outbox_add([{"chat_id": "a", "dedupe_key": "old", "text": "old"}])
+    started, release = threading.Event(), threading.Event()
+
+    def run_once(progress, outbox_ids):
+        outbox_ids += fresh_db.outbox_add([{"chat_id": "a", "dedupe_key": str(n), "text": "new"} for n in range(3)])
+        progress["queued"] = 3
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+    monkeypatch.setattr(job_runner, "run_once", run_once)
+
+    job, created = jobs.submit_cycle(trigger="test")
+    assert created
+    snap = _wait_for(job["id"], "running")
+    assert snap["started_at"] is not None and snap["progress"]["sent"] == 0
+    assert "_outbox_ids" not in snap
+
+    assert started.wait(5)
+    ids = job["_outbox_ids"]
+    fresh_db.outbox_finish([old, ids[0]], "sent")
+    assert jobs.get_job(job["id"])["progress"]["sent"] == 1
+    release.set()
+    # Messages still going out after the cycle ends are counted too
+    _wait_for(job["id"], "done")
+    fresh_db.outbox_finish([ids[1]], "sent")
+    fresh_db.outbox_finish([ids[2]], "failed", "HTTP 400")
+    assert jobs.get_job(job["id"])["progress"]["sent"] == 2
+    assert jobs.list_jobs()[0]["id"] == job["id"]
+
+def test_status_is_published_after_the_fields_it_implies(monkeypatch):
+    seen = []
+
+    class Job(dict):
+        def __setitem__(self, key, value):
+            if key == "status" and value == "running":
+                seen.append(self.get("started_at"))
+            super().__setitem__(key, value)
+    monkeypatch.setattr(job_runner, "run_once", lambda progress, outbox_ids: {"ok": True})
+    job = Job(id="x", status="queued", profile=None, progress={}, _outbox_ids=[])
+    jobs._run(job)
+    assert seen and seen[0] is not None
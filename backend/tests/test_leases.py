@@ -0,0 +1,68 @@
+import pytest
+import db
+import job_runner
+import leases
+from sources import Source, Spool
+
+UNIT = "profile:1"
+
+def _expire(unit):
+    # As if the holder stopped heartbeating
+    with db.transaction() as c:
+        c.execute("UPDATE leases SET expires_at = 0 WHERE unit = ?", (unit,))
+
+def test_held_lease_is_not_claimed_twice(fresh_db):
+    assert UNIT in db.lease_claim([UNIT], "a", 60, 10, 0)
+    assert db.lease_claim([UNIT], "b", 60, 10, 0) == {}
+
+def test_expired_lease_fences_old_holder(fresh_db):
+    token_a = db.lease_claim([UNIT], "a", 60, 10, 0)[UNIT]
+    db.upsert_listings([{"url": "u1", "title": "bike"}], "bikes", lease=(UNIT, "a", token_a))
+    _expire(UNIT)
+    token_b = db.lease_claim([UNIT], "b", 60, 10, 0)[UNIT]
+    assert token_b > token_a
+
+    with pytest.raises(db.LeaseLost):
+        db.upsert_listings([{"url": "u2", "title": "stale"}], "bikes", lease=(UNIT, "a", token_a))
+    db.upsert_listings([{"url": "u3", "title": "bike"}], "bikes", lease=(UNIT, "b", token_b))
+    assert sorted(r["url"] for r in db.list_listings()) == ["u1", "u3"]
+
+    assert not db.lease_release(UNIT, "a", token_a)
+    assert db.lease_release(UNIT, "b", token_b)
+
+def test_finished_unit_is_not_reclaimed_in_the_same_round(fresh_db):
+    token = db.lease_claim([UNIT], "a", 60, 10, 0)[UNIT]
+    db.lease_release(UNIT, "a", token, finished=True)
+    assert db.lease_claim([UNIT], "b", 60, 10, not_finished_since=0) == {}
+
+class CountingSource(Source):
+    def __init__(self, n):
+        self.n = n
+        self.passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        for i in range(self.n):
+            yield {"title": f"bike {i}", "price_cents": 1000 + i, "url": f"https://example.com/{i}"}
+
+def test_sharded_run_crawls_once(fresh_db, monkeypatch):
+    monkeypatch.setattr(job_runner, "WORKER_SHARDING", True)
+    monkeypatch.setattr(leases, "SHARD_CLAIM_SIZE", 1)
+    for name in ("a", "b", "c"):
+        fresh_db.create_profile({"name": name, "keywords": "bike", "min_score": 0})
+    source = CountingSource(5)
+    result = job_runner.run_once(source=source)
+    assert source.passes == 1
+    assert result["processed"] == 15
+    assert {r["profile"] for r in fresh_db.list_listings(limit=100)} == {"a", "b", "c"}
+
+def test_spool_replays_and_resumes():
+    source = CountingSource(4)
+    with Spool(source) as spool:
+        first = iter(spool)
+        assert [next(first)["url"] for _ in range(2)] == ["https://example.com/0", "https://example.com/1"]
+        first.close()
+        # The second pass replays what was read, then continues the same crawl
+        assert [it["url"] for it in spool] == [f"https://example.com/{i}" for i in range(4)]
+        assert [it["price_cents"] for it in spool] == [1000, 1001, 1002, 1003]
+    assert source.passes == 1
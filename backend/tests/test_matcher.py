@@ -0,0 +1,41 @@
+import pytest
+from filter_simple import score_item
+from matcher import ProfileMatcher
+
+PROFILES = [
+    {"name": "case", "keywords": "Road Bike, BIKE, Shimano", "price_max_cents": 50000},
+    # Keywords that are substrings of each other and share suffixes
+    {"name": "overlap", "keywords": "bike, ebike, bi, ike, e", "price_min_cents": 1000},
+    {"name": "punct", "keywords": "e-bike, 26\", brompton's, m&s, (new)"},
+    {"name": "dupes", "keywords": "bike, bike,  , lock"},
+    {"name": "empty", "keywords": ""},
+    {"name": "none", "keywords": None, "price_min_cents": 0, "price_max_cents": 0},
+]
+
+TITLES = [
+    "Road bike - Shimano 105",
+    "EBIKE for sale",
+    "Brompton's e-Bike 26\" wheels (NEW)",
+    "M&S gift card",
+    "bicycle lock and bike light",
+    "",
+    None,
+    "ééé bíke",
+]
+
+@pytest.mark.parametrize("price", [0, 999, 1000, 50000, 50001, None])
+def test_matches_score_item(price):
+    matcher = ProfileMatcher(PROFILES)
+    for title in TITLES:
+        item = {"title": title, "price_cents": price}
+        expected = [score_item(item, p) for p in PROFILES]
+        assert matcher.score_all(item) == expected, title
+        assert [matcher.score(item, j) for j in range(len(PROFILES))] == expected, title
+
+def test_overlapping_keywords_all_hit():
+    matcher = ProfileMatcher(PROFILES)
+    hits = matcher.hits("my EBIKE")
+    # bike, ebike, bi, ike, e all occur in "ebike"
+    assert hits[1] == 5
+    # Repeated keywords count each time they are listed, as in score_item
+    assert hits[3] == 2
@@ -0,0 +1,61 @@
+import sqlite3
+import db
+
+# Schema written by init_db before it was versioned (user_version 0)
+LEGACY_SCHEMA = """
+CREATE TABLE profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    keywords TEXT DEFAULT '',
+    price_min_cents INTEGER,
+    price_max_cents INTEGER,
+    min_score REAL DEFAULT 0.6,
+    chat_id TEXT,
+    location TEXT,
+    radius INTEGER
+);
+CREATE TABLE listings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile TEXT,
+    title TEXT,
+    price_cents INTEGER,
+    url TEXT,
+    created_at TEXT,
+    score REAL DEFAULT 0.0,
+    reason TEXT,
+    status TEXT,
+    security_score INTEGER,
+    ai_model TEXT,
+    ai_reasons TEXT,
+    UNIQUE(url, profile)
+);
+INSERT INTO profiles (name, keywords) VALUES ('bikes', 'bike');
+INSERT INTO listings (profile, title, url, created_at, score, status) VALUES ('bikes', 'vintage bike', 'u1', '2024-01-01', 0.9, 'accepted');
+INSERT INTO listings (profile, title, url, created_at, score, status, ai_model) VALUES ('bikes', 'road bike', 'u2', '2024-01-01', 0.9, 'accepted', 'fallback');
+"""
+
+def test_migrates_legacy_database(tmp_path, monkeypatch):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+
+    db.init_db()
+    assert db.schema_version() == db.SCHEMA_VERSION
+    assert {"item_fp", "profile_fp", "rev", "lat", "lng"} <= set(db.table_columns("listings"))
+    assert "finished_at" in db.table_columns("outbox")
+    # Existing rows survive and are indexed for search
+    assert [r["title"] for r in db.search_listings("vintage")] == ["vintage bike"]
+    assert db.list_profiles()[0]["name"] == "bikes"
+    # Heuristic stand-ins for failed AI calls are no longer passes
+    assert {r["url"]: r["status"] for r in db.list_listings()} == {"u1": "accepted", "u2": "unverified"}
+
+    # Already current: running again changes nothing
+    db._ready.clear()
+    db.init_db()
+    assert db.schema_version() == db.SCHEMA_VERSION
+    db.close_conn()
+
+def test_new_database_is_current(fresh_db):
+    assert fresh_db.schema_version() == fresh_db.SCHEMA_VERSION
@@ -0,0 +1,58 @@
+import math
+import near_dup
+from fingerprint import item_fingerprint, profile_fingerprint
+
+LISTING = {
+    "title": "Apple iPhone 13 128GB Midnight unlocked",
+    "description": "Used for a year, always in a case. Battery health 89 percent, comes with the original box and cable.",
+    "url": "https://example.com/a",
+}
+
+def _index(db, *items):
+    for it in items:
+        it["lsh"] = near_dup.index_entry(it)
+    db.upsert_listings(items, "phones")
+
+def _bucket_edge():
+    # Smallest price in the next ~10% bucket up from 25000
+    k = round(math.log(25000) / math.log(1.1))
+    return math.ceil(1.1 ** (k + 0.5))
+
+def test_relisting_across_a_price_bucket_is_found(fresh_db):
+    edge = _bucket_edge()
+    old = dict(LISTING, price_cents=edge)
+    _index(fresh_db, old)
+    relisted = dict(LISTING, url="https://example.com/b", price_cents=edge - 1)
+    assert {s for s in near_dup.shingles(old) if s.startswith("p:")} != \
+        {s for s in near_dup.shingles(relisted) if s.startswith("p:")}
+    relisted["lsh"] = near_dup.index_entry(relisted)
+    [(url, sim)] = near_dup.find([relisted]).values()
+    assert url == old["url"] and sim >= near_dup.NEAR_DUP_THRESHOLD
+
+def test_distinct_items_do_not_match(fresh_db):
+    _index(fresh_db, dict(LISTING, price_cents=25000))
+    others = [
+        {"title": "Samsung Galaxy S21 256GB Phantom Grey", "description": "Screen protector fitted since day one, no scratches.",
+         "price_cents": 25000},
+        {"title": "Apple iPhone 13 128GB Midnight unlocked", "price_cents": 25000,
+         "description": "Cracked back glass, face id not working, sold for parts only, no charger included at all."},
+        {"title": "Apple iPhone 13 case Midnight", "description": "", "price_cents": 1500},
+    ]
+    for n, it in enumerate(others):
+        it.update(url=f"https://example.com/o{n}", lsh=near_dup.index_entry(it))
+    assert near_dup.find(others) == {}
+
+def test_a_listing_is_not_its_own_duplicate(fresh_db):
+    it = dict(LISTING, price_cents=25000)
+    _index(fresh_db, it)
+    assert near_dup.find([it]) == {}
+
+def test_item_fingerprint_ignores_when_and_where_it_was_seen():
+    base = dict(LISTING, price_cents=25000)
+    assert item_fingerprint(base) == item_fingerprint(dict(base, url="https://example.com/z", created_at="2024-01-01"))
+    assert item_fingerprint(base) != item_fingerprint(dict(base, price_cents=24000))
+
+def test_profile_fingerprint_follows_its_definition():
+    profile = {"name": "phones", "keywords": "iphone", "price_max_cents": 30000, "id": 1, "lat": 51.5}
+    assert profile_fingerprint(profile) == profile_fingerprint(dict(profile, id=2, lat=40.0))
+    assert profile_fingerprint(profile) != profile_fingerprint(dict(profile, keywords="iphone, 13"))
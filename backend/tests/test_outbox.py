@@ -0,0 +1,99 @@
+import asyncio, time
+import httpx
+import pytest
+import notify_queue
+
+@pytest.fixture
+def telegram(fresh_db, monkeypatch):
+    """A dispatcher whose sendMessage calls are answered by `telegram.replies` (default 200 ok)."""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setattr(notify_queue, "TELEGRAM_CHAT_RATE", 0)
+    monkeypatch.setattr(notify_queue, "TELEGRAM_GLOBAL_RATE", 0)
+    monkeypatch.setattr(notify_queue.random, "random", lambda: 0.5)
+
+    class Client:
+        posts = []
+        replies = []
+
+        async def post(self, url, json):
+            self.posts.append(json)
+            return self.replies.pop(0) if self.replies else httpx.Response(200, json={"ok": True})
+
+    client = Client()
+    dispatcher = notify_queue.Dispatcher()
+    client.drain = lambda: asyncio.run(dispatcher._drain_once(client))
+    client.dispatcher = dispatcher
+    return client
+
+def _queue(db, *chats):
+    db.outbox_add([{"chat_id": chat, "dedupe_key": f"{n}:fp", "listing_id": n, "text": f"match {n}"}
+                   for n, chat in enumerate(chats)])
+
+def _rows(db):
+    return {r["id"]: dict(r) for r in db.get_conn().execute("SELECT * FROM outbox")}
+
+def test_messages_are_coalesced_per_chat(fresh_db, telegram):
+    _queue(fresh_db, "a", "b", "a", "a")
+    assert telegram.drain() == 4
+    texts = {p["chat_id"]: p["text"] for p in telegram.posts}
+    assert len(telegram.posts) == 2
+    assert texts["a"].startswith("🔔 3 new matches") and "match 3" in texts["a"]
+    assert texts["b"] == "match 1"
+    assert {r["status"] for r in _rows(fresh_db).values()} == {"sent"}
+    assert telegram.dispatcher.sent == 4
+
+def test_long_digests_are_split_under_the_message_limit(fresh_db, telegram):
+    fresh_db.outbox_add([{"chat_id": "a", "dedupe_key": str(n), "text": "x" * 1500} for n in range(5)])
+    telegram.drain()
+    assert len(telegram.posts) > 1
+    assert all(len(p["text"]) <= notify_queue.MESSAGE_LIMIT for p in telegram.posts)
+
+def test_429_is_retried_after_retry_after(fresh_db, telegram):
+    _queue(fresh_db, "a")
+    telegram.replies.append(httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 7}}))
+    before = time.time()
+    telegram.drain()
+    [row] = _rows(fresh_db).values()
+    assert row["status"] == "pending" and row["attempts"] == 1
+    assert row["next_attempt_at"] - before == pytest.approx(7, abs=1)
+    # Not due yet, so nothing is claimed
+    assert telegram.drain() == 0
+
+def test_5xx_backs_off_then_fails_after_max_attempts(fresh_db, telegram, monkeypatch):
+    monkeypatch.setattr(notify_queue, "TELEGRAM_MAX_ATTEMPTS", 2)
+    _queue(fresh_db, "a")
+    telegram.replies.append(httpx.Response(502))
+    telegram.drain()
+    [row] = _rows(fresh_db).values()
+    assert row["status"] == "pending"
+    assert row["next_attempt_at"] - time.time() == pytest.approx(notify_queue.TELEGRAM_BACKOFF * 2, abs=1)
+
+    with fresh_db.transaction() as c:
+        c.execute("UPDATE outbox SET next_attempt_at = 0")
+    telegram.replies.append(httpx.Response(503))
+    telegram.drain()
+    [row] = _rows(fresh_db).values()
+    assert row["status"] == "failed" and row["attempts"] == 2 and row["finished_at"]
+
+def test_other_4xx_fail_at_once(fresh_db, telegram):
+    _queue(fresh_db, "a")
+    telegram.replies.append(httpx.Response(400, json={"ok": False, "description": "chat not found"}))
+    telegram.drain()
+    [row] = _rows(fresh_db).values()
+    assert row["status"] == "failed" and row["attempts"] == 1
+    assert "chat not found" in row["last_error"]
+    assert telegram.drain() == 0
+
+def test_rows_stuck_in_sending_are_requeued(fresh_db, telegram):
+    _queue(fresh_db, "a", "b")
+    # A dispatcher claimed them and died before finishing
+    stale = fresh_db.outbox_claim(10, notify_queue.TELEGRAM_CLAIM_TIMEOUT)
+    assert telegram.drain() == 0
+    with fresh_db.transaction() as c:
+        c.execute("UPDATE outbox SET claimed_at = claimed_at - ?", (notify_queue.TELEGRAM_CLAIM_TIMEOUT + 1,))
+
+    assert telegram.drain() == 2
+    assert {r["status"] for r in _rows(fresh_db).values()} == {"sent"}
+    # The old claim's late outcome does not overwrite the new one
+    fresh_db.outbox_finish([r["id"] for r in stale], "failed", "late", stale[0]["claimed_at"])
+    assert {r["status"] for r in _rows(fresh_db).values()} == {"sent"}
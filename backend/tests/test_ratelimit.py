@@ -0,0 +1,36 @@
+import threading, time
+import ratelimit
+
+def test_concurrent_acquire_is_held_to_the_rate():
+    lim = ratelimit.RateLimiter(rate=50, burst=5)
+    stamps, lock = [], threading.Lock()
+
+    def worker():
+        for _ in range(5):
+            lim.acquire()
+            with lock:
+                stamps.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stamps.sort()
+    # The burst goes straight through; the other 35 calls wait for tokens at 50/s
+    assert stamps[4] - start < 0.05
+    assert stamps[-1] - start >= 35 / 50 * 0.9
+    # After the burst, any 10 consecutive calls span at least 10 / rate seconds
+    assert all(b - a >= 10 / 50 * 0.8 for a, b in zip(stamps[5:], stamps[15:]))
+    assert len(stamps) == 40
+
+def test_zero_rate_never_waits():
+    lim = ratelimit.RateLimiter(rate=0)
+    start = time.monotonic()
+    for _ in range(100):
+        lim.acquire()
+    assert time.monotonic() - start < 0.05
+
+def test_for_host_shares_one_limiter():
+    assert ratelimit.for_host("test.invalid", 1) is ratelimit.for_host("test.invalid", 99)
@@ -0,0 +1,24 @@
+import pytest
+from sources import AsyncSource, MockSource, Source, iter_listings
+
+def test_source_without_iter_fails_on_instantiation():
+    class Broken(Source):
+        name = "broken"
+
+    with pytest.raises(TypeError):
+        Broken()
+
+    class BrokenAsync(AsyncSource):
+        pass
+
+    with pytest.raises(TypeError):
+        BrokenAsync()
+
+def test_sync_and_async_sources_iterate_alike():
+    class Pages(AsyncSource):
+        async def __aiter__(self):
+            for n in range(3):
+                yield {"url": f"u{n}"}
+
+    assert [it["url"] for it in iter_listings(Pages())] == ["u0", "u1", "u2"]
+    assert [it["url"] for it in iter_listings(MockSource())] == [it["url"] for it in MockSource()]
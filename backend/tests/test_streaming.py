@@ -0,0 +1,62 @@
+import gzip, json, zlib
+import pytest
+from fastapi.testclient import TestClient
+import app as app_module
+import streaming
+
+@pytest.mark.parametrize("n", [0, 1, 3, 4, 5, 9])
+def test_chunk_framing(n, monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_ROWS", 2)
+    rows = [{"id": i, "title": f"é {i}"} for i in range(n)]
+    chunks = list(streaming._chunks(iter(rows), ndjson=False))
+    assert json.loads(b"".join(chunks)) == rows
+    # Rows are flushed in STREAM_CHUNK_ROWS groups, not held until the end
+    assert len(chunks) == n // 2 + 1
+    lines = b"".join(streaming._chunks(iter(rows), ndjson=True)).split(b"\n")
+    assert lines[-1] == b"" and [json.loads(l) for l in lines[:-1]] == rows
+
+def test_gzip_stream_decodes_chunk_by_chunk():
+    chunks = [b'[{"id":1}', b',{"id":2}', b"]"]
+    out = list(streaming._compress(iter(chunks), "gzip"))
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Each flushed piece is decodable on its own, so the client sees rows early
+    assert d.decompress(out[0]) == chunks[0]
+    assert gzip.decompress(b"".join(out)) == b"".join(chunks)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("", None),
+])
+def test_negotiation(header, expected, monkeypatch):
+    if expected == "br" and streaming.brotli is None:
+        expected = "gzip"
+    assert streaming.negotiate_encoding(header) == expected
+    monkeypatch.setattr(streaming, "brotli", None)
+    assert streaming.negotiate_encoding(header) == ("gzip" if expected == "br" else expected)
+
+@pytest.fixture
+def client(fresh_db):
+    fresh_db.upsert_listings([{"url": f"u{i}", "title": f"bike {i}", "price_cents": i, "score": 0.5,
+                               "created_at": f"2024-01-{i + 1:02d}T00:00:00"} for i in range(5)], "bikes")
+    return TestClient(app_module.app)
+
+def test_listings_fields_and_ndjson(client):
+    r = client.get("/api/listings?fields=id,title&limit=3", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert [set(row) for row in r.json()] == [{"id", "title"}] * 3
+    assert [row["title"] for row in r.json()] == ["bike 4", "bike 3", "bike 2"]
+
+    r = client.get("/api/listings?fields=title&format=ndjson", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert r.headers["content-type"].startswith(streaming.NDJSON)
+    assert [json.loads(l) for l in r.text.splitlines()] == [{"title": f"bike {i}"} for i in range(4, -1, -1)]
+
+    assert client.get("/api/listings?fields=title,password").status_code == 400
+
+def test_profiles_fields(client, fresh_db):
+    fresh_db.create_profile({"name": "bikes", "keywords": "bike", "chat_id": "123"})
+    assert client.get("/api/profiles?fields=name,keywords").json() == [{"name": "bikes", "keywords": "bike"}]
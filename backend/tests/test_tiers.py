@@ -0,0 +1,87 @@
+import pytest
+import ai_security
+import tiers
+
+PROFILE = {"name": "bikes", "keywords": "bike", "price_min_cents": 1000, "price_max_cents": 100000}
+ACCEPT = {"security_score": 90, "relevant": True, "reasons": ["ok"], "final_decision": "accept"}
+
+def _item(score, price=50000):
+    return {"title": f"bike {score}", "price_cents": price, "url": f"u{score}", "score": score}
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Records the pairs sent to the LLM; `llm.verdict` is what it answers."""
+    monkeypatch.setattr(ai_security, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(tiers, "TIER_AUDIT_RATE", 0.0)
+
+    class Fake:
+        sent = []
+        verdict = ACCEPT
+
+        def __call__(self, pairs):
+            self.sent += [it["score"] for _, it in pairs]
+            return [dict(self.verdict) for _ in pairs]
+
+    fake = Fake()
+    monkeypatch.setattr(tiers, "evaluate_many", fake)
+    return fake
+
+def test_bands():
+    assert tiers.band(PROFILE, _item(0.9, price=500)) == "reject"
+    assert tiers.band(PROFILE, _item(0.1)) == "reject"
+    assert tiers.band(PROFILE, _item(0.6)) == "uncertain"
+
+def test_confident_reject_skips_llm(llm):
+    [(_, verdict)] = tiers.TieredEvaluator().evaluate([(PROFILE, _item(0.1))])
+    assert verdict["tier"] == "heuristic"
+    assert verdict["final_decision"] == "reject"
+    assert llm.sent == []
+
+def test_budget_goes_to_best_candidates_of_the_cycle(llm):
+    ev = tiers.TieredEvaluator(tiers.Budget(calls=2))
+    early = ev.evaluate([(PROFILE, _item(0.5)), (PROFILE, _item(0.6))])
+    late = ev.evaluate([(PROFILE, _item(0.9)), (PROFILE, _item(0.4))])
+    assert early == []
+    assert sorted(it["score"] for (_, it), v in late if v["tier"] == "deferred") == [0.4, 0.5]
+    flushed = ev.flush()
+    assert llm.sent == [0.9, 0.6]
+    assert {it["score"]: v["tier"] for (_, it), v in flushed} == {0.9: "llm", 0.6: "llm"}
+
+def test_seconds_budget_defers_once_spent(llm):
+    budget = tiers.Budget(seconds=1.0)
+    budget.spend(2.0)
+    ev = tiers.TieredEvaluator(budget)
+    # Nothing is held once the budget is gone
+    [(_, verdict)] = ev.evaluate([(PROFILE, _item(0.6))])
+    assert verdict["tier"] == "deferred"
+    assert ev.flush() == []
+    assert llm.sent == []
+
+def test_time_budget_holds_a_bounded_window(llm, monkeypatch):
+    monkeypatch.setattr(tiers, "TIER_HOLD_MAX", 3)
+    monkeypatch.setattr(tiers, "TIER_DRAIN_SECONDS", 0)
+    ev = tiers.TieredEvaluator(tiers.Budget(seconds=60))
+    assert ev.evaluate([(PROFILE, _item(0.5)), (PROFILE, _item(0.7))]) == []
+    # The third pair fills the window: all three go to the LLM, best first
+    drained = ev.evaluate([(PROFILE, _item(0.6))])
+    assert llm.sent == [0.7, 0.6, 0.5]
+    assert {v["tier"] for _, v in drained} == {"llm"}
+    assert ev._held == []
+
+def test_held_pairs_are_sent_on_a_timer(llm, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(tiers.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(tiers, "TIER_DRAIN_SECONDS", 30)
+    ev = tiers.TieredEvaluator(tiers.Budget(seconds=60))
+    assert ev.evaluate([(PROFILE, _item(0.5))]) == []
+    now[0] += 31
+    drained = ev.evaluate([(PROFILE, _item(0.6))])
+    assert [it["score"] for (_, it), _ in drained] == [0.6, 0.5]
+    assert ev.evaluate([(PROFILE, _item(0.7))]) == []
+
+def test_failed_llm_call_gets_fallback_tier(llm):
+    llm.verdict = dict(ACCEPT, fallback="error")
+    before = tiers.stats()["agreement"].get("uncertain", {}).get("compared", 0)
+    [(_, verdict)] = tiers.TieredEvaluator().evaluate([(PROFILE, _item(0.6))])
+    assert verdict["tier"] == "fallback"
+    assert tiers.stats()["agreement"].get("uncertain", {}).get("compared", 0) == before
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from fastapi import HTTPException
+import places
+import ttl_cache
+from ttl_cache import TTLCache
+
+class Upstream:
+    """Async fetch counting its calls; slow enough for callers to overlap."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {"call": self.calls}
+
+def test_concurrent_misses_share_one_fetch():
+    cache, fetch = TTLCache(10, 60), Upstream()
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(10)))
+
+    assert asyncio.run(run()) == [{"call": 1}] * 10
+    assert fetch.calls == 1
+    assert (cache.misses, cache.coalesced) == (1, 9)
+    assert asyncio.run(cache.get_or_fetch("k", fetch)) == {"call": 1}
+    assert cache.hits == 1
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    # Only the cache's clock: the event loop keeps the real one
+    monkeypatch.setattr(ttl_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    cache, fetch = TTLCache(10, 60), Upstream()
+    asyncio.run(cache.get_or_fetch("k", fetch))
+    now[0] += 59
+    assert cache.get("k") == (True, {"call": 1})
+    now[0] += 2
+    assert cache.get("k") == (False, None)
+    assert asyncio.run(cache.get_or_fetch("k", fetch)) == {"call": 2}
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache, fetch = TTLCache(10, 60), Upstream(fail=True)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert fetch.calls == 1
+    assert cache.get("k") == (False, None)
+    fetch.fail = False
+    assert asyncio.run(cache.get_or_fetch("k", fetch)) == {"call": 2}
+
+def test_lru_bound():
+    cache = TTLCache(2, 60)
+    for k in "abc":
+        cache.set(k, k)
+    assert cache.get("a") == (False, None)
+    assert cache.evictions == 1
+
+@pytest.fixture
+def here(monkeypatch):
+    """places.proxy against a fake HERE client; `here.status` is its next reply's status."""
+    monkeypatch.setenv("USE_FIXTURE", "0")
+    monkeypatch.setattr(places, "cache", TTLCache(10, 60))
+
+    class Client:
+        calls = []
+        status = 200
+
+        async def get(self, url, params, headers, timeout):
+            self.calls.append(params)
+            await asyncio.sleep(0.02)
+            return httpx.Response(self.status, json={"items": [params["q"]]})
+
+    client = Client()
+    monkeypatch.setattr(places, "_client", lambda: client)
+    return client
+
+def test_places_coalesces_equivalent_queries(here):
+    async def run():
+        return await asyncio.gather(*(places.proxy("autosuggest", {"q": q})
+                                      for q in ("Downing St", " downing  st ", "DOWNING ST")))
+
+    assert [r["items"] for r in asyncio.run(run())] == [["Downing St"]] * 3
+    assert len(here.calls) == 1
+
+def test_places_errors_are_not_cached(here):
+    here.status = 503
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(places.proxy("geocode", {"q": "london"}))
+    assert e.value.status_code == 503
+    here.status = 200
+    assert asyncio.run(places.proxy("geocode", {"q": "london"})) == {"items": ["london"]}
+    assert len(here.calls) == 2
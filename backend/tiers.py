@@ -0,0 +1,201 @@
+"""Tiered evaluation: the keyword/price heuristic first, the LLM only where it is unsure."""
+import heapq, itertools, os, random, threading, time
+from collections import Counter
+import ai_security
+import metrics
+from eval_pool import AI_CONCURRENCY, evaluate_many
+
+TIERED_EVAL = os.getenv("TIERED_EVAL", "1") != "0"
+TIER_REJECT_BELOW = float(os.getenv("TIER_REJECT_BELOW", "0.34"))
+# Keyword scores are 0..1, so anything above 1 turns the accept band off
+TIER_ACCEPT_FROM = float(os.getenv("TIER_ACCEPT_FROM", "1.01"))
+# Per run; 0 means no limit
+TIER_LLM_BUDGET = int(os.getenv("TIER_LLM_BUDGET", "0"))
+TIER_LLM_SECONDS = float(os.getenv("TIER_LLM_SECONDS", "0"))
+# Share of confidently banded pairs double-checked by the LLM
+TIER_AUDIT_RATE = float(os.getenv("TIER_AUDIT_RATE", "0.02"))
+# With a budget, pairs are held and ranked; at most this many at once, and
+# sent best first every TIER_DRAIN_SECONDS (0: only at the end of the run)
+TIER_HOLD_MAX = int(os.getenv("TIER_HOLD_MAX", "1000"))
+TIER_DRAIN_SECONDS = float(os.getenv("TIER_DRAIN_SECONDS", "60"))
+
+def _price_ok(profile, item) -> bool:
+    price = item.get("price_cents") or 0
+    lo, hi = profile.get("price_min_cents"), profile.get("price_max_cents")
+    return (lo is None or price >= lo) and (hi is None or price <= hi)
+
+def band(profile, item) -> str:
+    """"reject", "accept" or "uncertain" (only the last needs the LLM)."""
+    score = item.get("score") or 0.0
+    if not _price_ok(profile, item) or score < TIER_REJECT_BELOW:
+        return "reject"
+    if score >= TIER_ACCEPT_FROM:
+        return "accept"
+    return "uncertain"
+
+def value(profile, item) -> float:
+    """Priority for the LLM budget: relevance, then how far under the price ceiling."""
+    hi = profile.get("price_max_cents")
+    price = item.get("price_cents") or 0
+    bargain = max(0.0, 1 - price / hi) if hi else 0.0
+    return (item.get("score") or 0.0) + 0.2 * bargain
+
+def first_pass(profile, item, b: str) -> dict:
+    verdict = ai_security._heuristic(profile, item)
+    if b == "reject":
+        why = "price outside range" if not _price_ok(profile, item) else f"keyword score {item.get('score') or 0:.2f} too low"
+        verdict = dict(verdict, final_decision="reject", reasons=verdict["reasons"] + [f"not sent to AI: {why}"])
+    return verdict
+
+def _accepted(verdict) -> bool:
+    return verdict.get("final_decision") == "accept" and int(verdict.get("security_score", 0)) >= 70
+
+class Budget:
+    """LLM calls and seconds left for one run (None: unlimited)."""
+
+    def __init__(self, calls: int = TIER_LLM_BUDGET, seconds: float = TIER_LLM_SECONDS):
+        self.calls = calls or None
+        self.seconds = seconds or None
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return self.calls is not None or self.seconds is not None
+
+    @property
+    def exhausted(self) -> bool:
+        with self._lock:
+            return self.calls == 0 or (self.seconds is not None and self.seconds <= 0)
+
+    def take(self, wanted: int) -> int:
+        with self._lock:
+            if self.seconds is not None and self.seconds <= 0:
+                return 0
+            if self.calls is None:
+                return wanted
+            granted = min(wanted, self.calls)
+            self.calls -= granted
+            return granted
+
+    def spend(self, seconds: float):
+        with self._lock:
+            if self.seconds is not None:
+                self.seconds -= seconds
+
+_lock = threading.Lock()
+_tiers = Counter()
+_agreement = {}  # band -> Counter(agree=, disagree=)
+
+def _record(results, agreement):
+    tier_counts = Counter(v["tier"] for _, v in results)
+    with _lock:
+        _tiers.update(tier_counts)
+        for b, agree in agreement:
+            _agreement.setdefault(b, Counter())["agree" if agree else "disagree"] += 1
+    for tier, n in tier_counts.items():
+        metrics.inc("eval_tier", n, tier=tier)
+    for b, agree in agreement:
+        metrics.inc("tier_agreement", band=b, outcome="agree" if agree else "disagree")
+
+def stats() -> dict:
+    """Pairs handled per tier and heuristic/LLM agreement per band since start."""
+    with _lock:
+        out = {"tiers": dict(_tiers), "agreement": {}}
+        for b, c in _agreement.items():
+            n = c["agree"] + c["disagree"]
+            out["agreement"][b] = {"compared": n, "rate": round(c["agree"] / n, 4) if n else None}
+    out["bands"] = {"reject_below": TIER_REJECT_BELOW, "accept_from": TIER_ACCEPT_FROM}
+    return out
+
+class TieredEvaluator:
+    """Verdicts tagged with a `tier`; uncertain pairs go to the LLM within a Budget."""
+
+    def __init__(self, budget: Budget | None = None):
+        self.budget = budget or Budget()
+        self._held = []   # min-heap of (value, seq, pair)
+        self._audit = []  # (pair, band, first-pass verdict)
+        self._seq = itertools.count()
+        self._drained = time.monotonic()
+
+    def evaluate(self, pairs) -> list:
+        pairs = list(pairs)
+        if not TIERED_EVAL or not ai_security.OPENAI_API_KEY:
+            return list(zip(pairs, evaluate_many(pairs)))
+        out, uncertain, audit = [], [], []
+        for pair in pairs:
+            b = band(*pair)
+            if b == "uncertain":
+                uncertain.append(pair)
+                continue
+            verdict = dict(first_pass(*pair, b), tier="heuristic")
+            if random.random() < TIER_AUDIT_RATE:
+                audit.append((pair, b, verdict))
+            else:
+                out.append((pair, verdict))
+        if not self.budget.limited:
+            out += self._ask([(p, "uncertain", None) for p in uncertain] + audit)
+            _record(out, [])
+            return out
+        if self.budget.exhausted:
+            out += [(pair, self._deferred(pair)) for pair in uncertain]
+            out += [(pair, verdict) for pair, _, verdict in audit]
+            _record(out, [])
+            return out
+        for pair in uncertain:
+            heapq.heappush(self._held, (value(*pair), next(self._seq), pair))
+        if self.budget.calls is not None:
+            while len(self._held) > self.budget.calls:
+                pair = heapq.heappop(self._held)[2]
+                out.append((pair, self._deferred(pair)))
+        self._audit += audit
+        _record(out, [])
+        # Bounded memory, and matches reach the user during the crawl
+        due = TIER_DRAIN_SECONDS > 0 and time.monotonic() - self._drained >= TIER_DRAIN_SECONDS
+        if due or len(self._held) + len(self._audit) >= TIER_HOLD_MAX:
+            out += self.flush()
+        return out
+
+    def flush(self) -> list:
+        """Send held pairs to the LLM, best first, while the budget lasts."""
+        held = [(pair, "uncertain", None) for *_, pair in sorted(self._held, reverse=True)]
+        audit, self._held, self._audit = self._audit, [], []
+        self._drained = time.monotonic()
+        out = []
+        # One wave of concurrent requests at a time, so the seconds budget is checked between waves
+        wave = max(1, AI_CONCURRENCY * ai_security.AI_BATCH_SIZE)
+        for queue in (held, audit):
+            while queue:
+                chunk, queue = queue[:wave], queue[wave:]
+                granted = self.budget.take(len(chunk))
+                if granted:
+                    out += self._ask(chunk[:granted])
+                if granted < len(chunk):
+                    # Out of budget; unaudited confident pairs keep their heuristic verdict
+                    for pair, _, verdict in chunk[granted:] + queue:
+                        out.append((pair, verdict if verdict is not None else self._deferred(pair)))
+                    break
+        _record(out, [])
+        return out
+
+    @staticmethod
+    def _deferred(pair):
+        return dict(first_pass(*pair, "uncertain"), tier="deferred")
+
+    def _ask(self, entries) -> list:
+        """LLM verdicts for (pair, band, first-pass verdict) entries."""
+        if not entries:
+            return []
+        started = time.perf_counter()
+        with metrics.span("cycle.llm_tier"):
+            llm = evaluate_many([pair for pair, _, _ in entries])
+        self.budget.spend(time.perf_counter() - started)
+        out, agreement = [], []
+        for (pair, b, first), verdict in zip(entries, llm):
+            if "fallback" in verdict:
+                out.append((pair, dict(verdict, tier="fallback")))
+                continue
+            first = first or first_pass(*pair, b)
+            agreement.append((b, _accepted(first) == _accepted(verdict)))
+            out.append((pair, dict(verdict, tier="llm")))
+        _record([], agreement)
+        return out
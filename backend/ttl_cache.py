@@ -0,0 +1,85 @@
+import asyncio, threading, time
+from collections import OrderedDict
+
+class TTLCache:
+    """Bounded LRU cache with expiry; `get_or_fetch` shares one in-flight fetch per key."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[object, tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict = {}
+        self.hits = self.misses = self.coalesced = self.evictions = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    return True, value
+                del self._data[key]
+            return False, None
+
+    def get(self, key):
+        """(True, value) for a fresh entry, else (False, None)."""
+        hit, value = self._lookup(key)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return hit, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    async def get_or_fetch(self, key, fetch):
+        """Cached value for `key`, calling `await fetch()` at most once per miss."""
+        hit, value = self._lookup(key)
+        if hit:
+            self.hits += 1
+            return value
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await fetch()
+        except BaseException as e:
+            fut.set_exception(e)
+            # Waiters get the error; nobody else needs to retrieve it
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, value)
+        fut.set_result(value)
+        return value
+
+    def stats(self) -> dict:
+        """`misses` are upstream fetches; coalesced callers waited on one."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._data),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }